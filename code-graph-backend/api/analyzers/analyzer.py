@@ -1,17 +1,83 @@
 from pathlib import Path
 from typing import Optional
 
-from tree_sitter import Language, Node, Parser, Point
+from tree_sitter import Language, Node, Parser, Point, Tree
 from api.entities.entity import Entity
 from api.entities.file import File
 from abc import ABC, abstractmethod
-from multilspy import SyncLanguageServer
+from multilspy import LanguageServer
 
 class AbstractAnalyzer(ABC):
+    # Extraction output version, bump whenever entities or symbols
+    # extracted by the analyzer change, invalidates cached extractions
+    version: str = "2"
+
     def __init__(self, language: Language) -> None:
         self.language = language
         self.parser = Parser(language)
 
+        # Symbol query catalog, compiled once into a single query
+        # whose capture names are the symbol keys
+        self.symbol_queries = self.get_symbol_queries()
+        self.symbol_query = self.language.query("\n".join(patterns for _, patterns in self.symbol_queries.values()))
+
+        # Definition lookups cache (DefinitionCache), set for the
+        # duration of symbol resolution
+        self.definitions = None
+
+        # In-memory file contents (Mapping[Path, bytes]) read in place of
+        # the files on disk, e.g. a git commit's blobs, set for the duration
+        # of an analysis
+        self.sources = None
+
+    def read_source(self, file_path: Path) -> bytes:
+        """
+        Read a file's content, from sources if it holds the file.
+
+        Args:
+            file_path (Path): The file path.
+
+        Returns:
+            bytes: The file content.
+        """
+
+        if self.sources is not None and file_path in self.sources:
+            return self.sources[file_path]
+        return file_path.read_bytes()
+
+    def source_id(self, file_path: Path) -> Optional[str]:
+        """
+        The git blob id of a file's content if known without reading it,
+        i.e. the file is read from a git commit, see sources.
+
+        Args:
+            file_path (Path): The file path.
+
+        Returns:
+            Optional[str]: The blob id, None if unknown.
+        """
+
+        oid = getattr(self.sources, 'oid', None)
+        if oid is None:
+            return None
+
+        oid = oid(file_path)
+        return str(oid) if oid is not None else None
+
+    def parse(self, file_path: Path, source: bytes) -> Tree:
+        """
+        Parse a file's content.
+
+        Args:
+            file_path (Path): The file path.
+            source (bytes): The file content.
+
+        Returns:
+            Tree: The syntax tree.
+        """
+
+        return self.parser.parse(source)
+
     def find_parent(self, node: Node, parent_types: list) -> Node:
         while node and node.type not in parent_types:
             node = node.parent
@@ -31,6 +97,19 @@ class AbstractAnalyzer(ABC):
 
         pass
     
+    def get_dependency_package(self, file_path: str) -> Optional[str]:
+        """
+        Get the package a dependency file belongs to.
+
+        Args:
+            file_path (str): The dependency file path.
+
+        Returns:
+            Optional[str]: The package as name@version, None if unknown.
+        """
+
+        return None
+
     @abstractmethod
     def resolve_path(self, file_path: str, path: Path) -> str:
         """
@@ -46,9 +125,21 @@ class AbstractAnalyzer(ABC):
 
         pass
 
-    def resolve(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path: Path, node: Node) -> list[tuple[File, Node]]:
+    async def resolve(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path: Path, node: Node) -> list[tuple[File, Node]]:
         try:
-            locations = lsp.request_definition(str(file_path), node.start_point.row, node.start_point.column)
+            key = None
+            locations = None
+            if self.definitions is not None:
+                key = self.definitions.key(file_path, node.start_point.row, node.start_point.column, self)
+                if key is not None:
+                    locations = self.definitions.get(key, self)
+
+            if locations is None:
+                locations = await lsp.request_definition(str(file_path), node.start_point.row, node.start_point.column)
+                if key is not None:
+                    locations = [location for location in locations if location]
+                    self.definitions.put(key, locations, [self.resolve_path(location['absolutePath'], path) for location in locations], self)
+
             return [(files[Path(self.resolve_path(location['absolutePath'], path))], files[Path(self.resolve_path(location['absolutePath'], path))].tree.root_node.descendant_for_point_range(Point(location['range']['start']['line'], location['range']['start']['character']), Point(location['range']['end']['line'], location['range']['end']['character']))) for location in locations if location and Path(self.resolve_path(location['absolutePath'], path)) in files]
         except Exception as e:
             return []
@@ -65,6 +156,19 @@ class AbstractAnalyzer(ABC):
 
         pass
     
+    def get_file_relations(self, files: dict[Path, File]) -> list[tuple[str, Path, Path]]:
+        """
+        Get the relationships between files, e.g. C/C++ includes or Python imports.
+
+        Args:
+            files (dict[Path, File]): The loaded files handled by the analyzer.
+
+        Returns:
+            list[tuple[str, Path, Path]]: (relation, source file, destination file) triplets.
+        """
+
+        return []
+
     @abstractmethod
     def get_entity_label(self, node: Node) -> str:
         """
@@ -116,29 +220,63 @@ class AbstractAnalyzer(ABC):
         pass
 
     @abstractmethod
-    def add_symbols(self, entity: Entity) -> None:
+    def get_symbol_queries(self) -> dict[str, tuple[list[str], str]]:
+        """
+        Get the symbol query catalog for the language.
+
+        Returns:
+            dict[str, tuple[list[str], str]]: Maps each symbol key to the entity types
+                the symbol is attributed to and the query patterns capturing
+                the symbol, captured under the symbol key.
+        """
+
+        pass
+
+    def add_symbols(self, file: File) -> None:
+        """
+        Add symbols to every entity defined in the file.
+
+        The catalog query runs once over the whole tree, each captured symbol
+        is attributed to its innermost enclosing entity accepting the symbol key.
+
+        Args:
+            file (File): The file, its entities already extracted.
+        """
+
+        captures = self.symbol_query.captures(file.tree.root_node)
+
+        for key, (entity_types, _) in self.symbol_queries.items():
+            for symbol in sorted(captures.get(key, []), key=lambda node: node.start_byte):
+                node = symbol.parent
+                while node is not None and (node.type not in entity_types or node not in file.entities):
+                    node = node.parent
+
+                if node is not None:
+                    file.entities[node].add_symbol(key, symbol)
+
+    def index_symbols(self, files: dict[Path, File]) -> None:
         """
-        Add symbols to the entity.
+        Invoked once every file is loaded, before symbols are resolved.
 
         Args:
-            entity (Entity): The entity to add symbols to.
+            files (dict[Path, File]): The files handled by the analyzer.
         """
 
         pass
 
     @abstractmethod
-    def resolve_symbol(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path: Path, key: str, symbol: Node) -> Entity:
+    async def resolve_symbol(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path: Path, key: str, symbol: Node) -> list[Entity]:
         """
-        Resolve a symbol to an entity.
+        Resolve a symbol to entities.
 
         Args:
-            lsp (SyncLanguageServer): The language server.
+            lsp (LanguageServer): The (started) language server.
             path (Path): The path to the file.
             key (str): The symbol key.
             symbol (Node): The symbol node.
 
         Returns:
-            Entity: The entity.
+            list[Entity]: The entities.
         """
 
         pass
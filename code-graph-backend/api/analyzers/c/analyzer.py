@@ -1,33 +1,32 @@
-import os
-import subprocess
 from pathlib import Path
-# Убираем subprocess, так как он не используется в упрощенной версии
-from api.entities import Entity, File # Предполагаем правильный путь импорта
-from typing import Optional, List, Dict, Set # Используем стандартные типы из typing
-# В файле: /api/api/analyzers/c/analyzer.py
-from ..analyzer import AbstractAnalyzer #  (если AbstractAnalyzer в /api/api/analyzers/analyzer.py)
+from api.entities import Entity, File
+from typing import Optional, List, Dict
+from ..analyzer import AbstractAnalyzer
+from .symbol_index import SymbolIndex
+from .include_graph import IncludeGraph
+from ..cache import IncludeCache
 import tree_sitter_cpp as tscpp
-from tree_sitter import Language, Node, Parser
+from tree_sitter import Language, Node
 import logging
-# Убираем import re, если он не нужен в других частях
 
 logger = logging.getLogger('code_graph')
 
-import tree_sitter_cpp as tscpp
 class CppAnalyzer(AbstractAnalyzer):
     """
     Simplified C++ Analyzer using tree-sitter ONLY.
     Implements AbstractAnalyzer interface BUT without using LSP.
-    Symbol resolution across files is unreliable/returns None.
+    Symbols are resolved by name through a SymbolIndex.
     """
+    # Field type symbols dropped, invalidates cached extractions
+    version = "4"
+
     def __init__(self) -> None:
         CPP_LANGUAGE = Language(tscpp.language())
         # Инициализируем родительский класс с языком
         super().__init__(CPP_LANGUAGE)
-        # Парсер уже создается в super().__init__(language)
-        # self.parser = Parser() # Этот парсер можно получить из self.parser родительского класса
-        # self.parser.set_language(CPP_LANGUAGE)
         self._project_root: Optional[Path] = None # Сохраним корень проекта для is_dependency
+        self._index: Optional[SymbolIndex] = None # Built by index_symbols, once all files are loaded
+        self._include_graph: Optional[IncludeGraph] = None # Built by add_dependencies
 
     # --- Реализация недостающего абстрактного метода ---
     def is_dependency(self, file_path: str) -> bool:
@@ -60,86 +59,30 @@ class CppAnalyzer(AbstractAnalyzer):
 
     # --- Реализация остальных абстрактных методов (из предыдущей версии) ---
 
-    def _find_included_file(self, include_path_str: str, current_file_path: Path) -> Optional[Path]:
-        """(Helper) Tries to find a local include file within the project root."""
-        if not self._project_root:
-            return None
-        # Логика # В файле: /api/api/analyzers/c/analyzer.py
-        from ..analyzer import AbstractAnalyzer # ПРАВИЛЬНО (если AbstractAnalyzer в /api/api/analyzers/analyzer.py)поиска остается прежней...
-        path_relative_to_current = (current_file_path.parent / include_path_str).resolve()
-        if path_relative_to_current.is_file():
-            try:
-                 if path_relative_to_current.relative_to(self._project_root):
-                    return path_relative_to_current
-            except ValueError: pass
-
-        search_dirs = [self._project_root]
-        # Добавляем стандартные папки для поиска, если они есть
-        potential_include_dir = self._project_root / 'include'
-        if potential_include_dir.is_dir():
-             search_dirs.append(potential_include_dir)
-        potential_src_dir = self._project_root / 'src'
-        if potential_src_dir.is_dir():
-             search_dirs.append(potential_src_dir)
-
-        for base_dir in search_dirs:
-            path_relative_to_root = (base_dir / include_path_str).resolve()
-            if path_relative_to_root.is_file():
-                 try:
-                    if path_relative_to_root.relative_to(self._project_root):
-                        return path_relative_to_root
-                 except ValueError: pass
-
-        logger.debug(f"Could not find local include '{include_path_str}' starting from {current_file_path}")
-        return None
-
     def add_dependencies(self, path: Path, files: List[Path]):
         """
         Finds local #include "..." directives and adds the referenced files if found
         within the project directory. Ignores system includes <...>.
+        The include graph is kept for get_file_relations.
         """
         self._project_root = path.resolve() # Сохраняем и резолвим корень проекта
         logger.info(f"Scanning for local includes in {self._project_root}. System includes <...> are ignored.")
 
-        known_files_set: Set[Path] = {f.resolve() for f in files}
-        queue: List[Path] = [f.resolve() for f in files]
-        processed_for_includes: Set[Path] = set()
-
-        include_query = self.language.query("""
-            (preproc_include path: (string_literal) @local_include)
-        """)
-
-        while queue:
-            current_file = queue.pop(0)
-            if current_file in processed_for_includes or not current_file.is_file():
-                continue
-            processed_for_includes.add(current_file)
-
-            logger.debug(f"Scanning for includes in: {current_file}")
-            try:
-                # Используем парсер из self
-                tree = self.parser.parse(current_file.read_bytes())
-                captures = include_query.captures(tree.root_node)
-
-                for node, capture_name in captures:
-                    if capture_name == 'local_include':
-                        include_path_str = node.text.decode('utf-8').strip('"')
-                        found_path = self._find_included_file(include_path_str, current_file)
-
-                        if found_path and found_path not in known_files_set:
-                            logger.info(f"Found new file via include: {found_path} (from {current_file})")
-                            known_files_set.add(found_path)
-                            files.append(found_path) # Добавляем в исходный список files
-                            if found_path not in processed_for_includes:
-                                queue.append(found_path)
-
-            except FileNotFoundError:
-                logger.warning(f"File not found during include scan: {current_file}")
-            except Exception as e:
-                logger.error(f"Error parsing {current_file} for includes: {e}")
+        cache = IncludeCache.default()
+        try:
+            self._include_graph = IncludeGraph(self._project_root, cache, sources=self.sources)
+            files.extend(self._include_graph.build(files)) # Добавляем в исходный список files
+        finally:
+            if cache is not None:
+                cache.close()
 
         logger.info(f"Include scan complete. Total files to analyze: {len(files)}")
 
+    def get_file_relations(self, files: Dict[Path, File]) -> List[tuple[str, Path, Path]]:
+        if self._include_graph is None:
+            return []
+        return [("INCLUDES", Path(src), Path(dest)) for src, dests in self._include_graph.edges.items() for dest in dests]
+
 
     def get_entity_label(self, node: Node) -> str:
         # Код остается прежним из упрощенной версии
@@ -191,6 +134,10 @@ class CppAnalyzer(AbstractAnalyzer):
                 if parent and parent.type in ['namespace_definition', 'translation_unit']:
                     return "Function" # Declaration of a function
 
+            # Variable declaration, e.g. `Foo f;`
+            if not declarator_node or declarator_node.type != 'function_declarator':
+                return "Variable"
+
         # Other entities
         if node_type == 'field_declaration': return "Field"
         # parameter_declaration is usually not a top-level entity handled here
@@ -324,123 +271,33 @@ class CppAnalyzer(AbstractAnalyzer):
             'using_declaration'
         ]
 
-    def add_symbols(self, entity: Entity) -> None:
-        # Код остается прежним из упрощенной версии
-        node = entity.node
-        node_type = node.type
-
-        # 1. Inheritance
-        if node_type in ['class_specifier', 'struct_specifier']:
-            base_clause_query = self.language.query("""
-                (base_clause (base_specifier type: $type)) @base_spec
-                where $type = [
-                    (type_identifier) @base_id
-                    (qualified_identifier) @base_id
-                    (template_type name: _ @base_id)
-                ]
-                """)
-            for child in node.children:
-                 if child.type == 'base_clause':
-                     captures = base_clause_query.captures(child)
-                     for cap_node, name in captures:
-                         if name == 'base_id':
-                             entity.add_symbol("base_class", cap_node)
-                             break # Assume one type per base_specifier for simplicity now
-                     break
-
-        # 2. Function Calls
-        body_node: Optional[Node] = None
-        if node_type == 'function_definition':
-            body_node = node.child_by_field_name('body')
-        elif node_type == 'declaration': # Constructors/Destructors with body
-             declarator = node.child_by_field_name('declarator')
-             if declarator and declarator.type == 'function_declarator':
-                 last_child = node.last_named_child
-                 if last_child and last_child.type == 'compound_statement': # Check if body exists
-                     body_node = last_child
-
-        if body_node:
-            call_query = self.language.query("""
-                (call_expression
-                  function: [
-                    (identifier) @call_target
-                    (qualified_identifier) @call_target
-                    (field_expression field: [ (identifier) @call_target (qualified_identifier) @call_target ]) # a.foo() or a.ns::foo()
-                    (pointer_expression field: [ (identifier) @call_target (qualified_identifier) @call_target ]) # a->foo() or a->ns::foo()
-                    (template_function name: _ @call_target) # foo<T>() - captures name part
-                     # Add more complex call patterns if needed (e.g., operators)
-                  ]
-                ) @call_expr
-            """)
-            captures = call_query.captures(body_node)
-            unique_calls = {} # Use dict to store unique call targets (by node id)
-            for cap_node, name in captures:
-                 if name == 'call_target':
-                     # Store the node representing the thing being called
-                     if cap_node.id not in unique_calls:
-                         entity.add_symbol("call", cap_node)
-                         unique_calls[cap_node.id] = cap_node
-
-        # 3. Types (Return, Parameters, Fields)
-        type_query_str = """
-            [
-             (type_identifier) @type_id
-             (qualified_identifier) @type_id
-             (primitive_type) @type_id
-             (template_type name: _ @type_id) # Captures the base name of the template type
-             # Try to capture the underlying type for pointers/references
-             (pointer_declarator type: @type_id)
-             (reference_declarator type: @type_id)
-             (parameter_declaration type: @type_id) # Recursive? Careful
-             # Base types inside complex types
-             (pointer_type declarator: (type_identifier) @type_id)
-             (reference_type declarator: (type_identifier) @type_id)
-             # etc. - This part might need refinement based on grammar details
-            ]
+    def get_symbol_queries(self) -> Dict[str, tuple[List[str], str]]:
+        """
+        Symbol query catalog. Named types are captured by their name,
+        template types by their template name, primitive types are skipped.
         """
-        type_query = self.language.query(type_query_str) # Define query once
 
-        # Return Type
-        if node_type == 'function_definition' or (node_type == 'declaration' and node.child_by_field_name('declarator') and node.child_by_field_name('declarator').type == 'function_declarator'):
-            type_node = node.child_by_field_name('type')
-            if type_node:
-                 # Try to find the core type identifier(s) within the type node
-                 captures = type_query.captures(type_node)
-                 for cap_node, name in captures:
-                     if name == 'type_id':
-                         entity.add_symbol("return_type", cap_node)
-                         break # Often only need the first core type found
-
-            # Parameters
-            declarator = node.child_by_field_name('declarator')
-            if declarator and declarator.type == 'function_declarator':
-                param_list = declarator.child_by_field_name('parameters')
-                if param_list:
-                     # Query for types inside parameter declarations
-                     param_type_query = self.language.query(f"(parameter_declaration type: $type) @param where $type = {type_query_str}")
-                     # Add optional_parameter_declaration, variadic etc if needed
-                     captures = param_type_query.captures(param_list)
-                     unique_param_types = {}
-                     for cap_node, name in captures:
-                          if name == 'type_id': # Node representing the type
-                              if cap_node.id not in unique_param_types:
-                                 entity.add_symbol("parameter_type", cap_node)
-                                 unique_param_types[cap_node.id] = cap_node
-
-        # Field Types
-        elif node_type in ['class_specifier', 'struct_specifier']:
-             body_node = node.child_by_field_name('body')
-             if body_node and body_node.type == 'field_declaration_list':
-                 # Query for types inside field declarations
-                 field_type_query = self.language.query(f"(field_declaration type: $type) @field where $type = {type_query_str}")
-                 captures = field_type_query.captures(body_node)
-                 unique_field_types = {}
-                 for cap_node, name in captures:
-                     if name == 'type_id': # Node representing the type
-                        if cap_node.id not in unique_field_types:
-                             entity.add_symbol("field_type", cap_node)
-                             unique_field_types[cap_node.id] = cap_node
+        def types(pattern: str, key: str) -> str:
+            # pattern holds a single {} placeholder where the type is matched
+            return "\n".join([pattern.format(f"[(type_identifier) (qualified_identifier)] @{key}"),
+                              pattern.format(f"(template_type name: (_) @{key})")])
+
+        return {
+            # 1. Inheritance
+            'base_class': (['class_specifier', 'struct_specifier'], types("(base_class_clause {})", "base_class")),
+
+            # 2. Function Calls, a.foo() / a->foo() are captured by the field name
+            'call': (['function_definition'], """
+                (call_expression function: [(identifier) (qualified_identifier)] @call)
+                (call_expression function: (field_expression field: (_) @call))
+                (call_expression function: (template_function name: (_) @call))"""),
 
+            # 3. Types (Return, Parameters)
+            'return_type': (['function_definition', 'declaration'],
+                            types("(function_definition type: {})", "return_type") + "\n" +
+                            types("(declaration type: {} declarator: (function_declarator))", "return_type")),
+            'parameters': (['function_definition', 'declaration'], types("(parameter_declaration type: {})", "parameters")),
+        }
 
     def resolve_path(self, file_path: str, path: Path) -> str:
         """(Simplified) Resolves a file path relative to the project root 'path'."""
@@ -457,77 +314,28 @@ class CppAnalyzer(AbstractAnalyzer):
             logger.debug(f"Resolved relative path '{file_path}' to '{abs_p}' using base '{path}'")
             return str(abs_p)
 
-    # --- Исправленная реализация resolve_symbol ---
-    def resolve_symbol(self, files: Dict[Path, File], lsp: Optional, file_path: Path, path: Path, key: str, symbol_node: Node) -> Optional[Entity]:
+    def index_symbols(self, files: Dict[Path, File]) -> None:
         """
-        (Simplified/Dummy) Attempts to resolve symbols based on name (unreliable).
-        Returns None as accurate resolution without LSP is not feasible.
+        Builds the name -> entities index used to resolve symbols, LSP is not used.
+        """
+        self._index = SymbolIndex().build(files)
+
+    async def resolve_symbol(self, files: Dict[Path, File], lsp: Optional, file_path: Path, path: Path, key: str, symbol_node: Node) -> List[Entity]:
+        """
+        Resolves symbols by name using the symbol index, ranking candidates by
+        qualification, arity, scope and locality (see SymbolIndex.lookup).
         Matches the AbstractAnalyzer signature, but ignores LSP.
         """
-        symbol_text = symbol_node.text.decode('utf-8')
-        logger.warning(f"Attempting simplified symbol resolution (name search - unreliable) for: key='{key}', symbol='{symbol_text}' in {file_path}. LSP is ignored.")
-
-        # --- ПРОСТОЙ ПОИСК ПО ИМЕНИ (ОЧЕНЬ НЕНАДЕЖНО!) ---
-        # Эта часть оставлена для примера, но она не будет работать корректно
-        # для перегруженных функций, шаблонов, пространств имен и т.д.
-        target_entity_types = []
-        if key in ["base_class", "return_type", "parameter_type", "field_type"]:
-             # Ищем классы, структуры, перечисления, псевдонимы типов
-             target_entity_types = ['class_specifier', 'struct_specifier', 'enum_specifier', 'type_alias_declaration', 'union_specifier']
-        elif key == "call":
-             # Ищем функции, методы, конструкторы, деструкторы
-             target_entity_types = ['function_definition', 'declaration'] # declaration может быть методом/конструктором/деструктором
-
-        found_entities: List[Entity] = []
-        if target_entity_types:
-             # Ищем по всем файлам сущность с подходящим именем и типом
-             for file_obj in files.values():
-                for entity in file_obj.entities.values():
-                    try:
-                        # Сравниваем имя (может понадобиться обработка ::)
-                        entity_name = self.get_entity_name(entity.node)
-                        # Простое сравнение (не учитывает квалификаторы!)
-                        if entity_name == symbol_text.split('::')[-1]: # Сравниваем последнюю часть имени
-                            # Проверяем тип ноды сущности
-                            if entity.node.type in target_entity_types:
-                                # Дополнительная проверка для 'declaration', чтобы убедиться, что это функция/метод
-                                if entity.node.type == 'declaration':
-                                     declarator = entity.node.child_by_field_name('declarator')
-                                     if not (declarator and declarator.type == 'function_declarator'):
-                                         continue # Пропускаем не-функциональные декларации
-
-                                logger.debug(f"Potential (unverified) match found for '{symbol_text}': {entity_name} in {file_obj.path}")
-                                found_entities.append(entity)
-                    except Exception as e:
-                        logger.error(f"Error comparing entity during simple name search: {e}")
-                        continue
-
-        # --- ВОЗВРАТ РЕЗУЛЬТАТА ---
-        # Поскольку надежное разрешение невозможно, возвращаем None.
-        # Если простой поиск что-то нашел, можно вернуть первое совпадение,
-        # но это ОЧЕНЬ ВЕРОЯТНО будет НЕПРАВИЛЬНО.
-        if found_entities:
-             logger.warning(f"Found {len(found_entities)} potential matches for '{symbol_text}' via basic name search. Returning None due to unreliability.")
-             # Можно вернуть found_entities[0], если нужно хоть что-то, но с большим предупреждением.
-             # return found_entities[0] # НЕ РЕКОМЕНДУЕТСЯ
-
-        logger.warning(f"Reliable symbol resolution for key '{key}' ('{symbol_text}') requires LSP and compile commands. Returning None.")
-        return None # Соответствует сигнатуре -> Optional[Entity] (если ее изменить) или выбрасывать ошибку/возвращать Dummy Entity
-
-
-    # --- Вспомогательные методы ---
-    # find_parent уже есть в AbstractAnalyzer, можно использовать super().find_parent(..) или скопировать реализацию, если нужно
-    # def find_parent(self, node: Node, types: List[str]) -> Optional[Node]:
-    #     """Traverses up the tree to find the first ancestor node matching one of the types."""
-    #     # Можно использовать реализацию из базового класса:
-    #     # return super().find_parent(node, types)
-    #     # Или оставить кастомную:
-    #     current = node.parent
-    #     while current:
-    #         if current.type in types:
-    #             return current
-    #         current = current.parent
-    #     return None
+        if self._index is None:
+            self.index_symbols(files)
+
+        if key == "call":
+            return self._index.lookup('function', symbol_node, file_path)
+        elif key in ["base_class", "return_type", "parameters"]:
+            return self._index.lookup('type', symbol_node, file_path)
+        else:
+            raise ValueError(f"Unknown key {key}")
+
 
     def find_first_descendant(self, node: Node, types: List[str]) -> Optional[Node]:
         """Helper to find the first descendant node matching one of the types (BFS)."""
@@ -0,0 +1,193 @@
+import os
+import re
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger('code_graph')
+
+# Local includes only, system includes <...> are ignored
+INCLUDE_RE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*"([^"\r\n]+)"', re.MULTILINE)
+
+def scan_includes(path: str) -> Optional[List[str]]:
+    """
+    Lists the local includes of a file by scanning its preprocessor lines,
+    the file is not parsed.
+
+    Returns:
+        Optional[List[str]]: The include strings, None if the file can not be read.
+    """
+
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+    except OSError as e:
+        logger.warning(f"Failed to scan includes of {path}: {e}")
+        return None
+
+    return find_includes(source)
+
+def find_includes(source: bytes) -> List[str]:
+    """
+    Lists the local includes of a file's content.
+    """
+
+    # Cheap check before running the regex
+    if b'include' not in source:
+        return []
+
+    return [m.decode('utf-8', errors='replace') for m in INCLUDE_RE.findall(source)]
+
+class IncludeGraph:
+    """
+    The local include graph of a C/C++ project.
+
+    Files are scanned level by level starting from the project's files,
+    each level in parallel, included files found within the project root
+    are scanned in turn. Scan results are persisted in an IncludeCache and
+    reused as long as a file is left untouched, include resolution is
+    memoized per (directory, include).
+
+    Given in-memory sources, e.g. a git commit's blobs, the project's files
+    are looked up and scanned in sources rather than on disk.
+    """
+
+    def __init__(self, root: Path, cache=None, workers: Optional[int] = None,
+                 sources: Optional[Mapping[Path, bytes]] = None) -> None:
+        """
+        Args:
+            root (Path): The project root, includes resolving outside of it are ignored.
+            cache (IncludeCache, optional): Persistent scan results.
+            workers (int, optional): Number of scanning processes, defaults to
+                $CODE_GRAPH_WORKERS or 1 (no worker processes).
+            sources (Mapping[Path, bytes], optional): The project's files contents.
+        """
+
+        if workers is None:
+            workers = int(os.getenv('CODE_GRAPH_WORKERS', "1"))
+
+        self.root = os.path.abspath(root)
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.sources = sources
+
+        # file -> included files
+        self.edges: Dict[str, List[str]] = {}
+        self._resolved: Dict[Tuple[str, str], Optional[str]] = {}
+
+        # Directories searched after the including file's directory
+        self.search_dirs = [self.root] + [d for d in (os.path.join(self.root, 'include'), os.path.join(self.root, 'src')) if os.path.isdir(d)]
+
+    def _within_root(self, path: str) -> bool:
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def _is_file(self, path: str) -> bool:
+        if self.sources is not None:
+            return Path(path) in self.sources
+        return os.path.isfile(path)
+
+    def resolve(self, include: str, directory: str) -> Optional[str]:
+        """
+        Resolve an include string to a file within the project root.
+
+        Args:
+            include (str): The include string, e.g. "utils/log.h".
+            directory (str): Directory of the including file.
+
+        Returns:
+            Optional[str]: The included file, None if not found.
+        """
+
+        key = (directory, include)
+        if key in self._resolved:
+            return self._resolved[key]
+
+        found = None
+        for base in [directory] + self.search_dirs:
+            candidate = os.path.normpath(os.path.join(base, include))
+            if self._within_root(candidate) and self._is_file(candidate):
+                found = candidate
+                break
+
+        if found is None:
+            logger.debug(f"Could not find local include '{include}' from {directory}")
+
+        self._resolved[key] = found
+        return found
+
+    def _scan(self, paths: List[str]) -> List[Optional[List[str]]]:
+        # In-memory contents are neither cached nor worth a worker process
+        if self.sources is not None:
+            return [find_includes(self.sources[Path(path)]) if Path(path) in self.sources else None for path in paths]
+
+        results: List[Optional[List[str]]] = [None] * len(paths)
+        stats: List[Optional[os.stat_result]] = [None] * len(paths)
+        misses: List[int] = []
+
+        for i, path in enumerate(paths):
+            if self.cache is not None:
+                try:
+                    stats[i] = os.stat(path)
+                except OSError:
+                    continue
+                results[i] = self.cache.get(path, stats[i].st_size, stats[i].st_mtime_ns)
+            if results[i] is None:
+                misses.append(i)
+
+        miss_paths = [paths[i] for i in misses]
+        if self.workers > 1 and len(miss_paths) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                scanned = list(executor.map(scan_includes, miss_paths, chunksize=max(1, len(miss_paths) // (self.workers * 4))))
+        else:
+            scanned = [scan_includes(path) for path in miss_paths]
+
+        for i, includes in zip(misses, scanned):
+            results[i] = includes
+            if includes is not None and self.cache is not None and stats[i] is not None:
+                self.cache.put(paths[i], stats[i].st_size, stats[i].st_mtime_ns, includes)
+
+        return results
+
+    def build(self, files: List[Path]) -> List[Path]:
+        """
+        Build the include graph reachable from the given files.
+
+        Args:
+            files (List[Path]): The project's files.
+
+        Returns:
+            List[Path]: Included files which are not part of files.
+        """
+
+        known = {os.path.abspath(f) for f in files}
+        discovered: List[Path] = []
+        frontier = sorted(known)
+
+        while frontier:
+            next_frontier = []
+            for path, includes in zip(frontier, self._scan(frontier)):
+                targets = []
+                directory = os.path.dirname(path)
+                for include in includes or []:
+                    target = self.resolve(include, directory)
+                    if target is None:
+                        continue
+                    targets.append(target)
+                    if target not in known:
+                        logger.info(f"Found new file via include: {target} (from {path})")
+                        known.add(target)
+                        discovered.append(Path(target))
+                        next_frontier.append(target)
+                self.edges[path] = targets
+            frontier = next_frontier
+
+        logger.info(f"Include scan complete, {len(self.edges)} files, {sum(len(t) for t in self.edges.values())} includes")
+        return discovered
+
+    def includes(self, path: Path) -> List[Path]:
+        """
+        Files directly included by the given file.
+        """
+
+        return [Path(p) for p in self.edges.get(os.path.abspath(path), [])]
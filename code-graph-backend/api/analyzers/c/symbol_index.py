@@ -0,0 +1,224 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from tree_sitter import Node
+from api.entities import Entity, File
+
+logger = logging.getLogger('code_graph')
+
+# Entity node types per symbol kind
+TYPE_NODES = ['class_specifier', 'struct_specifier', 'union_specifier', 'enum_specifier', 'type_alias_declaration']
+FUNCTION_NODES = ['function_definition', 'declaration', 'field_declaration']
+
+# Declarators wrapping the function declarator, e.g. a function returning a pointer
+WRAPPING_DECLARATORS = ['pointer_declarator', 'reference_declarator', 'parenthesized_declarator', 'attributed_declarator']
+
+# Scope defining nodes
+SCOPE_NODES = ['namespace_definition', 'class_specifier', 'struct_specifier', 'union_specifier']
+
+def _strip_template(name: str) -> str:
+    return name.split('<', 1)[0].strip()
+
+def _split(name: str) -> List[str]:
+    """ Split a (possibly qualified) name into its components, e.g. ::ns::A<int>::f -> [ns, A, f] """
+    return [_strip_template(part) for part in name.split('::') if part.strip()]
+
+def _function_declarator(node: Node) -> Optional[Node]:
+    declarator = node.child_by_field_name('declarator')
+    while declarator is not None and declarator.type in WRAPPING_DECLARATORS:
+        inner = declarator.child_by_field_name('declarator')
+        if inner is None and declarator.named_child_count > 0:
+            # reference_declarator does not name its child
+            inner = declarator.named_children[-1]
+        declarator = inner
+
+    if declarator is not None and declarator.type == 'function_declarator':
+        return declarator
+    return None
+
+def _arity(function_declarator: Node) -> Tuple[int, float]:
+    """ Minimum and maximum number of arguments accepted by the function """
+    parameters = function_declarator.child_by_field_name('parameters')
+    if parameters is None:
+        return 0, 0
+
+    required, total = 0, 0
+    for parameter in parameters.named_children:
+        if parameter.type == 'parameter_declaration':
+            # f(void)
+            if parameter.child_by_field_name('declarator') is None and parameter.text.decode('utf-8').strip() == 'void':
+                continue
+            required += 1
+            total += 1
+        elif parameter.type == 'optional_parameter_declaration':
+            total += 1
+        elif parameter.type == 'variadic_parameter_declaration' or parameter.type == 'variadic_parameter':
+            total = float('inf')
+
+    # C style variadic, f(int, ...)
+    if any(child.type == '...' for child in parameters.children):
+        total = float('inf')
+
+    return required, total
+
+def _scope(node: Node) -> List[str]:
+    """ Names of the namespaces and classes enclosing the node, outermost first """
+    scope: List[str] = []
+    parent = node.parent
+    while parent is not None:
+        if parent.type in SCOPE_NODES:
+            name = parent.child_by_field_name('name')
+            if name is not None:
+                scope = _split(name.text.decode('utf-8')) + scope
+        elif parent.type == 'function_definition':
+            # Out of class method definition, A::f() { ... } is scoped within A
+            declarator = _function_declarator(parent)
+            name = declarator.child_by_field_name('declarator') if declarator is not None else None
+            if name is not None and name.type == 'qualified_identifier':
+                scope = _split(name.text.decode('utf-8'))[:-1] + scope
+        parent = parent.parent
+    return scope
+
+class Candidate(NamedTuple):
+    entity: Entity
+    path: Path
+    qualified: List[str]
+    definition: bool
+    member: bool
+    arity: Tuple[int, float]
+
+class SymbolIndex:
+    """
+    Name to entities index over the C/C++ entities of a project.
+
+    Entities are indexed by kind (type or function) and unqualified name,
+    built once all files were loaded, symbols are resolved by a lookup,
+    candidates sharing the symbol name are ranked by qualification,
+    arity, member access, scope, file locality and whether they are a
+    definition or a mere declaration.
+    """
+
+    def __init__(self) -> None:
+        self.names: Dict[str, Dict[str, List[Candidate]]] = {'type': {}, 'function': {}}
+
+    def build(self, files: Dict[Path, File]) -> "SymbolIndex":
+        """
+        Index the entities of the given files.
+
+        Args:
+            files (dict[Path, File]): The files.
+
+        Returns:
+            SymbolIndex: self.
+        """
+
+        for path, file in files.items():
+            for node, entity in file.entities.items():
+                self.add(path, node, entity)
+
+        logger.info(f"Indexed {sum(len(c) for c in self.names['type'].values())} types "
+                    f"and {sum(len(c) for c in self.names['function'].values())} functions")
+        return self
+
+    def add(self, path: Path, node: Node, entity: Entity) -> None:
+        if node.type in TYPE_NODES:
+            name = node.child_by_field_name('name')
+            if name is None:
+                return
+            kind = 'type'
+            qualified = _scope(node) + _split(name.text.decode('utf-8'))
+            definition = node.type == 'type_alias_declaration' or node.child_by_field_name('body') is not None
+            member = False
+            arity = (0, 0)
+
+        elif node.type in FUNCTION_NODES:
+            declarator = _function_declarator(node)
+            name = declarator.child_by_field_name('declarator') if declarator is not None else None
+            if name is None:
+                return
+            kind = 'function'
+            scope = _scope(node)
+            parts = _split(name.text.decode('utf-8'))
+            if len(parts) == 0:
+                return
+            qualified = scope + parts
+            definition = node.type == 'function_definition'
+            member = node.type == 'field_declaration' or len(parts) > 1 or \
+                (node.parent is not None and node.parent.type == 'field_declaration_list')
+            arity = _arity(declarator)
+
+        else:
+            return
+
+        candidate = Candidate(entity, path, qualified, definition, member, arity)
+        self.names[kind].setdefault(qualified[-1], []).append(candidate)
+
+    def lookup(self, kind: str, symbol: Node, path: Path) -> List[Entity]:
+        """
+        Resolve a symbol to the best ranked entities.
+
+        Args:
+            kind (str): Either 'type' or 'function'.
+            symbol (Node): The symbol node, a type name or a call target.
+            path (Path): The file holding the symbol.
+
+        Returns:
+            List[Entity]: The best ranked entities, several if ambiguous.
+        """
+
+        parts = _split(symbol.text.decode('utf-8'))
+        if len(parts) == 0:
+            return []
+
+        candidates = self.names[kind].get(parts[-1])
+        if not candidates:
+            return []
+
+        qualifier = parts[:-1]
+        scope = _scope(symbol)
+
+        arguments = None
+        field_access = False
+        if kind == 'function':
+            call = symbol.parent
+            while call is not None and call.type != 'call_expression':
+                call = call.parent
+            if call is not None:
+                args = call.child_by_field_name('arguments')
+                arguments = args.named_child_count if args is not None else 0
+            field_access = symbol.parent is not None and symbol.parent.type == 'field_expression'
+
+        def rank(candidate: Candidate) -> tuple:
+            qualified = candidate.qualified
+
+            # ns::f must match a trailing part of the candidate's qualified name
+            qualified_match = len(qualifier) == 0 or qualified[-len(parts):] == parts
+
+            arity_match = arguments is None or candidate.arity[0] <= arguments <= candidate.arity[1]
+
+            # a.f() calls a member, f() a free function or a member of the enclosing class
+            candidate_scope = qualified[:-1]
+            if field_access:
+                member_match = candidate.member
+            else:
+                member_match = not candidate.member or candidate_scope == scope[:len(candidate_scope)]
+
+            # Depth of the innermost enclosing scope the candidate is visible from
+            depth = 0
+            for a, b in zip(candidate_scope, scope):
+                if a != b:
+                    break
+                depth += 1
+            visible = depth == len(candidate_scope)
+
+            return (qualified_match, arity_match, member_match, visible, depth, candidate.path == path, candidate.definition)
+
+        ranked = [(rank(candidate), candidate) for candidate in candidates]
+        best = max(r for r, _ in ranked)
+
+        # An explicitly qualified symbol must match
+        if not best[0]:
+            return []
+
+        return list(dict.fromkeys(candidate.entity for r, candidate in ranked if r == best))
@@ -0,0 +1,381 @@
+import os
+import json
+import zlib
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+from api.entities.record import FileRecord
+from .analyzer import AbstractAnalyzer
+
+# Bump whenever the layout of FileRecord / EntityRecord changes
+RECORD_FORMAT = 2
+
+class SQLiteCache():
+    """
+    Key value store backing the persistent caches, a SQLite database
+    located under $CODE_GRAPH_CACHE_DIR, writes are committed in batches.
+    """
+
+    # Database file name, within the cache directory
+    filename = "cache.sqlite"
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS records (
+                                 key  TEXT PRIMARY KEY,
+                                 data BLOB NOT NULL)""")
+        self.conn.commit()
+
+        self.hits    = 0
+        self.misses  = 0
+        self.pending = 0
+
+    @classmethod
+    def default(cls):
+        """
+        Open the default cache, unless disabled by setting $CODE_GRAPH_CACHE to 0
+
+        Returns:
+            The cache, None if disabled or unavailable.
+        """
+
+        if os.getenv('CODE_GRAPH_CACHE', "1") == "0":
+            return None
+
+        cache_dir = Path(os.getenv('CODE_GRAPH_CACHE_DIR', Path.cwd() / "repositories" / ".cache"))
+
+        try:
+            return cls(cache_dir / cls.filename)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"{cls.__name__} unavailable at {cache_dir}: {e}")
+            return None
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM records WHERE key = ?", (key,)).fetchone()
+
+        return None if row is None else row[0]
+
+    def _put(self, key: str, data: bytes) -> None:
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO records (key, data) VALUES (?, ?)", (key, data))
+            self.pending += 1
+
+            # Commit in batches rather than per record
+            if self.pending >= 1000:
+                self.conn.commit()
+                self.pending = 0
+
+    def commit(self) -> None:
+        """
+        Persist every cached record.
+        """
+
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+        logging.info(f"{type(self).__name__} hits: {self.hits}, misses: {self.misses}")
+
+    def close(self) -> None:
+        self.commit()
+
+        with self.lock:
+            self.conn.close()
+
+def blob_id(source: bytes) -> str:
+    """
+    The git blob id of a content, the SHA-1 of its git object header and content.
+    """
+
+    digest = hashlib.sha1(b"blob %d\0" % len(source))
+    digest.update(source)
+    return digest.hexdigest()
+
+class ExtractionCache(SQLiteCache):
+    """
+    Persistent cache of extracted file records.
+
+    Records are keyed by the git blob id of the file content together with
+    the analyzer and its version, they do not depend on the file path, so
+    identical files are extracted once, across projects and across the
+    commits of a git history, whose blob ids are known without hashing.
+
+    The cache is a SQLite database, by default located at
+    $CODE_GRAPH_CACHE_DIR/extraction.sqlite
+    """
+
+    filename = "extraction.sqlite"
+
+    @staticmethod
+    def key(source: bytes, analyzer: AbstractAnalyzer, dependency: bool, shallow: bool = False,
+            oid: Optional[str] = None) -> str:
+        """
+        Compute the cache key of a file.
+
+        Args:
+            source (bytes): The file content.
+            analyzer (AbstractAnalyzer): The analyzer extracting the file.
+            dependency (bool): Whether the file is a dependency, dependencies have no symbols.
+            shallow (bool): Whether only signatures are extracted.
+            oid (str, optional): The content's git blob id, computed if missing.
+
+        Returns:
+            str: The cache key.
+        """
+
+        digest = oid if oid is not None else blob_id(source)
+        kind = "sig" if shallow else "dep" if dependency else "src"
+        return f"{digest}:{type(analyzer).__name__}:{analyzer.version}:{RECORD_FORMAT}:{kind}"
+
+    def get(self, key: str, path: Path) -> Optional[FileRecord]:
+        """
+        Get the record cached under key.
+
+        Args:
+            key (str): The cache key.
+            path (Path): Path of the file the record is loaded for.
+
+        Returns:
+            Optional[FileRecord]: The record, None on cache miss.
+        """
+
+        data = self._get(key)
+        if data is None:
+            self.misses += 1
+            return None
+
+        try:
+            entities = pickle.loads(zlib.decompress(data))
+        except Exception as e:
+            logging.warning(f"Discarding corrupted cache entry {key}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        record = FileRecord(path)
+        record.entities = entities
+        return record
+
+    def put(self, key: str, record: FileRecord) -> None:
+        """
+        Cache a record under key.
+
+        Args:
+            key (str): The cache key.
+            record (FileRecord): The record.
+        """
+
+        self._put(key, zlib.compress(pickle.dumps(record.entities, protocol=pickle.HIGHEST_PROTOCOL)))
+
+class DefinitionCache(SQLiteCache):
+    """
+    Persistent cache of language server definition lookups.
+
+    Lookups are keyed by the requesting file, the git blob id of its
+    content, the symbol position and the analyzer. Each entry records the
+    blob id of every file the symbol resolved into, the entry is discarded
+    once any of them changed. Files read from a git commit are identified
+    by their blob id in the commit rather than by the file on disk, see
+    AbstractAnalyzer.source_id. Empty lookups are not cached, a later change
+    anywhere in the project may resolve them.
+
+    The cache is a SQLite database, by default located at
+    $CODE_GRAPH_CACHE_DIR/definitions.sqlite
+    """
+
+    filename = "definitions.sqlite"
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+
+        # path -> (size, mtime, blob id), files are hashed once
+        # for as long as they are left untouched
+        self.hashes: dict[str, tuple[int, int, str]] = {}
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """
+        Get the git blob id of a file on disk.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            Optional[str]: The blob id, None if the file does not exist.
+        """
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        entry = self.hashes.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+        try:
+            with open(path, 'rb') as f:
+                digest = blob_id(f.read())
+        except OSError:
+            return None
+
+        self.hashes[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    def digest(self, path: str, analyzer: Optional[AbstractAnalyzer] = None) -> Optional[str]:
+        """
+        Get the git blob id of a file as seen by the analyzer, read from its
+        in-memory sources if they hold the file, from disk otherwise.
+
+        Args:
+            path (str): The file path.
+            analyzer (AbstractAnalyzer, optional): The analyzer reading the file.
+
+        Returns:
+            Optional[str]: The blob id, None if the file does not exist.
+        """
+
+        if analyzer is not None:
+            oid = analyzer.source_id(Path(path))
+            if oid is not None:
+                return oid
+
+        return self.file_hash(path)
+
+    def key(self, file_path: Path, line: int, column: int, analyzer: AbstractAnalyzer) -> Optional[str]:
+        """
+        Compute the cache key of a definition lookup.
+
+        Args:
+            file_path (Path): The file holding the symbol.
+            line (int): The symbol line.
+            column (int): The symbol column.
+            analyzer (AbstractAnalyzer): The analyzer resolving the symbol.
+
+        Returns:
+            Optional[str]: The cache key, None if the file can not be read.
+        """
+
+        digest = self.digest(str(file_path), analyzer)
+        if digest is None:
+            return None
+
+        return f"{file_path}:{digest}:{line}:{column}:{type(analyzer).__name__}:{analyzer.version}"
+
+    def get(self, key: str, analyzer: Optional[AbstractAnalyzer] = None) -> Optional[list[dict]]:
+        """
+        Get the locations cached under key.
+
+        Args:
+            key (str): The cache key.
+            analyzer (AbstractAnalyzer, optional): The analyzer resolving the symbol.
+
+        Returns:
+            Optional[list[dict]]: The definition locations, None on cache miss
+                or if any of the files the symbol resolved into changed.
+        """
+
+        data = self._get(key)
+        if data is None:
+            self.misses += 1
+            return None
+
+        try:
+            entry = json.loads(data)
+        except ValueError as e:
+            logging.warning(f"Discarding corrupted cache entry {key}: {e}")
+            self.misses += 1
+            return None
+
+        # Resolved into a file which changed since
+        if any(self.digest(path, analyzer) != digest for path, digest in entry['targets'].items()):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry['locations']
+
+    def put(self, key: str, locations: list[dict], targets: list[str],
+            analyzer: Optional[AbstractAnalyzer] = None) -> None:
+        """
+        Cache definition locations under key.
+
+        Args:
+            key (str): The cache key.
+            locations (list[dict]): The definition locations.
+            targets (list[str]): The files the locations point into.
+            analyzer (AbstractAnalyzer, optional): The analyzer resolving the symbol.
+        """
+
+        if len(locations) == 0:
+            return
+
+        entry = {
+            'locations': [{'absolutePath': location['absolutePath'], 'range': location['range']} for location in locations],
+            'targets': {path: self.digest(path, analyzer) for path in targets}
+        }
+
+        self._put(key, json.dumps(entry).encode('utf-8'))
+
+class IncludeCache(SQLiteCache):
+    """
+    Persistent cache of the local includes of C/C++ files, see IncludeGraph.
+
+    Entries are keyed by path and reused as long as the file's size and
+    modification time are unchanged.
+
+    The cache is a SQLite database, by default located at
+    $CODE_GRAPH_CACHE_DIR/includes.sqlite
+    """
+
+    filename = "includes.sqlite"
+
+    def get(self, path: str, size: int, mtime: int) -> Optional[list[str]]:
+        """
+        Get the includes of a file.
+
+        Args:
+            path (str): The file path.
+            size (int): The file size.
+            mtime (int): The file modification time, in nanoseconds.
+
+        Returns:
+            Optional[list[str]]: The include strings, None on cache miss.
+        """
+
+        data = self._get(path)
+        if data is not None:
+            try:
+                entry = json.loads(data)
+                if entry['size'] == size and entry['mtime'] == mtime:
+                    self.hits += 1
+                    return entry['includes']
+            except (ValueError, KeyError) as e:
+                logging.warning(f"Discarding corrupted cache entry {path}: {e}")
+
+        self.misses += 1
+        return None
+
+    def put(self, path: str, size: int, mtime: int, includes: list[str]) -> None:
+        """
+        Cache the includes of a file.
+
+        Args:
+            path (str): The file path.
+            size (int): The file size.
+            mtime (int): The file modification time, in nanoseconds.
+            includes (list[str]): The include strings.
+        """
+
+        self._put(path, json.dumps({'size': size, 'mtime': mtime, 'includes': includes}).encode('utf-8'))
@@ -0,0 +1,109 @@
+import logging
+from pathlib import Path
+
+from ..graph import Graph, graph_exists, shadow_graph_name
+from ..info import add_repo_checkpoint_files, delete_repo_checkpoint, get_repo_checkpoint, set_repo_checkpoint
+
+class Checkpoint():
+    """
+    Tracks the progress of a project's analysis, persisted alongside its
+    graph so an interrupted analysis, e.g. a crash or a language server
+    hang, resumes where it stopped.
+
+    Files are recorded once their records are flushed to the graph, see
+    BulkWriter.mark: 'written' once their first pass nodes are written,
+    'resolved' once their second pass relationships are. A resumed
+    analysis merges rather than creates, so records flushed before the
+    interruption are matched rather than duplicated, loads written files
+    without writing them again and skips the symbol resolution of resolved
+    files.
+
+    The records live in the shadow graph the analysis builds, see
+    Graph.shadow, a checkpoint whose shadow graph is gone is discarded.
+    """
+
+    def __init__(self, repo_name: str) -> None:
+        self.repo_name = repo_name
+        self.path: str = ''
+        self.phase: str = ''
+        self.written: set[str] = set()
+        self.resolved: set[str] = set()
+
+    def begin(self, path: Path) -> bool:
+        """
+        Start or resume the analysis of a folder.
+
+        Args:
+            path (Path): The analyzed folder.
+
+        Returns:
+            bool: Whether an interrupted analysis of the folder is resumed.
+        """
+
+        state = get_repo_checkpoint(self.repo_name)
+        if state is not None and state.get('path') == str(path) and not self.has_shadow():
+            logging.warning(f"Shadow graph of {self.repo_name} is missing or empty, discarding its checkpoint")
+            state = None
+
+        if state is not None and state.get('path') == str(path):
+            self.path = state['path']
+            self.phase = state.get('phase', 'first_pass')
+            self.written = state['written']
+            self.resolved = state['resolved']
+            logging.info(f"Resuming the analysis of {self.repo_name} from {self.phase}, "
+                         f"{len(self.written)} files written, {len(self.resolved)} files resolved")
+            return True
+
+        self.path = str(path)
+        self.phase = 'first_pass'
+        self.written, self.resolved = set(), set()
+        set_repo_checkpoint(self.repo_name, {'path': self.path, 'phase': self.phase}, reset=True)
+        return False
+
+    def has_shadow(self) -> bool:
+        """
+        Whether the shadow graph the checkpointed analysis writes to holds any record.
+        """
+
+        name = shadow_graph_name(self.repo_name)
+        return graph_exists(name) and not Graph(name).is_empty()
+
+    def enter(self, phase: str) -> None:
+        """
+        Record the analysis entered a new phase.
+        """
+
+        self.phase = phase
+        set_repo_checkpoint(self.repo_name, {'phase': phase})
+
+    def on_written(self, paths: list) -> None:
+        """
+        BulkWriter flush callback, the first pass output of the files is written.
+        """
+
+        paths = [str(p) for p in paths]
+        add_repo_checkpoint_files(self.repo_name, 'written', paths)
+        self.written.update(paths)
+
+    def on_resolved(self, paths: list) -> None:
+        """
+        BulkWriter flush callback, the second pass output of the files is written.
+        """
+
+        paths = [str(p) for p in paths]
+        add_repo_checkpoint_files(self.repo_name, 'resolved', paths)
+        self.resolved.update(paths)
+
+    def is_written(self, path: Path) -> bool:
+        return str(path) in self.written
+
+    def is_resolved(self, path: Path) -> bool:
+        return str(path) in self.resolved
+
+    def complete(self) -> None:
+        """
+        Drop the checkpoint, the analysis completed.
+        """
+
+        delete_repo_checkpoint(self.repo_name)
+        self.written, self.resolved = set(), set()
@@ -1,16 +1,14 @@
-import os
+import zipfile
 from pathlib import Path
-import subprocess
 from ...entities import *
 from typing import Optional
 from ..analyzer import AbstractAnalyzer
+from .source_jars import Artifact, parse_pom, source_jars, split_member_path, member_path
 
-from multilspy import SyncLanguageServer
+from multilspy import LanguageServer
 
 import tree_sitter_java as tsjava
-from tree_sitter import Language, Node
-
-from xml.etree import ElementTree
+from tree_sitter import Language, Node, Tree
 
 import logging
 logger = logging.getLogger('code_graph')
@@ -19,23 +17,47 @@ class JavaAnalyzer(AbstractAnalyzer):
     def __init__(self) -> None:
         super().__init__(Language(tsjava.language()))
 
+        # artifactId-version -> sources jar and sources jar -> artifact, set by add_dependencies
+        self._jars: dict[str, Path] = {}
+        self._artifacts: dict[str, Artifact] = {}
+
     def add_dependencies(self, path: Path, files: list[Path]):
-        # if not Path("java-decompiler-engine-243.23654.153.jar").is_file():
-        #     subprocess.run(["wget", "https://www.jetbrains.com/intellij-repository/releases/com/jetbrains/intellij/java/java-decompiler-engine/243.23654.153/java-decompiler-engine-243.23654.153.jar"])
-        subprocess.run(["rm", "-rf", f"{path}/temp_deps"])
-        pom = ElementTree.parse(str(path) + '/pom.xml')
-        for dependency in pom.findall('.//{http://maven.apache.org/POM/4.0.0}dependency'):
-            groupId = dependency.find('{http://maven.apache.org/POM/4.0.0}groupId').text.replace('.', '/')
-            artifactId = dependency.find('{http://maven.apache.org/POM/4.0.0}artifactId').text
-            version = dependency.find('{http://maven.apache.org/POM/4.0.0}version').text
-            # jar_path = f"{Path.home()}/.m2/repository/{groupId}/{artifactId}/{version}/{artifactId}-{version}.jar"
-            jar_path = f"{Path.home()}/.m2/repository/{groupId}/{artifactId}/{version}/{artifactId}-{version}-sources.jar"
-
-            os.makedirs(f"{path}/temp_deps/{artifactId}-{version}", exist_ok=True)
-            # subprocess.run(["java", "-jar", "java-decompiler-engine-243.23654.153.jar", "-hdc=0 -iib=1 -rsy=1 -rbr=1 -dgs=1 -din=1 -den=1 -asc=1 -bsm=1", jar_path, f"{path}/temp_deps/{artifactId}-{version}"])
-            subprocess.run(["cp", jar_path, f"{artifactId}-{version}.jar"], cwd=f"{path}/temp_deps/{artifactId}-{version}")
-            subprocess.run(["unzip", f"{artifactId}-{version}.jar"], cwd=f"{path}/temp_deps/{artifactId}-{version}")
-        files.extend(Path(f"{path}/temp_deps").rglob("*.java"))
+        """
+        Adds the sources of the Maven dependencies declared by the project's pom.xml,
+        read in place from the dependencies' sources jars.
+        """
+
+        self._jars = {}
+        self._artifacts = {}
+        pom = Path(f"{path}/pom.xml")
+        if not pom.is_file():
+            return
+
+        for artifact in parse_pom(pom):
+            jar = artifact.sources_jar()
+            if not jar.is_file():
+                logger.warning(f"Missing sources jar for {artifact.coordinates}: {jar}")
+                continue
+
+            try:
+                files.extend(source_jars.files(artifact, jar))
+            except (OSError, zipfile.BadZipFile) as e:
+                logger.warning(f"Failed to read sources jar {jar}: {e}")
+                continue
+
+            self._jars[artifact.name] = jar
+            self._artifacts[str(jar)] = artifact
+
+    def read_source(self, file_path: Path) -> bytes:
+        if split_member_path(file_path) is not None:
+            return source_jars.read(file_path)
+        return super().read_source(file_path)
+
+    def parse(self, file_path: Path, source: bytes) -> Tree:
+        # Dependency trees are shared across projects
+        if split_member_path(file_path) is not None:
+            return source_jars.parse(file_path, source, self.parser)
+        return self.parser.parse(source)
 
     def get_entity_label(self, node: Node) -> str:
         if node.type == 'class_declaration':
@@ -65,59 +87,46 @@ class JavaAnalyzer(AbstractAnalyzer):
     def get_entity_types(self) -> list[str]:
         return ['class_declaration', 'interface_declaration', 'enum_declaration', 'method_declaration', 'constructor_declaration']
     
-    def add_symbols(self, entity: Entity) -> None:
-        if entity.node.type == 'class_declaration':
-            interfaces_query = self.language.query("(super_interfaces (type_list (type_identifier) @interface))")
-            interfaces_captures = interfaces_query.captures(entity.node)
-            if 'interface' in interfaces_captures:
-                for interface in interfaces_captures['interface']:
-                    entity.add_symbol("implement_interface", interface)
-            base_class_query = self.language.query("(superclass (type_identifier) @base_class)")
-            base_class_captures = base_class_query.captures(entity.node)
-            if 'base_class' in base_class_captures:
-                base_class = base_class_captures['base_class'][0]
-                entity.add_symbol("base_class", base_class)
-        elif entity.node.type == 'interface_declaration':
-            query = self.language.query("(extends_interfaces (type_list (type_identifier) @type))?")
-            extends_captures = query.captures(entity.node)
-            if 'type' in extends_captures:
-                for interface in extends_captures['type']:
-                    entity.add_symbol("extend_interface", interface)
-        elif entity.node.type in ['method_declaration', 'constructor_declaration']:
-            query = self.language.query("(method_invocation) @reference.call")
-            captures = query.captures(entity.node)
-            if 'reference.call' in captures:
-                for caller in captures['reference.call']:
-                    entity.add_symbol("call", caller)
-            if entity.node.type == 'method_declaration':
-                query = self.language.query("(formal_parameters (formal_parameter type: (_) @parameter))")
-                captures = query.captures(entity.node)
-                if 'parameter' in captures:
-                    for parameter in captures['parameter']:
-                        entity.add_symbol("parameters", parameter)
-                entity.add_symbol("return_type", entity.node.child_by_field_name('type'))
+    def get_symbol_queries(self) -> dict[str, tuple[list[str], str]]:
+        return {
+            'implement_interface': (['class_declaration'], "(class_declaration interfaces: (super_interfaces (type_list (type_identifier) @implement_interface)))"),
+            'base_class': (['class_declaration'], "(class_declaration superclass: (superclass (type_identifier) @base_class))"),
+            'extend_interface': (['interface_declaration'], "(interface_declaration (extends_interfaces (type_list (type_identifier) @extend_interface)))"),
+            'call': (['method_declaration', 'constructor_declaration'], "(method_invocation) @call"),
+            'parameters': (['method_declaration'], "(method_declaration parameters: (formal_parameters (formal_parameter type: (_) @parameters)))"),
+            'return_type': (['method_declaration'], "(method_declaration type: (_) @return_type)"),
+        }
 
     def is_dependency(self, file_path: str) -> bool:
         return ".jar" in file_path
 
+    def get_dependency_package(self, file_path: str) -> Optional[str]:
+        member = split_member_path(Path(file_path))
+        artifact = self._artifacts.get(member[0]) if member is not None else None
+        if artifact is None:
+            return None
+        return f"{artifact.group}:{artifact.artifact}@{artifact.version}"
+
     def resolve_path(self, file_path: str, path: Path) -> str:
         if ".jar" in file_path:
             args = file_path.replace(".jar", "").replace(".class", ".java").split("/")
             targs = "/".join(["/".join(arg.split(".")) for arg in args[2:-1]])
-            return f"{path}/temp_deps/{args[1]}/{targs}/{args[-1]}"
+            jar = self._jars.get(args[1])
+            if jar is not None:
+                return str(member_path(jar, f"{targs}/{args[-1]}"))
         return file_path
 
-    def resolve_type(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path: Path, node: Node) -> list[Entity]:
+    async def resolve_type(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path: Path, node: Node) -> list[Entity]:
         res = []
-        for file, resolved_node in self.resolve(files, lsp, file_path, path, node):
+        for file, resolved_node in await self.resolve(files, lsp, file_path, path, node):
             type_dec = self.find_parent(resolved_node, ['class_declaration', 'interface_declaration', 'enum_declaration'])
             if type_dec in file.entities:
                 res.append(file.entities[type_dec])
         return res
 
-    def resolve_method(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path: Path, node: Node) -> list[Entity]:
+    async def resolve_method(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path: Path, node: Node) -> list[Entity]:
         res = []
-        for file, resolved_node in self.resolve(files, lsp, file_path, path, node.child_by_field_name('name')):
+        for file, resolved_node in await self.resolve(files, lsp, file_path, path, node.child_by_field_name('name')):
             method_dec = self.find_parent(resolved_node, ['method_declaration', 'constructor_declaration', 'class_declaration', 'interface_declaration', 'enum_declaration'])
             if method_dec and method_dec.type in ['class_declaration', 'interface_declaration', 'enum_declaration']:
                 continue
@@ -125,10 +134,10 @@ class JavaAnalyzer(AbstractAnalyzer):
                 res.append(file.entities[method_dec])
         return res
     
-    def resolve_symbol(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path: Path, key: str, symbol: Node) -> Entity:
+    async def resolve_symbol(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path: Path, key: str, symbol: Node) -> list[Entity]:
         if key in ["implement_interface", "base_class", "extend_interface", "parameters", "return_type"]:
-            return self.resolve_type(files, lsp, file_path, path, symbol)
+            return await self.resolve_type(files, lsp, file_path, path, symbol)
         elif key in ["call"]:
-            return self.resolve_method(files, lsp, file_path, path, symbol)
+            return await self.resolve_method(files, lsp, file_path, path, symbol)
         else:
             raise ValueError(f"Unknown key {key}")
@@ -0,0 +1,172 @@
+import os
+import logging
+import zipfile
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from tree_sitter import Parser, Tree
+from xml.etree import ElementTree
+
+logger = logging.getLogger('code_graph')
+
+POM_NS = '{http://maven.apache.org/POM/4.0.0}'
+
+# Separates a source jar from the path of a file within it, e.g.
+# ~/.m2/repository/.../junit-4.13-sources.jar!/org/junit/Assert.java
+SEPARATOR = '!/'
+
+class Artifact(NamedTuple):
+    group: str
+    artifact: str
+    version: str
+
+    @property
+    def coordinates(self) -> str:
+        return f"{self.group}:{self.artifact}:{self.version}"
+
+    @property
+    def name(self) -> str:
+        return f"{self.artifact}-{self.version}"
+
+    def sources_jar(self, repository: Optional[Path] = None) -> Path:
+        """
+        Path of the artifact's sources jar within the local Maven repository.
+        """
+
+        if repository is None:
+            repository = Path(os.getenv('CODE_GRAPH_MAVEN_REPOSITORY', Path.home() / ".m2" / "repository"))
+        return repository / self.group.replace('.', '/') / self.artifact / self.version / f"{self.name}-sources.jar"
+
+def parse_pom(pom: Path) -> List[Artifact]:
+    """
+    List the dependencies declared by a pom.xml, dependencies without an
+    explicit version (e.g. managed by a parent pom) are skipped.
+    """
+
+    res = []
+    for dependency in ElementTree.parse(str(pom)).findall(f'.//{POM_NS}dependency'):
+        group, artifact, version = [dependency.find(f'{POM_NS}{tag}') for tag in ['groupId', 'artifactId', 'version']]
+        if group is None or artifact is None or version is None or '${' in (version.text or '${'):
+            logger.debug(f"Skipping dependency without a resolvable version in {pom}")
+            continue
+        res.append(Artifact(group.text.strip(), artifact.text.strip(), version.text.strip()))
+    return res
+
+def member_path(jar: Path, member: str) -> Path:
+    """ Path of a file within a source jar """
+    return Path(f"{jar}{SEPARATOR}{member}")
+
+def split_member_path(path: Path) -> Optional[Tuple[str, str]]:
+    """ Split the path of a file within a source jar into the jar and member paths, None for regular files """
+    jar, sep, member = str(path).partition(SEPARATOR)
+    return (jar, member) if sep else None
+
+class SourceJars:
+    """
+    Process wide access to dependency source jars.
+
+    Jars are read in place, their files are never extracted to disk. The
+    listing of each jar is cached by artifact coordinates and parsed trees
+    of jar files are kept in a bounded LRU, both are shared across projects,
+    a jar is only read again once its size or modification time changed.
+    """
+
+    def __init__(self, max_trees: Optional[int] = None) -> None:
+        """
+        Args:
+            max_trees (int, optional): Number of parsed trees kept in memory,
+                defaults to $CODE_GRAPH_JAR_TREES or 10000.
+        """
+
+        if max_trees is None:
+            max_trees = int(os.getenv('CODE_GRAPH_JAR_TREES', "10000"))
+
+        self.max_trees = max_trees
+        self.lock = threading.Lock()
+
+        # jar path -> ((size, mtime), open archive)
+        self.archives: Dict[str, Tuple[Tuple[int, int], zipfile.ZipFile]] = {}
+        # coordinates -> ((size, mtime), java members)
+        self.listings: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+        # (member path, (size, mtime)) -> parsed tree
+        self.trees: OrderedDict = OrderedDict()
+
+    def _stamp(self, jar: str) -> Tuple[int, int]:
+        stat = os.stat(jar)
+        return stat.st_size, stat.st_mtime_ns
+
+    def archive(self, jar: str) -> zipfile.ZipFile:
+        """
+        Open a jar, archives are kept open for as long as they are unchanged.
+        """
+
+        stamp = self._stamp(jar)
+        with self.lock:
+            entry = self.archives.get(jar)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+            if entry is not None:
+                entry[1].close()
+
+            archive = zipfile.ZipFile(jar)
+            self.archives[jar] = (stamp, archive)
+            return archive
+
+    def files(self, artifact: Artifact, jar: Path) -> List[Path]:
+        """
+        List the java files of an artifact's sources jar.
+
+        Args:
+            artifact (Artifact): The artifact.
+            jar (Path): The artifact's sources jar.
+
+        Returns:
+            list[Path]: Paths of the jar's java files, see member_path.
+        """
+
+        stamp = self._stamp(str(jar))
+        entry = self.listings.get(artifact.coordinates)
+        if entry is None or entry[0] != stamp:
+            members = [name for name in self.archive(str(jar)).namelist() if name.endswith('.java')]
+            entry = (stamp, members)
+            self.listings[artifact.coordinates] = entry
+        else:
+            logger.debug(f"Reusing the listing of {artifact.coordinates}")
+
+        return [member_path(jar, member) for member in entry[1]]
+
+    def read(self, path: Path) -> bytes:
+        """
+        Read a file within a source jar.
+        """
+
+        jar, member = split_member_path(path)
+        archive = self.archive(jar)
+        with self.lock:
+            return archive.read(member)
+
+    def parse(self, path: Path, source: bytes, parser: Parser) -> Tree:
+        """
+        Parse a file within a source jar, reusing its tree if parsed before.
+        """
+
+        key = (str(path), self._stamp(split_member_path(path)[0]))
+        with self.lock:
+            tree = self.trees.get(key)
+            if tree is not None:
+                self.trees.move_to_end(key)
+                return tree
+
+        tree = parser.parse(source)
+
+        with self.lock:
+            self.trees[key] = tree
+            while len(self.trees) > self.max_trees:
+                self.trees.popitem(last=False)
+
+        return tree
+
+# Shared by every analyzer of the process
+source_jars = SourceJars()
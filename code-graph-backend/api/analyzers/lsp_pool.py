@@ -0,0 +1,233 @@
+import os
+import zlib
+import asyncio
+import logging
+from pathlib import Path
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from multilspy import LanguageServer
+
+class LanguageServerShard:
+    """
+    A single language server instance of a pool, restarted whenever it dies.
+    """
+
+    def __init__(self, index: int, factory: Callable[[], LanguageServer]) -> None:
+        self.index    = index
+        self.factory  = factory
+        self.server: Optional[LanguageServer] = None
+        self.stack: Optional[AsyncExitStack] = None
+        self.lock     = asyncio.Lock()
+
+        # Health tracking
+        self.requests = 0
+        self.failures = 0
+        self.restarts = 0
+        self.down     = False
+
+    def alive(self) -> bool:
+        """
+        Check whether the language server process is still running.
+        """
+
+        if self.server is None:
+            return False
+
+        process = getattr(getattr(self.server, 'server', None), 'process', None)
+        return process is not None and process.returncode is None
+
+    async def start(self) -> None:
+        stack = AsyncExitStack()
+        try:
+            server = self.factory()
+            await stack.enter_async_context(server.start_server())
+        except BaseException:
+            await stack.aclose()
+            raise
+
+        self.server = server
+        self.stack  = stack
+
+    async def stop(self) -> None:
+        stack, self.stack, self.server = self.stack, None, None
+        if stack is None:
+            return
+
+        try:
+            await stack.aclose()
+        except Exception as e:
+            logging.warning(f"Failed to stop language server {self.index}: {e}")
+
+    async def restart(self, max_restarts: int) -> None:
+        """
+        Replace a dead language server, the shard is marked down once it
+        was restarted max_restarts times.
+        """
+
+        async with self.lock:
+            # Restarted meanwhile by a concurrent request
+            if self.alive() or self.down:
+                return
+
+            await self.stop()
+
+            if self.restarts >= max_restarts:
+                logging.error(f"Language server {self.index} keeps crashing, taking it out of the pool")
+                self.down = True
+                return
+
+            self.restarts += 1
+            logging.warning(f"Restarting language server {self.index} (restart {self.restarts}/{max_restarts})")
+
+            try:
+                await self.start()
+            except Exception as e:
+                logging.error(f"Failed to restart language server {self.index}: {e}")
+                self.down = True
+
+class LanguageServerPool:
+    """
+    A pool of language server instances of a single language.
+
+    Files are sharded across the servers by path, all requests concerning
+    a file are served by the same server, so each server only opens and
+    analyzes its share of the files. Servers are separate processes, the
+    pool spreads symbol resolution across CPU cores.
+
+    The pool exposes the subset of the LanguageServer interface used
+    during symbol resolution: start_server and request_definition.
+    """
+
+    def __init__(self, factory: Callable[[], LanguageServer], size: Optional[int] = None,
+                 timeout: Optional[float] = None, max_restarts: int = 3, files: Optional[int] = None) -> None:
+        """
+        Args:
+            factory (Callable): Creates a (not yet started) language server.
+            size (int, optional): Number of servers, defaults to $CODE_GRAPH_LSP_SERVERS
+                or the number of CPU cores, up to 4.
+            timeout (float, optional): Seconds to wait for a response, defaults to
+                $CODE_GRAPH_LSP_TIMEOUT or 60.
+            max_restarts (int): Number of times a crashed server is restarted
+                before being taken out of the pool.
+            files (int, optional): Number of files to resolve, the pool holds no
+                more servers than files, e.g. a git history step resolving a single
+                file starts a single server.
+        """
+
+        if size is None:
+            size = int(os.getenv('CODE_GRAPH_LSP_SERVERS', str(min(4, os.cpu_count() or 1))))
+
+        if files is not None:
+            size = min(size, files)
+
+        if timeout is None:
+            timeout = float(os.getenv('CODE_GRAPH_LSP_TIMEOUT', "60"))
+
+        self.shards       = [LanguageServerShard(i, factory) for i in range(max(1, size))]
+        self.timeout      = timeout
+        self.max_restarts = max_restarts
+
+    def shard(self, relative_file_path: str) -> Optional[LanguageServerShard]:
+        """
+        Get the shard serving the file, skipping shards taken out of the pool.
+        """
+
+        start = zlib.crc32(relative_file_path.encode('utf-8')) % len(self.shards)
+        for i in range(len(self.shards)):
+            shard = self.shards[(start + i) % len(self.shards)]
+            if not shard.down:
+                return shard
+
+        return None
+
+    @asynccontextmanager
+    async def start_server(self) -> AsyncIterator["LanguageServerPool"]:
+        """
+        Start every server of the pool, servers failing to start are taken out of the pool.
+        """
+
+        logging.info(f"Starting {len(self.shards)} language servers")
+        results = await asyncio.gather(*[shard.start() for shard in self.shards], return_exceptions=True)
+        for shard, result in zip(self.shards, results):
+            if isinstance(result, BaseException):
+                logging.error(f"Failed to start language server {shard.index}: {result}")
+                shard.down = True
+
+        try:
+            yield self
+        finally:
+            await asyncio.gather(*[shard.stop() for shard in self.shards])
+
+            for shard in self.shards:
+                logging.info(f"Language server {shard.index}, requests: {shard.requests}, failures: {shard.failures}, restarts: {shard.restarts}")
+
+    async def request_definition(self, relative_file_path: str, line: int, column: int) -> list:
+        """
+        Request the definition of the symbol at the given position from the
+        file's server, a request failing due to a crashed server is retried
+        once the server is restarted.
+        """
+
+        for _ in range(self.max_restarts + 1):
+            shard = self.shard(relative_file_path)
+            if shard is None:
+                raise RuntimeError("No language server available")
+
+            server = shard.server
+            shard.requests += 1
+
+            try:
+                return await asyncio.wait_for(server.request_definition(relative_file_path, line, column), self.timeout)
+            except Exception:
+                shard.failures += 1
+
+                # The server is fine, the request itself failed
+                if shard.alive() and shard.server is server:
+                    raise
+
+            await shard.restart(self.max_restarts)
+
+        raise RuntimeError(f"Failed to resolve definition in {relative_file_path}")
+
+class RelocatedLanguageServer:
+    """
+    Serves a project through a language server rooted at a copy of the
+    project in another folder, e.g. the files of a git commit, see
+    ScratchWorktree.
+
+    Request paths are mapped from the project into the copy, response
+    paths from the copy back into the project, paths outside of the copy,
+    e.g. installed packages, are left as is.
+    """
+
+    def __init__(self, server, path: Path, root: Path) -> None:
+        """
+        Args:
+            server (LanguageServer | LanguageServerPool): The server rooted at root.
+            path (Path): The project's folder.
+            root (Path): The folder holding the copy of the project.
+        """
+
+        self.server = server
+        self.path   = path
+        self.root   = root
+
+    @asynccontextmanager
+    async def start_server(self) -> AsyncIterator["RelocatedLanguageServer"]:
+        async with self.server.start_server():
+            yield self
+
+    @staticmethod
+    def _move(file_path: str, src: Path, dest: Path) -> str:
+        try:
+            return str(dest / Path(file_path).relative_to(src))
+        except ValueError:
+            return file_path
+
+    async def request_definition(self, relative_file_path: str, line: int, column: int) -> list:
+        locations = await self.server.request_definition(self._move(relative_file_path, self.path, self.root), line, column)
+        for location in locations:
+            if location and 'absolutePath' in location:
+                location['absolutePath'] = self._move(location['absolutePath'], self.root, self.path)
+        return locations
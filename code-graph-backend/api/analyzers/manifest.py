@@ -0,0 +1,101 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+from ..info import get_repo_manifest, update_repo_manifest
+
+class Manifest():
+    """
+    Tracks the size, modification time and content hash of every file
+    analyzed for a project, used to detect which files changed since the
+    last analysis.
+
+    A file whose size and modification time are unchanged is assumed
+    unchanged without being read, otherwise its content hash decides.
+    """
+
+    def __init__(self, repo_name: str) -> None:
+        self.repo_name = repo_name
+        self.entries: dict[str, list] = get_repo_manifest(repo_name)
+
+        # Pending updates, written by save
+        self.changed: dict[str, list] = {}
+        self.removed: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _state(file_path: Path, previous: Optional[list]) -> list:
+        stat = file_path.stat()
+        if previous is not None and previous[0] == stat.st_size and previous[1] == stat.st_mtime_ns:
+            return previous
+
+        digest = hashlib.blake2b(file_path.read_bytes(), digest_size=20).hexdigest()
+        return [stat.st_size, stat.st_mtime_ns, digest]
+
+    def update(self, files: list[Path]) -> None:
+        """
+        Record the current state of the files, e.g. once analyzed, persisted by save.
+        Files missing from the given ones are recorded as removed.
+
+        Args:
+            files (list[Path]): The files currently part of the project.
+        """
+
+        self.changed = {}
+        current = set()
+
+        for file_path in files:
+            path = str(file_path)
+            current.add(path)
+
+            previous = self.entries.get(path)
+            state = self._state(file_path, previous)
+            if state is not previous:
+                self.changed[path] = state
+
+        self.removed = [path for path in self.entries if path not in current]
+
+    def diff(self, files: list[Path]) -> tuple[list[Path], list[Path], list[Path]]:
+        """
+        Compare the manifest against the current files, the current state is
+        recorded, see update.
+
+        Args:
+            files (list[Path]): The files currently part of the project.
+
+        Returns:
+            tuple[list[Path], list[Path], list[Path]]: Added, modified and removed files.
+        """
+
+        self.update(files)
+
+        added, modified = [], []
+        for path, state in self.changed.items():
+            previous = self.entries.get(path)
+            if previous is None:
+                added.append(Path(path))
+            elif previous[2] != state[2]:
+                modified.append(Path(path))
+
+        removed = [Path(path) for path in self.removed]
+
+        logging.info(f"Manifest diff, added: {len(added)}, modified: {len(modified)}, removed: {len(removed)}")
+
+        return added, modified, removed
+
+    def save(self) -> None:
+        """
+        Persist the changes detected by the last diff.
+        """
+
+        update_repo_manifest(self.repo_name, self.changed, self.removed)
+
+        for path in self.removed:
+            self.entries.pop(path, None)
+        self.entries.update(self.changed)
+
+        self.changed = {}
+        self.removed = []
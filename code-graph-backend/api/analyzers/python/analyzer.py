@@ -1,12 +1,13 @@
 import os
 import subprocess
-from multilspy import SyncLanguageServer
+from multilspy import LanguageServer
 from pathlib import Path
 
 import toml
 from ...entities import *
 from typing import *
 from ..analyzer import AbstractAnalyzer
+from .static_resolver import ModuleTable, StaticResolver
 
 import tree_sitter_python as tspython
 from tree_sitter import Language, Node
@@ -17,8 +18,21 @@ logger = logging.getLogger('code_graph')
 class PythonAnalyzer(AbstractAnalyzer):
     def __init__(self) -> None:
         super().__init__(Language(tspython.language()))
-    
+
+        # Symbol resolution mode, either "lsp" (jedi-language-server) or
+        # "static" (StaticResolver, no language server nor virtual env)
+        self.resolution = os.getenv('CODE_GRAPH_PYTHON_RESOLUTION', "lsp")
+        self._project_root: Optional[Path] = None
+        self._resolver: Optional[StaticResolver] = None # Built by index_symbols, in static mode
+        self._versions: dict[tuple[Path, str], Optional[str]] = {}
+
     def add_dependencies(self, path: Path, files: list[Path]):
+        self._project_root = path
+
+        # Dependencies are only resolvable through the language server
+        if self.resolution == "static":
+            return
+
         if Path(f"{path}/venv").is_dir():
             return
         subprocess.run(["python3", "-m", "venv", "venv"], cwd=str(path))
@@ -60,53 +74,78 @@ class PythonAnalyzer(AbstractAnalyzer):
     def get_entity_types(self) -> list[str]:
         return ['class_definition', 'function_definition']
     
-    def add_symbols(self, entity: Entity) -> None:
-        if entity.node.type == 'class_definition':
-            superclasses = entity.node.child_by_field_name("superclasses")
-            if superclasses:
-                base_classes_query = self.language.query("(argument_list (_) @base_class)")
-                base_classes_captures = base_classes_query.captures(superclasses)
-                if 'base_class' in base_classes_captures:
-                    for base_class in base_classes_captures['base_class']:
-                        entity.add_symbol("base_class", base_class)
-        elif entity.node.type == 'function_definition':
-            query = self.language.query("(call) @reference.call")
-            captures = query.captures(entity.node)
-            if 'reference.call' in captures:
-                for caller in captures['reference.call']:
-                    entity.add_symbol("call", caller)
-            query = self.language.query("(typed_parameter type: (_) @parameter)")
-            captures = query.captures(entity.node)
-            if 'parameter' in captures:
-                for parameter in captures['parameter']:
-                    entity.add_symbol("parameters", parameter)
-            return_type = entity.node.child_by_field_name('return_type')
-            if return_type:
-                entity.add_symbol("return_type", return_type)
+    def get_symbol_queries(self) -> dict[str, tuple[list[str], str]]:
+        return {
+            'base_class': (['class_definition'], "(class_definition superclasses: (argument_list (_) @base_class))"),
+            'call': (['function_definition'], "(call) @call"),
+            'parameters': (['function_definition'], "(typed_parameter type: (_) @parameters)"),
+            'return_type': (['function_definition'], "(function_definition return_type: (_) @return_type)"),
+        }
+
+    def get_file_relations(self, files: dict[Path, File]) -> list[tuple[str, Path, Path]]:
+        if self._project_root is None:
+            return []
+
+        table = ModuleTable(self._project_root, {p: f for p, f in files.items() if not self.is_dependency(str(p))})
+        return [("IMPORTS", module.path, imported.path)
+                for module in table.by_path.values()
+                for imported in table.imported_modules(module)]
+
+    def index_symbols(self, files: dict[Path, File]) -> None:
+        """
+        Builds the module and symbol tables used to resolve symbols in static mode.
+        """
+
+        self._resolver = None
+        if self.resolution == "static" and self._project_root is not None:
+            self._resolver = StaticResolver(self._project_root, files)
 
     def is_dependency(self, file_path: str) -> bool:
         return "venv" in file_path
 
+    def get_dependency_package(self, file_path: str) -> Optional[str]:
+        parts = Path(file_path).parts
+        if 'site-packages' not in parts:
+            return None
+
+        i = parts.index('site-packages')
+        if i + 1 >= len(parts):
+            return None
+
+        site_packages = Path(*parts[:i + 1])
+        name = parts[i + 1].removesuffix('.py')
+
+        # Installed version, from the package's dist-info folder
+        key = (site_packages, name)
+        if key not in self._versions:
+            normalized = name.lower().replace('-', '_')
+            self._versions[key] = next((d.name[:-len('.dist-info')].split('-', 1)[1]
+                                        for d in site_packages.glob('*.dist-info')
+                                        if d.name.lower().split('-', 1)[0].replace('-', '_') == normalized and '-' in d.name), None)
+
+        version = self._versions[key]
+        return f"{name}@{version}" if version is not None else None
+
     def resolve_path(self, file_path: str, path: Path) -> str:
         return file_path
 
-    def resolve_type(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path, node: Node) -> list[Entity]:
+    async def resolve_type(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path, node: Node) -> list[Entity]:
         res = []
         if node.type == 'attribute':
             node = node.child_by_field_name('attribute')
-        for file, resolved_node in self.resolve(files, lsp, file_path, path, node):
+        for file, resolved_node in await self.resolve(files, lsp, file_path, path, node):
             type_dec = self.find_parent(resolved_node, ['class_definition'])
             if type_dec in file.entities:
                 res.append(file.entities[type_dec])
         return res
 
-    def resolve_method(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path: Path, node: Node) -> list[Entity]:
+    async def resolve_method(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path: Path, node: Node) -> list[Entity]:
         res = []
         if node.type == 'call':
             node = node.child_by_field_name('function')
             if node.type == 'attribute':
                 node = node.child_by_field_name('attribute')
-        for file, resolved_node in self.resolve(files, lsp, file_path, path, node):
+        for file, resolved_node in await self.resolve(files, lsp, file_path, path, node):
             method_dec = self.find_parent(resolved_node, ['function_definition', 'class_definition'])
             if not method_dec:
                 continue
@@ -114,10 +153,13 @@ class PythonAnalyzer(AbstractAnalyzer):
                 res.append(file.entities[method_dec])
         return res
     
-    def resolve_symbol(self, files: dict[Path, File], lsp: SyncLanguageServer, file_path: Path, path: Path, key: str, symbol: Node) -> Entity:
+    async def resolve_symbol(self, files: dict[Path, File], lsp: LanguageServer, file_path: Path, path: Path, key: str, symbol: Node) -> list[Entity]:
+        if self._resolver is not None:
+            return self._resolver.resolve(file_path, key, symbol)
+
         if key in ["base_class", "parameters", "return_type"]:
-            return self.resolve_type(files, lsp, file_path, path, symbol)
+            return await self.resolve_type(files, lsp, file_path, path, symbol)
         elif key in ["call"]:
-            return self.resolve_method(files, lsp, file_path, path, symbol)
+            return await self.resolve_method(files, lsp, file_path, path, symbol)
         else:
             raise ValueError(f"Unknown key {key}")
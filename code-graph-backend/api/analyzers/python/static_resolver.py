@@ -0,0 +1,639 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+from tree_sitter import Node
+from api.entities import Entity, File
+from api.entities.entity import Span, span
+
+logger = logging.getLogger('code_graph')
+
+# Scopes, bindings made within a nested scope are not visible outside of it
+SCOPE_NODES = ['function_definition', 'class_definition', 'lambda']
+
+# Guards against pathological (e.g. cyclic) inference chains
+MAX_DEPTH = 16
+
+class Module:
+    """
+    A project module, packages without an __init__.py file have no file.
+    """
+
+    def __init__(self, name: str, path: Optional[Path] = None, file: Optional[File] = None, package: bool = False) -> None:
+        self.name    = name
+        self.path    = path
+        self.file    = file
+        self.package = package
+
+class Instance(NamedTuple):
+    """ An instance of a project class """
+    cls: Entity
+
+class Binding(NamedTuple):
+    """
+    A name bound within a scope, by a definition, an import or an assignment.
+    """
+    kind: str                     # 'entity', 'module', 'import', 'value' or 'param'
+    entity: Optional[Entity] = None
+    module: Optional[str] = None  # Imported module, absolute dotted name
+    attr: Optional[str] = None    # Imported attribute, from module import attr
+    span: Optional[Span] = None   # Assigned value or parameter annotation
+
+Value = Union[Module, Entity, Instance]
+
+# Binding kinds by precedence, definitions shadow imports which shadow assignments
+PRECEDENCE = {'param': 0, 'entity': 1, 'module': 2, 'import': 2, 'value': 3}
+
+def _text(node: Node) -> str:
+    return node.text.decode('utf-8')
+
+def _span(node: Optional[Node]) -> Optional[Span]:
+    return span(node) if node is not None else None
+
+def module_name(path: Path, root: Path) -> Optional[str]:
+    """
+    Dotted module name of a file, relative to the project root.
+
+    Returns:
+        Optional[str]: The module name, None for files outside the root.
+    """
+
+    try:
+        parts = list(path.relative_to(root).with_suffix('').parts)
+    except ValueError:
+        return None
+
+    if parts and parts[-1] == '__init__':
+        parts = parts[:-1]
+
+    return '.'.join(parts) if parts else None
+
+class ModuleTable:
+    """
+    The modules of a Python project and the imports between them.
+
+    Modules are named by their path relative to the project root, imports
+    which do not match a module by their full name fall back to the single
+    module whose name ends with the imported name, e.g. for a src/ layout.
+    """
+
+    def __init__(self, root: Path, files: Dict[Path, File]) -> None:
+        self.root = root
+        self.modules: Dict[str, Module] = {}
+        self.by_path: Dict[Path, Module] = {}
+        self.suffixes: Dict[str, List[str]] = {}
+
+        for path, file in files.items():
+            name = module_name(path, root)
+            if name is None:
+                continue
+
+            module = Module(name, path, file, path.stem == '__init__')
+            self.modules[name] = module
+            self.by_path[path] = module
+
+        # Namespace packages
+        for name in list(self.modules):
+            parts = name.split('.')
+            for i in range(1, len(parts)):
+                self.modules.setdefault('.'.join(parts[:i]), Module('.'.join(parts[:i]), package=True))
+
+        for name in self.modules:
+            parts = name.split('.')
+            for i in range(1, len(parts)):
+                self.suffixes.setdefault('.'.join(parts[i:]), []).append(name)
+
+    def find(self, name: str) -> Optional[Module]:
+        """
+        Find a module by its dotted name.
+        """
+
+        module = self.modules.get(name)
+        if module is not None:
+            return module
+
+        candidates = self.suffixes.get(name, [])
+        if len(candidates) == 1:
+            return self.modules[candidates[0]]
+
+        return None
+
+    def absolute(self, module: Module, node: Node) -> Optional[str]:
+        """
+        Absolute name of the module imported by an import_from_statement's module_name.
+        """
+
+        if node.type == 'dotted_name':
+            return _text(node)
+
+        # Relative import, one dot refers to the current package
+        prefix = next((c for c in node.children if c.type == 'import_prefix'), None)
+        level = len(_text(prefix)) if prefix is not None else 0
+        parts = module.name.split('.')
+        if not module.package:
+            parts = parts[:-1]
+        if level - 1 > len(parts):
+            return None
+        parts = parts[:len(parts) - (level - 1)]
+
+        name = next((c for c in node.children if c.type == 'dotted_name'), None)
+        if name is not None:
+            parts.append(_text(name))
+
+        return '.'.join(parts)
+
+    def imports(self, module: Module) -> List[Tuple[Node, str, Optional[str], Optional[str]]]:
+        """
+        Imports of a module, anywhere in its file.
+
+        Returns:
+            list[tuple[Node, str, str, str]]: (import statement, module, attribute, bound name) tuples,
+                attribute is None for plain imports, bound name is None for wildcard imports.
+        """
+
+        if module.file is None:
+            return []
+
+        res = []
+        stack = [module.file.tree.root_node]
+        while stack:
+            node = stack.pop()
+            if node.type == 'import_statement':
+                for name in node.children_by_field_name('name'):
+                    if name.type == 'aliased_import':
+                        # import a.b as x binds x to a.b
+                        res.append((node, _text(name.child_by_field_name('name')), None, _text(name.child_by_field_name('alias'))))
+                    else:
+                        # import a.b binds a
+                        dotted = _text(name)
+                        res.append((node, dotted, None, dotted.split('.')[0]))
+
+            elif node.type == 'import_from_statement':
+                source = self.absolute(module, node.child_by_field_name('module_name'))
+                if source is None:
+                    continue
+                if any(c.type == 'wildcard_import' for c in node.children):
+                    res.append((node, source, '*', None))
+                for name in node.children_by_field_name('name'):
+                    if name.type == 'aliased_import':
+                        res.append((node, source, _text(name.child_by_field_name('name')), _text(name.child_by_field_name('alias'))))
+                    else:
+                        res.append((node, source, _text(name), _text(name)))
+
+            else:
+                stack.extend(node.children)
+
+        return res
+
+    def imported_modules(self, module: Module) -> List[Module]:
+        """
+        Project modules imported by a module.
+        """
+
+        res: Dict[str, Module] = {}
+        for _, source, attr, _ in self.imports(module):
+            # from pkg import submodule
+            target = self.find(f"{source}.{attr}") if attr not in (None, '*') else None
+            if target is None or target.file is None:
+                target = self.find(source)
+            if target is not None and target.file is not None and target is not module:
+                res[target.name] = target
+
+        return list(res.values())
+
+class StaticResolver:
+    """
+    Resolves Python symbols without a language server.
+
+    Builds a module table and, lazily, per scope symbol tables out of the
+    extracted entities, imports and assignments, names are then looked up
+    following Python's scoping rules: enclosing functions, then the module,
+    class bodies are not enclosing scopes. Attribute access is followed
+    through modules, classes (including their base classes) and instances
+    whose type is inferred from constructor calls, annotations and return
+    types. Names which can not be inferred are left unresolved.
+    """
+
+    def __init__(self, root: Path, files: Dict[Path, File]) -> None:
+        self.table = ModuleTable(root, files)
+
+        # Entity lookups
+        self.entity_module: Dict[Entity, Module] = {}
+        for path, file in files.items():
+            module = self.table.by_path.get(path)
+            if module is not None:
+                for entity in file.entities.values():
+                    self.entity_module[entity] = module
+
+        # Memoized symbol tables, scopes are keyed by module and span, and
+        # hold spans rather than nodes, as files may be released and parsed
+        # again in between lookups, see TreeCache
+        self._scopes: Dict[Tuple[str, Optional[Span]], Dict[str, List[Binding]]] = {}
+        self._attributes: Dict[Entity, Dict[str, List[Span]]] = {}
+        self._bases: Dict[Entity, List[Entity]] = {}
+
+        logger.info(f"Indexed {len([m for m in self.table.modules.values() if m.file is not None])} Python modules")
+
+    def module_of(self, path: Path) -> Optional[Module]:
+        return self.table.by_path.get(path)
+
+    # Symbol tables
+
+    def _bind(self, scope: Dict[str, List[Binding]], name: str, binding: Binding) -> None:
+        scope.setdefault(name, []).append(binding)
+
+    def _bind_imports(self, scope: Dict[str, List[Binding]], module: Module, owner: Node) -> None:
+        for statement, source, attr, name in self.table.imports(module):
+            if _span(self._scope_node(statement)) != _span(owner):
+                continue
+            if attr is None:
+                # import a.b binds a, import a.b as x binds a.b
+                self._bind(scope, name, Binding('module', module=name if name == source.split('.')[0] else source))
+            elif attr == '*':
+                target = self.table.find(source)
+                if target is not None:
+                    for star in self.scope(target, None):
+                        if not star.startswith('_'):
+                            self._bind(scope, star, Binding('import', module=target.name, attr=star))
+            else:
+                self._bind(scope, name, Binding('import', module=source, attr=attr))
+
+    def _scope_node(self, node: Node) -> Optional[Node]:
+        """
+        The function or class whose body holds the node, None for the module.
+        Parameter annotations, defaults and base classes belong to the enclosing scope.
+        """
+
+        child, parent = node, node.parent
+        while parent is not None:
+            if parent.type in SCOPE_NODES and parent.child_by_field_name('body') == child:
+                return parent
+            child, parent = parent, parent.parent
+        return None
+
+    def scope(self, module: Module, owner: Optional[Node]) -> Dict[str, List[Binding]]:
+        """
+        Names bound within a scope.
+
+        Args:
+            module (Module): The module.
+            owner (Node): The scope defining node, None for the module scope.
+
+        Returns:
+            dict[str, list[Binding]]: The scope's bindings.
+        """
+
+        scope: Dict[str, List[Binding]] = {}
+        if module.file is None:
+            return scope
+
+        key = (module.name, _span(owner))
+        if key in self._scopes:
+            return self._scopes[key]
+
+        # Guards against wildcard import cycles
+        self._scopes[key] = scope
+
+        if owner is not None and owner.type == 'function_definition':
+            for parameter in owner.child_by_field_name('parameters').named_children:
+                name, annotation = self._parameter(parameter)
+                if name is not None:
+                    self._bind(scope, name, Binding('param', span=_span(annotation)))
+
+        body = owner.child_by_field_name('body') if owner is not None else module.file.tree.root_node
+        stack = list(body.children) if body is not None else []
+        while stack:
+            node = stack.pop()
+            if node.type in ['function_definition', 'class_definition']:
+                entity = module.file.entities.get(node)
+                name = node.child_by_field_name('name')
+                if entity is not None and name is not None:
+                    self._bind(scope, _text(name), Binding('entity', entity=entity))
+                continue
+            if node.type == 'lambda':
+                continue
+            if node.type == 'assignment':
+                left = node.child_by_field_name('left')
+                if left is not None and left.type == 'identifier':
+                    right = node.child_by_field_name('right')
+                    annotation = node.child_by_field_name('type')
+                    if annotation is not None:
+                        self._bind(scope, _text(left), Binding('param', span=_span(annotation)))
+                    elif right is not None:
+                        self._bind(scope, _text(left), Binding('value', span=_span(right)))
+            stack.extend(node.children)
+
+        if module.file is not None:
+            self._bind_imports(scope, module, owner)
+
+        # Highest precedence first, latest binding first
+        for bindings in scope.values():
+            bindings.reverse()
+            bindings.sort(key=lambda b: PRECEDENCE[b.kind])
+
+        return scope
+
+    def _parameter(self, parameter: Node) -> Tuple[Optional[str], Optional[Node]]:
+        if parameter.type == 'identifier':
+            return _text(parameter), None
+        if parameter.type in ['default_parameter', 'typed_default_parameter']:
+            name = parameter.child_by_field_name('name')
+            return (_text(name) if name is not None else None), parameter.child_by_field_name('type')
+        if parameter.type == 'typed_parameter':
+            name = next((c for c in parameter.named_children if c.type == 'identifier'), None)
+            return (_text(name) if name is not None else None), parameter.child_by_field_name('type')
+        if parameter.type in ['list_splat_pattern', 'dictionary_splat_pattern']:
+            name = next((c for c in parameter.named_children if c.type == 'identifier'), None)
+            return (_text(name) if name is not None else None), None
+        return None, None
+
+    def attributes(self, cls: Entity) -> Dict[str, List[Span]]:
+        """
+        Attributes assigned in a class body or through self within its methods,
+        the spans of their values or annotations.
+        """
+
+        if cls in self._attributes:
+            return self._attributes[cls]
+
+        attributes: Dict[str, List[Span]] = {}
+        self._attributes[cls] = attributes
+
+        body = cls.node.child_by_field_name('body')
+        stack = list(body.children) if body is not None else []
+        while stack:
+            node = stack.pop()
+            if node.type == 'class_definition' or node.type == 'lambda':
+                continue
+            if node.type == 'function_definition':
+                # Instance attributes, self.x = ... within methods
+                parameters = node.child_by_field_name('parameters').named_children
+                receiver = self._parameter(parameters[0])[0] if parameters else None
+                if receiver is not None:
+                    for assignment in self._assignments(node):
+                        left = assignment.child_by_field_name('left')
+                        if left.type == 'attribute' and _text(left.child_by_field_name('object')) == receiver:
+                            value = assignment.child_by_field_name('type') or assignment.child_by_field_name('right')
+                            if value is not None:
+                                attributes.setdefault(_text(left.child_by_field_name('attribute')), []).append(span(value))
+                continue
+            if node.type == 'assignment':
+                left = node.child_by_field_name('left')
+                value = node.child_by_field_name('type') or node.child_by_field_name('right')
+                if left is not None and left.type == 'identifier' and value is not None:
+                    attributes.setdefault(_text(left), []).append(span(value))
+            stack.extend(node.children)
+
+        return attributes
+
+    def _assignments(self, function: Node) -> List[Node]:
+        res = []
+        stack = [function.child_by_field_name('body')]
+        while stack:
+            node = stack.pop()
+            if node is None or node.type in SCOPE_NODES:
+                continue
+            if node.type == 'assignment':
+                res.append(node)
+            stack.extend(node.children)
+        return res
+
+    def bases(self, cls: Entity) -> List[Entity]:
+        """
+        Base classes of a class, in method resolution order.
+        """
+
+        if cls in self._bases:
+            return self._bases[cls]
+
+        self._bases[cls] = []
+        module = self.entity_module.get(cls)
+        res: List[Entity] = []
+        superclasses = cls.node.child_by_field_name('superclasses')
+        if module is not None and superclasses is not None:
+            for base in superclasses.named_children:
+                if base.type == 'keyword_argument':
+                    continue
+                value = self.evaluate(base, module)
+                if isinstance(value, Entity) and value.node.type == 'class_definition':
+                    res.append(value)
+                    res.extend(b for b in self.bases(value) if b not in res)
+
+        self._bases[cls] = res
+        return res
+
+    # Name resolution
+
+    def lookup(self, name: str, node: Node, module: Module, depth: int = 0) -> Optional[Value]:
+        """
+        Resolve a name as seen from a node.
+        """
+
+        owner = self._scope_node(node)
+        while True:
+            bindings = self.scope(module, owner).get(name)
+            if bindings:
+                return self._binding_value(bindings[0], module, owner, depth)
+            if owner is None:
+                return None
+
+            # Class bodies do not enclose their methods
+            owner = self._scope_node(owner)
+            while owner is not None and owner.type == 'class_definition':
+                owner = self._scope_node(owner)
+
+    def _binding_value(self, binding: Binding, module: Module, owner: Optional[Node], depth: int) -> Optional[Value]:
+        if binding.kind == 'entity':
+            return binding.entity
+
+        if binding.kind == 'module':
+            return self.table.find(binding.module)
+
+        if binding.kind == 'import':
+            source = self.table.find(binding.module)
+            if source is None:
+                return None
+            value = self.member(source, binding.attr, depth + 1)
+            if value is None:
+                # from pkg import submodule
+                value = self.table.find(f"{source.name}.{binding.attr}")
+            return value
+
+        if binding.kind == 'value':
+            return self.evaluate(self._node(module, binding.span), module, depth + 1)
+
+        if binding.kind == 'param':
+            if binding.span is not None:
+                return self._instance(self.evaluate(self._node(module, binding.span), module, depth + 1))
+            return self._receiver(owner, binding, module)
+
+        return None
+
+    def _receiver(self, owner: Optional[Node], binding: Binding, module: Module) -> Optional[Value]:
+        """ self and cls, the first parameter of a method """
+        if owner is None or owner.type != 'function_definition':
+            return None
+
+        method = module.file.entities.get(owner) if module.file is not None else None
+        cls = getattr(method, 'parent', None)
+        if not isinstance(cls, Entity) or cls.node.type != 'class_definition':
+            return None
+
+        parameters = owner.child_by_field_name('parameters').named_children
+        if not parameters or self._parameter(parameters[0])[1] is not None:
+            return None
+
+        # Only the first parameter, and only for the parameter binding being resolved
+        first = self._parameter(parameters[0])[0]
+        if self.scope(module, owner).get(first, [None])[0] is not binding:
+            return None
+
+        decorators = [_text(d) for d in owner.parent.children if d.type == 'decorator'] if owner.parent.type == 'decorated_definition' else []
+        if '@staticmethod' in decorators:
+            return None
+        if '@classmethod' in decorators:
+            return cls
+        return Instance(cls)
+
+    def _node(self, module: Module, node_span: Optional[Span]) -> Optional[Node]:
+        """ The node of a module's file with the given span """
+        if node_span is None or module.file is None:
+            return None
+        return module.file.node(node_span)
+
+    def _instance(self, value: Optional[Value]) -> Optional[Value]:
+        """ An annotation names a class, the annotated value is an instance of it """
+        if isinstance(value, Entity) and value.node.type == 'class_definition':
+            return Instance(value)
+        return None
+
+    def member(self, value: Optional[Value], name: str, depth: int = 0) -> Optional[Value]:
+        """
+        Resolve an attribute of a value.
+        """
+
+        if value is None or depth > MAX_DEPTH:
+            return None
+
+        if isinstance(value, Module):
+            bindings = self.scope(value, None).get(name) if value.file is not None else None
+            if bindings:
+                return self._binding_value(bindings[0], value, None, depth)
+            return self.table.modules.get(f"{value.name}.{name}")
+
+        cls = value.cls if isinstance(value, Instance) else value
+        if cls.node.type != 'class_definition':
+            return None
+
+        for c in [cls] + self.bases(cls):
+            for child in c.children.values():
+                child_name = child.node.child_by_field_name('name')
+                if child_name is not None and _text(child_name) == name:
+                    return child
+
+            spans = self.attributes(c).get(name)
+            module = self.entity_module.get(c)
+            if spans and module is not None:
+                node = self._node(module, spans[0])
+                if node is not None and node.type == 'type':
+                    return self._instance(self.evaluate(node, module, depth + 1))
+                return self.evaluate(node, module, depth + 1)
+
+        return None
+
+    def evaluate(self, node: Optional[Node], module: Module, depth: int = 0) -> Optional[Value]:
+        """
+        Infer the value of an expression.
+        """
+
+        if node is None or depth > MAX_DEPTH:
+            return None
+
+        if node.type in ['type', 'parenthesized_expression']:
+            return self.evaluate(node.named_children[0] if node.named_child_count > 0 else None, module, depth + 1)
+
+        if node.type == 'generic_type' or node.type == 'subscript':
+            # Resolved by its head, e.g. list[A] resolves to list
+            return self.evaluate(node.named_children[0] if node.named_child_count > 0 else None, module, depth + 1)
+
+        if node.type == 'identifier':
+            return self.lookup(_text(node), node, module, depth)
+
+        if node.type == 'attribute':
+            value = self.evaluate(node.child_by_field_name('object'), module, depth + 1)
+            return self.member(value, _text(node.child_by_field_name('attribute')), depth + 1)
+
+        if node.type == 'call':
+            function = self.evaluate(node.child_by_field_name('function'), module, depth + 1)
+            if isinstance(function, Entity):
+                if function.node.type == 'class_definition':
+                    return Instance(function)
+                # Typed by the function's return annotation
+                return_type = function.node.child_by_field_name('return_type')
+                owner = self.entity_module.get(function)
+                if return_type is not None and owner is not None:
+                    return self._instance(self.evaluate(return_type, owner, depth + 1))
+            return None
+
+        return None
+
+    def resolve(self, file_path: Path, key: str, symbol: Node) -> List[Entity]:
+        """
+        Resolve a symbol to entities.
+
+        Args:
+            file_path (Path): The file holding the symbol.
+            key (str): The symbol key.
+            symbol (Node): The symbol node.
+
+        Returns:
+            list[Entity]: The entities, empty if unresolved.
+        """
+
+        module = self.table.by_path.get(file_path)
+        if module is None:
+            return []
+
+        try:
+            if key == 'call':
+                value = self.evaluate(symbol.child_by_field_name('function'), module)
+                if isinstance(value, Entity):
+                    return [value]
+            elif key in ['base_class', 'parameters', 'return_type']:
+                value = self.evaluate(symbol, module)
+                if isinstance(value, Entity) and value.node.type == 'class_definition':
+                    return [value]
+            else:
+                raise ValueError(f"Unknown key {key}")
+        except RecursionError:
+            logger.debug(f"Failed to resolve {_text(symbol)} in {file_path}")
+
+        return []
+
+def resolution_report(static: Set[tuple], lsp: Set[tuple]) -> dict:
+    """
+    Compare the edges produced by static resolution against the language server's.
+
+    Args:
+        static (set[tuple]): Static edges, (key, source, destination) tuples.
+        lsp (set[tuple]): Language server edges, (key, source, destination) tuples.
+
+    Returns:
+        dict: Per key and total edge counts, precision and recall of the
+            static edges, taking the language server edges as ground truth.
+    """
+
+    def stats(s: Set[tuple], l: Set[tuple]) -> dict:
+        common = len(s & l)
+        return {
+            'static': len(s),
+            'lsp': len(l),
+            'common': common,
+            'precision': common / len(s) if s else 1.0,
+            'recall': common / len(l) if l else 1.0,
+        }
+
+    keys = sorted(set(e[0] for e in static) | set(e[0] for e in lsp))
+    report = {key: stats({e for e in static if e[0] == key}, {e for e in lsp if e[0] == key}) for key in keys}
+    report['total'] = stats(static, lsp)
+    return report
@@ -1,20 +1,35 @@
+import os
+import sys
+import time
+import asyncio
 from contextlib import nullcontext
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 from api.entities.entity import Entity
 from api.entities.file import File
+from api.entities.record import EntityRecord, FileRecord
+from tree_sitter import Node
 
-from ..graph import Graph
+from ..graph import Graph, BulkWriter, dependency_graph_name
+from ..info import set_repo_dependencies
 from .analyzer import AbstractAnalyzer
+from .cache import ExtractionCache, DefinitionCache
+from .checkpoint import Checkpoint
+from .lsp_pool import LanguageServerPool, RelocatedLanguageServer
+from .manifest import Manifest
+from .walker import SourceWalker, ignore_spec, is_ignored
 from .c.analyzer import CppAnalyzer
 from .java.analyzer import JavaAnalyzer
 from pygit2.repository import Repository
 
 from .python.analyzer import PythonAnalyzer
+from .python.static_resolver import StaticResolver, resolution_report
 from typing import *
 
-from multilspy import SyncLanguageServer
+from multilspy import LanguageServer
 from multilspy.multilspy_config import MultilspyConfig
 from multilspy.multilspy_logger import MultilspyLogger
 
@@ -22,187 +37,1036 @@ import logging
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(filename)s - %(asctime)s - %(levelname)s - %(message)s')
 
-# List of available analyzers
+# List of available analyzers, C and C++ files share an analyzer
+cpp_analyzer = CppAnalyzer()
 analyzers: dict[str, AbstractAnalyzer] = {
-    '.c': CppAnalyzer(),
-    '.cpp': CppAnalyzer(),
-    '.h': CppAnalyzer(),
+    '.c': cpp_analyzer,
+    '.cpp': cpp_analyzer,
+    '.h': cpp_analyzer,
     '.py': PythonAnalyzer(),
     '.java': JavaAnalyzer()}
 
+# Labels of entities whose body is skipped by shallow extraction
+CALLABLE_LABELS = ['Function', 'Method', 'Constructor']
+
 class NullLanguageServer:
     def start_server(self):
         return nullcontext()
 
+    async def request_definition(self, relative_file_path: str, line: int, column: int) -> list:
+        return []
+
+class NullWriter:
+    def add_file(self, file: File) -> None:
+        pass
+
+    def add_entity(self, *args, **kwargs) -> None:
+        pass
+
+    def connect(self, relation: str, src, dest) -> None:
+        pass
+
+    def mark(self, item) -> None:
+        pass
+
+class RecordWriter:
+    """
+    Collects the entities created by SourceAnalyzer.create_hierarchy into
+    a picklable FileRecord, optionally forwarding every write to a graph writer.
+    """
+
+    def __init__(self, path: Path, writer: Optional[BulkWriter] = None) -> None:
+        self.record = FileRecord(path)
+        self.writer = writer
+        self.entities: list[Entity] = []
+        self.index: dict[int, int] = {}
+
+    def add_file(self, file: File) -> None:
+        if self.writer is not None:
+            self.writer.add_file(file)
+
+    def add_entity(self, entity: Entity, label: str, name: str, doc: Optional[str], path: str,
+                   src_start: int, src_end: int, props: Optional[dict] = None) -> None:
+        self.index[id(entity)] = len(self.entities)
+        self.entities.append(entity)
+        self.record.entities.append(EntityRecord(label, name, doc, entity.node, props))
+
+        if self.writer is not None:
+            self.writer.add_entity(entity, label, name, doc, path, src_start, src_end, props)
+
+    def connect(self, relation: str, src, dest) -> None:
+        # The hierarchy only introduces DEFINES relationships
+        parent = self.index[id(src)] if isinstance(src, Entity) else -1
+        self.record.entities[self.index[id(dest)]].parent = parent
+
+        if self.writer is not None:
+            self.writer.connect(relation, src, dest)
+
+    def finalize(self) -> FileRecord:
+        """
+        Returns the file record, including the symbols of every entity.
+        """
+
+        for entity, record in zip(self.entities, self.record.entities):
+            # Ordered by position, query captures are not
+            record.symbols = [(key, *symbol)
+                              for key, spans in entity.spans.items()
+                              for symbol in sorted(spans, key=lambda s: s[1])]
+
+        return self.record
+
+class ExistingWriter:
+    """
+    Loads files whose records are already in the graph, e.g. files unchanged
+    since the last analysis. Nothing is written, the ids of the files and
+    their entities are looked up in the graph once flushed, a file missing
+    from the graph, entirely or in part, is written through writer instead.
+    """
+
+    def __init__(self, graph: Graph, existing: Callable[[Path], bool], writer: BulkWriter, batch_size: int = 1000) -> None:
+        """
+        Args:
+            graph (Graph): The graph holding the files.
+            existing (Callable[[Path], bool]): Whether a file is expected in the graph.
+            writer (BulkWriter): Writes the files missing from the graph.
+            batch_size (int): Number of files looked up at once.
+        """
+
+        self.graph = graph
+        self.existing = existing
+        self.writer = writer
+        self.batch_size = batch_size
+
+        # Buffered writes by file, replayed if the file is missing from the graph
+        self.files: dict[Path, list[tuple[str, tuple]]] = {}
+        self.current: list[tuple[str, tuple]] = []
+
+        # Files whose ids were found in the graph
+        self.loaded: set[Path] = set()
+
+    def __contains__(self, file_path: Path) -> bool:
+        return self.existing(file_path)
+
+    def add_file(self, file: File) -> None:
+        self.current = self.files.setdefault(file.path, [])
+        self.current.append(('add_file', (file,)))
+
+    def add_entity(self, entity: Entity, label: str, name: str, doc: Optional[str], path: str,
+                   src_start: int, src_end: int, props: Optional[dict] = None) -> None:
+        self.current.append(('add_entity', (entity, label, name, doc, path, src_start, src_end, props)))
+
+    def connect(self, relation: str, src, dest) -> None:
+        self.current.append(('connect', (relation, src, dest)))
+
+    def mark(self, item) -> None:
+        pass
+
+    @staticmethod
+    def _key(op: str, args: tuple) -> tuple:
+        if op == 'add_file':
+            return ('File', str(args[0].path))
+        entity, label, name, doc, path, src_start, src_end, props = args
+        return (label, path, name, src_start, src_end)
+
+    def flush(self) -> None:
+        """
+        Set the ids of the buffered files and entities, see Graph.get_node_ids.
+        """
+
+        paths = list(self.files)
+        for i in range(0, len(paths), self.batch_size):
+            batch = paths[i:i + self.batch_size]
+            ids = self.graph.get_node_ids(batch)
+
+            for file_path in batch:
+                ops = self.files.pop(file_path)
+                nodes = [(args[0], ids.get(self._key(op, args))) for op, args in ops if op != 'connect']
+
+                if any(id is None for _, id in nodes):
+                    logging.warning(f"File {file_path} is missing from graph {self.graph.name}, writing it")
+                    for op, args in ops:
+                        getattr(self.writer, op)(*args)
+                    self.writer.mark(file_path)
+                    continue
+
+                for node, id in nodes:
+                    node.id = id
+                self.loaded.add(file_path)
+
+        self.current = []
+
+async def _cancel(tasks: Iterable[asyncio.Task]) -> None:
+    """
+    Cancel the given tasks and wait for them to complete, e.g. the language
+    server requests left in flight once one of them failed.
+    """
+
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def _signature(node: Node) -> str:
+    """
+    The declaration of an entity, without its body, e.g. def f(a, b) -> int
+    """
+
+    body = node.child_by_field_name('body')
+    end = body.start_byte if body is not None else node.end_byte
+    return node.text[:end - node.start_byte].decode('utf-8', errors='replace').strip().rstrip(':{').strip()
+
+def _extract_file(file_path: Path, dependency: bool, shallow: bool = False,
+                  source_code: Optional[bytes] = None) -> tuple[str, FileRecord]:
+    """
+    Parse a file and extract its entities, runs within a first pass worker process
+    each worker process holds its own analyzers and tree-sitter parsers.
+
+    Args:
+        source_code (bytes, optional): The file content, read from disk if missing,
+            in-memory sources are not shared with the worker processes.
+
+    Returns:
+        tuple[str, FileRecord]: The extraction cache key of the processed content and the file record.
+    """
+
+    analyzer = analyzers[file_path.suffix]
+    if source_code is None:
+        source_code = analyzer.read_source(file_path)
+    tree = analyzer.parse(file_path, source_code)
+
+    file = File(file_path, tree)
+    writer = RecordWriter(file_path)
+    SourceAnalyzer(cache=False).create_hierarchy(file, analyzer, writer, dependency, shallow)
+
+    return ExtractionCache.key(source_code, analyzer, dependency, shallow), writer.finalize()
+
 class SourceAnalyzer():
-    def __init__(self) -> None:
+    def __init__(self, batch_size: Optional[int] = None, workers: Optional[int] = None,
+                 cache: Union[ExtractionCache, bool] = True, lsp_concurrency: Optional[int] = None,
+                 lsp_servers: Optional[int] = None, definitions: Union[DefinitionCache, bool] = True,
+                 python_resolution: Optional[str] = None, dependency_mode: Optional[str] = None,
+                 progress: Optional[Callable[[str, int, int], None]] = None) -> None:
+        """
+        Args:
+            batch_size (int, optional): Number of records buffered before
+                being written to the graph, defaults to $CODE_GRAPH_BATCH_SIZE or 1000.
+            workers (int, optional): Number of processes parsing files during the
+                first pass, defaults to $CODE_GRAPH_WORKERS or 1 (no worker processes).
+            cache (ExtractionCache | bool): Extraction cache, True opens the default
+                cache, see ExtractionCache.default, False disables caching.
+            lsp_concurrency (int, optional): Maximum number of in-flight language server
+                requests during the second pass, defaults to $CODE_GRAPH_LSP_CONCURRENCY or 32.
+            lsp_servers (int, optional): Number of language servers per language,
+                see LanguageServerPool.
+            definitions (DefinitionCache | bool): Definition lookups cache, True opens
+                the default cache, see DefinitionCache.default, False disables caching.
+            python_resolution (str, optional): Python symbol resolution mode, "lsp" or
+                "static", defaults to $CODE_GRAPH_PYTHON_RESOLUTION or "lsp".
+            dependency_mode (str, optional): How dependency files are indexed, "full" within
+                the project's graph or "shallow", signatures only, within shared per
+                package@version graphs, defaults to $CODE_GRAPH_DEPENDENCIES or "full".
+            progress (Callable, optional): Invoked with the current phase, the number of
+                files processed and the total number of files, after every file. An
+                exception raised by the callback, e.g. on cancellation, aborts the analysis.
+        """
+
+        if workers is None:
+            workers = int(os.getenv('CODE_GRAPH_WORKERS', "1"))
+
+        if lsp_concurrency is None:
+            lsp_concurrency = int(os.getenv('CODE_GRAPH_LSP_CONCURRENCY', "32"))
+
+        if python_resolution is None:
+            python_resolution = os.getenv('CODE_GRAPH_PYTHON_RESOLUTION', "lsp")
+
+        if python_resolution not in ["lsp", "static"]:
+            raise ValueError(f"Unknown Python resolution mode {python_resolution}")
+
+        if dependency_mode is None:
+            dependency_mode = os.getenv('CODE_GRAPH_DEPENDENCIES', "full")
+
+        if dependency_mode not in ["full", "shallow"]:
+            raise ValueError(f"Unknown dependency mode {dependency_mode}")
+
         self.files: dict[Path, File] = {}
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.lsp_concurrency = max(1, lsp_concurrency)
+        self.lsp_servers = lsp_servers
+        self.python_resolution = python_resolution
+        self.dependency_mode = dependency_mode
+        self._cache = cache
+        self._definitions = definitions
+        self.progress = progress
+
+    def report(self, phase: str, done: int, total: int) -> None:
+        """
+        Report progress, see progress.
+        """
+
+        if self.progress is not None:
+            self.progress(phase, done, total)
+
+    @property
+    def cache(self) -> Optional[ExtractionCache]:
+        # Opened lazily, on first use
+        if self._cache is True:
+            self._cache = ExtractionCache.default() or False
+
+        return self._cache or None
+
+    @property
+    def definitions(self) -> Optional[DefinitionCache]:
+        # Opened lazily, on first use
+        if self._definitions is True:
+            self._definitions = DefinitionCache.default() or False
+
+        return self._definitions or None
 
     def supported_types(self) -> list[str]:
         """
         """
         return list(analyzers.keys())
 
-    def create_entity_hierarchy(self, entity: Entity, file: File, analyzer: AbstractAnalyzer, graph: Graph):
+    def create_entity_hierarchy(self, entity: Entity, file: File, analyzer: AbstractAnalyzer, writer: BulkWriter, dependency: bool, shallow: bool = False):
         types = analyzer.get_entity_types()
         stack = list(entity.node.children)
         while stack:
             node = stack.pop()
             if node.type in types:
                 child = Entity(node)
-                child.id = graph.add_entity(analyzer.get_entity_label(node), analyzer.get_entity_name(node), analyzer.get_entity_docstring(node), str(file.path), node.start_point.row, node.end_point.row, {})
-                if not analyzer.is_dependency(str(file.path)):
-                    analyzer.add_symbols(child)
+                label = analyzer.get_entity_label(node)
+                props = {'signature': _signature(node)} if shallow else None
+                writer.add_entity(child, label, analyzer.get_entity_name(node), analyzer.get_entity_docstring(node), str(file.path), node.start_point.row, node.end_point.row, props)
                 file.add_entity(child)
                 entity.add_child(child)
-                graph.connect_entities("DEFINES", entity.id, child.id)
-                self.create_entity_hierarchy(child, file, analyzer, graph)
+                writer.connect("DEFINES", entity, child)
+                if not (shallow and label in CALLABLE_LABELS):
+                    self.create_entity_hierarchy(child, file, analyzer, writer, dependency, shallow)
             else:
                 stack.extend(node.children)
 
-    def create_hierarchy(self, file: File, analyzer: AbstractAnalyzer, graph: Graph):
+    def create_hierarchy(self, file: File, analyzer: AbstractAnalyzer, writer: BulkWriter, dependency: Optional[bool] = None, shallow: bool = False):
+        """
+        Extract the entities defined by a file.
+
+        Args:
+            dependency (bool, optional): Whether the file is a dependency, dependencies have no symbols.
+            shallow (bool): Only extract signatures, the bodies of functions and methods are skipped.
+        """
+
+        if dependency is None:
+            dependency = analyzer.is_dependency(str(file.path))
+
         types = analyzer.get_entity_types()
         stack = [file.tree.root_node]
         while stack:
             node = stack.pop()
             if node.type in types:
                 entity = Entity(node)
-                entity.id = graph.add_entity(analyzer.get_entity_label(node), analyzer.get_entity_name(node), analyzer.get_entity_docstring(node), str(file.path), node.start_point.row, node.end_point.row, {})
-                if not analyzer.is_dependency(str(file.path)):
-                    analyzer.add_symbols(entity)
+                label = analyzer.get_entity_label(node)
+                props = {'signature': _signature(node)} if shallow else None
+                writer.add_entity(entity, label, analyzer.get_entity_name(node), analyzer.get_entity_docstring(node), str(file.path), node.start_point.row, node.end_point.row, props)
                 file.add_entity(entity)
-                graph.connect_entities("DEFINES", file.id, entity.id)
-                self.create_entity_hierarchy(entity, file, analyzer, graph)
+                writer.connect("DEFINES", file, entity)
+                if not (shallow and label in CALLABLE_LABELS):
+                    self.create_entity_hierarchy(entity, file, analyzer, writer, dependency, shallow)
             else:
                 stack.extend(node.children)
 
-    def first_pass(self, path: Path, files: list[Path], ignore: list[str], graph: Graph) -> None:
+        # Symbols of all entities are extracted at once
+        if not dependency:
+            analyzer.add_symbols(file)
+
+    def first_pass(self, path: Path, files: list[Path], ignore: list[str], graph: Graph, create: bool = False,
+                   checkpoint: Optional[Checkpoint] = None, existing: Optional[Callable[[Path], bool]] = None) -> None:
         """
         Perform the first pass analysis on source files in the given directory tree.
 
         Args:
             ignore (list(str)): List of paths to ignore
-            executor (concurrent.futures.Executor): The executor to run tasks concurrently.
+            create (bool): Write using CREATE rather than MERGE, only valid for an empty graph
+            checkpoint (Checkpoint, optional): Records the files written to the graph
+            existing (Callable[[Path], bool], optional): Whether a file's records are already
+                in the graph, e.g. unchanged files, such files are loaded but not written,
+                see ExistingWriter
         """
 
         supoorted_types = self.supported_types()
-        for ext in set([file.suffix for file in files if file.suffix in supoorted_types]):
-            analyzers[ext].add_dependencies(path, files)
+        exts = sorted(set([file.suffix for file in files if file.suffix in supoorted_types]))
+        analyzers['.py'].resolution = self.python_resolution
+        for analyzer in dict.fromkeys(analyzers[ext] for ext in exts):
+            analyzer.add_dependencies(path, files)
         
-        files_len = len(files)
-        for i, file_path in enumerate(files):
+        spec = ignore_spec(ignore)
+        targets = []
+        for file_path in files:
             # Skip none supported files
             if file_path.suffix not in analyzers:
                 logging.info(f"Skipping none supported file {file_path}")
                 continue
 
-            # Skip ignored files
-            if any([i in str(file_path) for i in ignore]):
+            # Skip ignored files, the ignore list is relative to the project's folder
+            if spec and file_path.is_relative_to(path) and is_ignored(spec, file_path.relative_to(path).as_posix()):
                 logging.info(f"Skipping ignored file {file_path}")
                 continue
 
-            logging.info(f'Processing file ({i + 1}/{files_len}): {file_path}')
+            targets.append(file_path)
+
+        # Dependencies of known packages are indexed into shared graphs
+        if self.dependency_mode == "shallow":
+            packages: dict[str, list[Path]] = {}
+            project = []
+            for file_path in targets:
+                analyzer = analyzers[file_path.suffix]
+                package = analyzer.get_dependency_package(str(file_path)) if analyzer.is_dependency(str(file_path)) else None
+                if package is None:
+                    project.append(file_path)
+                else:
+                    packages.setdefault(package, []).append(file_path)
+
+            targets = project
+            self.index_dependencies(packages)
+            set_repo_dependencies(graph.repo, [dependency_graph_name(package) for package in packages])
+
+        # Nodes and DEFINES edges are buffered and written in batches,
+        # every buffered record is flushed once the writer exits
+        with graph.bulk_writer(self.batch_size, create) as writer:
+            if checkpoint is not None:
+                writer.on_flush = checkpoint.on_written
+
+            reader = None
+            if existing is not None:
+                reader = ExistingWriter(graph, existing, writer, writer.batch_size)
 
-            analyzer = analyzers[file_path.suffix]
+            self.process_files(targets, writer, existing=reader)
 
-            # Parse file
-            source_code = file_path.read_bytes()
-            tree = analyzer.parser.parse(source_code)
+            # Relationships between files loaded from the graph are already
+            # written, unless the first pass writing them was interrupted
+            unchanged = set()
+            if reader is not None:
+                reader.flush()
+                if checkpoint is None or checkpoint.phase != 'first_pass':
+                    unchanged = {os.path.abspath(file_path) for file_path in reader.loaded}
 
-            # Create file entity
-            file = File(file_path, tree)
-            self.files[file_path] = file
+            # File level relationships, e.g. INCLUDES
+            loaded = {os.path.abspath(file_path): file for file_path, file in self.files.items()}
+            for analyzer in dict.fromkeys(analyzers[ext] for ext in exts):
+                for relation, src, dest in analyzer.get_file_relations({p: f for p, f in self.files.items() if analyzers[p.suffix] is analyzer}):
+                    src, dest = os.path.abspath(src), os.path.abspath(dest)
+                    if src in unchanged and dest in unchanged:
+                        continue
+                    src, dest = loaded.get(src), loaded.get(dest)
+                    if src is not None and dest is not None:
+                        writer.connect(relation, src, dest)
 
-            # Walk thought the AST
-            graph.add_file(file)
-            self.create_hierarchy(file, analyzer, graph)
+        if self.cache is not None:
+            self.cache.commit()
 
-    def second_pass(self, graph: Graph, files: list[Path], path: Path) -> None:
+    def process_files(self, files: list[Path], writer: BulkWriter, shallow: bool = False,
+                      existing: Optional[ExistingWriter] = None) -> None:
         """
-        Recursively analyze the contents of a directory.
+        Extract the entities of the given files, using worker processes if configured.
 
         Args:
-            base (str): The base directory for analysis.
-            root (str): The current directory being analyzed.
-            executor (concurrent.futures.Executor): The executor to run tasks concurrently.
+            files (list[Path]): Supported, none ignored, files to process.
+            writer (BulkWriter): Graph writer.
+            shallow (bool): Only extract signatures, see create_hierarchy.
+            existing (ExistingWriter, optional): Loads the files already in the graph.
         """
 
+        if self.workers > 1 and len(files) > 1:
+            self.parallel_first_pass(files, writer, shallow, existing)
+        else:
+            files_len = len(files)
+            self.report("first_pass", 0, files_len)
+            for i, file_path in enumerate(files):
+                logging.info(f'Processing file ({i + 1}/{files_len}): {file_path}')
+                file_writer = existing if existing is not None and file_path in existing else writer
+                self.first_pass_file(file_path, file_writer, shallow)
+                file_writer.mark(file_path)
+                self.report("first_pass", i + 1, files_len)
+
+    def index_dependencies(self, packages: dict[str, list[Path]]) -> None:
+        """
+        Index dependency files into shared graphs, one per package@version,
+        only signatures are extracted. A package already indexed, e.g. by
+        another project, is skipped altogether.
+
+        Dependency entities are not kept, symbols resolving into a dependency
+        are left unresolved as relationships can not cross graphs.
+
+        Args:
+            packages (dict[str, list[Path]]): Maps a package, name@version, to its files.
+        """
+
+        for package, files in packages.items():
+            dependency_graph = Graph(dependency_graph_name(package))
+            if dependency_graph.is_package_indexed():
+                logging.info(f"Dependency {package} already indexed")
+                continue
+
+            # Left over by an interrupted indexing
+            if not dependency_graph.is_empty():
+                dependency_graph.delete()
+                dependency_graph = Graph(dependency_graph_name(package))
+
+            logging.info(f"Indexing dependency {package}, {len(files)} files")
+            with dependency_graph.bulk_writer(self.batch_size, True) as writer:
+                self.process_files(files, writer, shallow=True)
+            dependency_graph.set_package_indexed(package)
+
+            for file_path in files:
+                self.files.pop(file_path, None)
+
+    def first_pass_file(self, file_path: Path, writer: BulkWriter, shallow: bool = False) -> None:
+        """
+        Parse a single file and write its entities.
+
+        Args:
+            file_path (Path): The file to process.
+            writer (BulkWriter): Graph writer.
+            shallow (bool): Only extract signatures, see create_hierarchy.
+        """
+
+        analyzer = analyzers[file_path.suffix]
+        source_code = analyzer.read_source(file_path)
+        dependency = analyzer.is_dependency(str(file_path))
+
+        # Unchanged content, reuse the cached extraction
+        cache = self.cache
+        if cache is not None:
+            key = ExtractionCache.key(source_code, analyzer, dependency, shallow, oid=analyzer.source_id(file_path))
+            record = cache.get(key, file_path)
+            if record is not None:
+                self.files[file_path] = self.load_file(record, analyzer, writer, source_code, shallow)
+                return
+
+        # Parse file
+        tree = analyzer.parse(file_path, source_code)
+
+        # Create file entity, its tree is released once no longer in use
+        file = File(file_path, tree, source_code, partial(analyzer.parse, file_path))
+        self.files[file_path] = file
+
+        # Walk thought the AST
+        if cache is None:
+            writer.add_file(file)
+            self.create_hierarchy(file, analyzer, writer, dependency, shallow)
+        else:
+            recorder = RecordWriter(file_path, writer)
+            recorder.add_file(file)
+            self.create_hierarchy(file, analyzer, recorder, dependency, shallow)
+            cache.put(key, recorder.finalize())
+
+    def parallel_first_pass(self, files: list[Path], writer: BulkWriter, shallow: bool = False,
+                            existing: Optional[ExistingWriter] = None) -> None:
+        """
+        Parse files and extract their entities using a pool of worker processes.
+
+        Workers return picklable FileRecords, which are merged and written
+        in the order of the given files, so the resulting graph does not depend
+        on the number of workers.
+
+        Args:
+            files (list[Path]): Supported, none ignored, files to process.
+            writer (BulkWriter): Graph writer.
+            shallow (bool): Only extract signatures, see create_hierarchy.
+            existing (ExistingWriter, optional): Loads the files already in the graph.
+        """
+
+        files_len = len(files)
+
+        # Decided here as analyzers may keep per project state
+        dependencies = [analyzers[file_path.suffix].is_dependency(str(file_path)) for file_path in files]
+
+        # Only files missing from the extraction cache are sent to the workers
+        cached: dict[Path, FileRecord] = {}
+        sources: dict[Path, bytes] = {}
+        cache = self.cache
+        if cache is not None:
+            for file_path, dependency in zip(files, dependencies):
+                analyzer = analyzers[file_path.suffix]
+                source_code = analyzer.read_source(file_path)
+                key = ExtractionCache.key(source_code, analyzer, dependency, shallow, oid=analyzer.source_id(file_path))
+                record = cache.get(key, file_path)
+                if record is not None:
+                    cached[file_path] = record
+                    sources[file_path] = source_code
+
+        # In-memory contents, e.g. git blobs, are handed to the workers
+        def in_memory(file_path: Path) -> Optional[bytes]:
+            in_memory_sources = analyzers[file_path.suffix].sources
+            return in_memory_sources.get(file_path) if in_memory_sources is not None else None
+
+        misses = [(file_path, dependency, shallow, in_memory(file_path)) for file_path, dependency in zip(files, dependencies) if file_path not in cached]
+        logging.info(f"Extracting entities from {len(misses)} files using {self.workers} workers")
+        chunksize = max(1, len(misses) // (self.workers * 4))
+
+        self.report("first_pass", 0, files_len)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                extracted = executor.map(_extract_file, *zip(*misses), chunksize=chunksize) if misses else iter(())
+                for i, file_path in enumerate(files):
+                    logging.info(f'Processing file ({i + 1}/{files_len}): {file_path}')
+
+                    analyzer = analyzers[file_path.suffix]
+                    source_code = sources.get(file_path)
+                    record = cached.get(file_path)
+                    if record is None:
+                        key, record = next(extracted)
+                        if cache is not None:
+                            cache.put(key, record)
+
+                        # Entities are located by span, the content must match the extracted one
+                        source_code = analyzer.read_source(file_path)
+                        if ExtractionCache.key(source_code, analyzer, dependencies[i], shallow, oid=analyzer.source_id(file_path)) != key:
+                            logging.warning(f"File {file_path} changed during analysis, re-extracting")
+                            record = None
+
+                    file_writer = existing if existing is not None and file_path in existing else writer
+                    if record is None:
+                        self.first_pass_file(file_path, file_writer, shallow)
+                    else:
+                        self.files[file_path] = self.load_file(record, analyzer, file_writer, source_code, shallow)
+                    file_writer.mark(file_path)
+                    self.report("first_pass", i + 1, files_len)
+            except BaseException:
+                # Aborted, e.g. cancelled, pending extractions are dropped
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def load_file(self, record: FileRecord, analyzer: AbstractAnalyzer, writer: BulkWriter, source_code: Optional[bytes] = None, shallow: bool = False) -> File:
+        """
+        Rebuild a File and its entities from a record and write them to the graph.
+
+        The file is not parsed, entities and symbols are rebuilt from their
+        spans, the file's tree is only parsed once a node is asked for.
+
+        Args:
+            record (FileRecord): Record produced by a worker process or read from the cache.
+            analyzer (AbstractAnalyzer): The file's analyzer.
+            writer (BulkWriter): Graph writer.
+            source_code (bytes, optional): The file content the record was extracted from, read from disk if missing.
+            shallow (bool): Whether the record holds signatures only.
+
+        Returns:
+            File: The file.
+        """
+
+        if source_code is None:
+            source_code = analyzer.read_source(record.path)
+
+        file = File(record.path, None, source_code, partial(analyzer.parse, record.path))
+        writer.add_file(file)
+
+        entities: list[Entity] = []
+        for r in record.entities:
+            entity = Entity(entity_span=(sys.intern(r.type), r.start_byte, r.end_byte))
+            for key, type, start_byte, end_byte in r.symbols:
+                entity.add_symbol_span(key, (sys.intern(type), start_byte, end_byte))
+
+            writer.add_entity(entity, r.label, r.name, r.doc, str(file.path), r.start_line, r.end_line, r.props)
+            file.add_entity(entity)
+
+            if r.parent == -1:
+                writer.connect("DEFINES", file, entity)
+            else:
+                parent = entities[r.parent]
+                parent.add_child(entity)
+                writer.connect("DEFINES", parent, entity)
+
+            entities.append(entity)
+
+        return file
+
+    def second_pass(self, graph: Graph, files: list[Path], path: Path, create: bool = False,
+                    checkpoint: Optional[Checkpoint] = None, root: Optional[Path] = None) -> None:
+        """
+        Resolve the symbols of the given files and connect their entities.
+
+        Args:
+            graph (Graph): The graph to write to.
+            files (list[Path]): The files to resolve, previously processed by first_pass.
+            path (Path): The project's root folder.
+            create (bool): Write using CREATE rather than MERGE, only valid for an empty graph
+            checkpoint (Checkpoint, optional): Records the files whose relationships are
+                written to the graph, files already resolved are skipped
+            root (Path, optional): Folder holding a copy of the project the language
+                servers read in place of path, e.g. a git commit's files, see ScratchWorktree.
+        """
+
+        files = [f for f in files if f in self.files]
+        if checkpoint is not None:
+            resolved = [f for f in files if checkpoint.is_resolved(f)]
+            if len(resolved) > 0:
+                logging.info(f"Skipping {len(resolved)} files resolved before the analysis was interrupted")
+                files = [f for f in files if not checkpoint.is_resolved(f)]
+
+        asyncio.run(self._second_pass(graph, files, path, create, checkpoint, root))
+
+    async def _second_pass(self, graph: Graph, files: list[Path], path: Path, create: bool,
+                           checkpoint: Optional[Checkpoint] = None, root: Optional[Path] = None) -> None:
         logger = MultilspyLogger()
         logger.logger.setLevel(logging.ERROR)
+        python_resolution = self.python_resolution
+        counts = {ext: sum(1 for file_path in files if file_path.suffix == ext) for ext in ['.java', '.py']}
+        java = counts['.java'] > 0
+        python = python_resolution == "lsp" and counts['.py'] > 0
+
+        # Language servers read files from disk, with in-memory sources,
+        # e.g. a git commit's blobs, they are rooted at a copy of the
+        # project holding the same files. Without such a copy symbols are
+        # resolved statically if possible
+        if analyzers['.py'].sources is not None and root is None and (java or python):
+            logging.warning("No copy of the in-memory sources on disk, skipping language server resolution")
+            python_resolution = "static"
+            java = python = False
+
+        def language_server(config: MultilspyConfig, files: int):
+            pool = LanguageServerPool(lambda: LanguageServer.create(config, logger, str(root or path)), self.lsp_servers, files=files)
+            return RelocatedLanguageServer(pool, path, root) if root is not None else pool
+
         lsps = {}
-        if any(path.rglob('*.java')):
-            config = MultilspyConfig.from_dict({"code_language": "java"})
-            lsps[".java"] = SyncLanguageServer.create(config, logger, str(path))
+        if java:
+            lsps[".java"] = language_server(MultilspyConfig.from_dict({"code_language": "java"}), counts['.java'])
         else:
             lsps[".java"] = NullLanguageServer()
-        if any(path.rglob('*.py')):
-            config = MultilspyConfig.from_dict({"code_language": "python", "environment_path": f"{path}/venv"})
-            lsps[".py"] = SyncLanguageServer.create(config, logger, str(path))
+        analyzers['.py'].resolution = python_resolution
+        if python:
+            lsps[".py"] = language_server(MultilspyConfig.from_dict({"code_language": "python", "environment_path": f"{path}/venv"}), counts['.py'])
         else:
             lsps[".py"] = NullLanguageServer()
-        with lsps[".java"].start_server(), lsps[".py"].start_server():
-            files_len = len(self.files)
-            for i, file_path in enumerate(files):
-                file = self.files[file_path]
-                logging.info(f'Processing file ({i + 1}/{files_len}): {file_path}')
-                for _, entity in file.entities.items():
-                    entity.resolved_symbol(lambda key, symbol: analyzers[file_path.suffix].resolve_symbol(self.files, lsps[file_path.suffix], file_path, path, key, symbol))
-                    for key, symbols in entity.resolved_symbols.items():
-                        for symbol in symbols:
-                            if key == "base_class":
-                                graph.connect_entities("EXTENDS", entity.id, symbol.id)
-                            elif key == "implement_interface":
-                                graph.connect_entities("IMPLEMENTS", entity.id, symbol.id)
-                            elif key == "extend_interface":
-                                graph.connect_entities("EXTENDS", entity.id, symbol.id)
-                            elif key == "call":
-                                graph.connect_entities("CALLS", entity.id, symbol.id)
-                            elif key == "return_type":
-                                graph.connect_entities("RETURNS", entity.id, symbol.id)
-                            elif key == "parameters":
-                                graph.connect_entities("PARAMETERS", entity.id, symbol.id)
-
-    def analyze_files(self, files: list[Path], path: Path, graph: Graph) -> None:
-        self.first_pass(path, files, [], graph)
-        self.second_pass(graph, files, path)
-
-    def analyze_sources(self, path: Path, ignore: List[str], graph: Graph) -> None:
+        for ext in analyzers:
+            lsps.setdefault(ext, NullLanguageServer())
+
+        # Bounds the number of definition requests in flight, across files
+        window = asyncio.Semaphore(self.lsp_concurrency)
+
+        async def resolve(file_path: Path, key: str, symbol: Node) -> list[Entity]:
+            async with window:
+                return await analyzers[file_path.suffix].resolve_symbol(self.files, lsps[file_path.suffix], file_path, path, key, symbol)
+
+        async def resolve_file(file_path: Path) -> None:
+            file = self.files[file_path]
+            requests = [(entity, key, symbol) for entity in file.entities.values()
+                        for key, symbols in entity.symbols.items()
+                        for symbol in symbols]
+
+            tasks = [asyncio.ensure_future(resolve(file_path, key, symbol)) for _, key, symbol in requests]
+            try:
+                results = await asyncio.gather(*tasks)
+            finally:
+                await _cancel(tasks)
+
+            for entity in file.entities.values():
+                entity.resolved_symbols = {key: set() for key in entity.symbols}
+            for (entity, key, _), resolved in zip(requests, results):
+                for symbol in resolved:
+                    entity.add_resolved_symbol(key, symbol)
+
+            # Edges are emitted once the whole file is resolved
+            for entity in file.entities.values():
+                for key, symbols in entity.resolved_symbols.items():
+                    for symbol in symbols:
+                        if key == "base_class":
+                            writer.connect("EXTENDS", entity, symbol)
+                        elif key == "implement_interface":
+                            writer.connect("IMPLEMENTS", entity, symbol)
+                        elif key == "extend_interface":
+                            writer.connect("EXTENDS", entity, symbol)
+                        elif key == "call":
+                            writer.connect("CALLS", entity, symbol)
+                        elif key == "return_type":
+                            writer.connect("RETURNS", entity, symbol)
+                        elif key == "parameters":
+                            writer.connect("PARAMETERS", entity, symbol)
+
+            writer.mark(file_path)
+
+        # Analyzers resolving symbols on their own index every loaded file
+        exts = sorted(set(file_path.suffix for file_path in files))
+        for analyzer in dict.fromkeys(analyzers[ext] for ext in exts):
+            analyzer.index_symbols({p: f for p, f in self.files.items() if analyzers[p.suffix] is analyzer})
+
+        # Previous definition lookups are reused
+        definitions = self.definitions
+        for analyzer in analyzers.values():
+            analyzer.definitions = definitions
+
+        try:
+            async with lsps[".java"].start_server(), lsps[".py"].start_server():
+                with graph.bulk_writer(self.batch_size, create) as writer:
+                    if checkpoint is not None:
+                        writer.on_flush = checkpoint.on_resolved
+
+                    # Several files are resolved at once so the language
+                    # servers are kept busy across file boundaries
+                    pending = set()
+                    files_len = len(files)
+                    resolved = 0
+                    self.report("second_pass", 0, files_len)
+                    try:
+                        for i, file_path in enumerate(files):
+                            logging.info(f'Processing file ({i + 1}/{files_len}): {file_path}')
+                            pending.add(asyncio.create_task(resolve_file(file_path)))
+                            if len(pending) >= self.lsp_concurrency:
+                                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                                for task in done:
+                                    task.result()
+                                    resolved += 1
+                                self.report("second_pass", resolved, files_len)
+
+                        for task in asyncio.as_completed(pending):
+                            await task
+                            resolved += 1
+                            self.report("second_pass", resolved, files_len)
+                    finally:
+                        # Files still being resolved once one failed, or the
+                        # analysis was cancelled, are dropped before the
+                        # language servers are stopped
+                        await _cancel(pending)
+        finally:
+            for analyzer in analyzers.values():
+                analyzer.definitions = None
+
+            # Trees are parsed again if needed
+            for file in self.files.values():
+                file.release()
+
+            if definitions is not None:
+                definitions.commit()
+
+    def python_resolution_report(self, path: Path, ignore: Optional[list[str]] = None) -> dict:
+        """
+        Measure the accuracy of static Python symbol resolution against the
+        language server, the project's symbols are resolved both ways and the
+        resulting edges compared, nothing is written to the graph.
+
+        Args:
+            path (Path): Path to a local folder containing Python sources
+            ignore (list[str], optional): List of paths to skip
+
+        Returns:
+            dict: Per symbol key and total edge counts, precision and recall of
+                the static edges (see resolution_report) and each mode's
+                resolution time in seconds.
+        """
+
+        path = path.resolve()
+        ignore = ignore or []
+        files = list(SourceWalker(path, ['.py'], ignore))
+
+        analyzer = analyzers['.py']
+        analyzer.resolution = "lsp"
+        analyzer.add_dependencies(path, files)
+
+        writer = NullWriter()
+        for file_path in files:
+            self.first_pass_file(file_path, writer)
+
+        sources = {p: f for p, f in self.files.items() if p.suffix == '.py' and not analyzer.is_dependency(str(p))}
+        analyzer.index_symbols(sources)
+        symbols = [(file_path, entity, key, symbol) for file_path, file in sources.items()
+                   for entity in file.entities.values()
+                   for key, nodes in entity.symbols.items()
+                   for symbol in nodes]
+
+        # Entities are identified by their file and position
+        ids = {entity: (str(file_path), entity.start_byte) for file_path, file in self.files.items() for entity in file.entities.values()}
+
+        start = time.perf_counter()
+        resolver = StaticResolver(path, sources)
+        static = {(key, ids[entity], ids[resolved]) for file_path, entity, key, symbol in symbols
+                  for resolved in resolver.resolve(file_path, key, symbol)}
+        static_seconds = time.perf_counter() - start
+
+        async def resolve_lsp() -> list[list[Entity]]:
+            logger = MultilspyLogger()
+            logger.logger.setLevel(logging.ERROR)
+            config = MultilspyConfig.from_dict({"code_language": "python", "environment_path": f"{path}/venv"})
+            lsp = LanguageServerPool(lambda: LanguageServer.create(config, logger, str(path)), self.lsp_servers, files=len(sources))
+            window = asyncio.Semaphore(self.lsp_concurrency)
+
+            async def resolve(file_path: Path, key: str, symbol: Node) -> list[Entity]:
+                async with window:
+                    return await analyzer.resolve_symbol(self.files, lsp, file_path, path, key, symbol)
+
+            async with lsp.start_server():
+                tasks = [asyncio.ensure_future(resolve(file_path, key, symbol)) for file_path, _, key, symbol in symbols]
+                try:
+                    return await asyncio.gather(*tasks)
+                finally:
+                    await _cancel(tasks)
+
+        start = time.perf_counter()
+        results = asyncio.run(resolve_lsp())
+        lsp = {(key, ids[entity], ids[resolved]) for (_, entity, key, _), resolved_entities in zip(symbols, results)
+               for resolved in resolved_entities if resolved in ids}
+        lsp_seconds = time.perf_counter() - start
+
+        report = resolution_report(static, lsp)
+        report['static_seconds'] = static_seconds
+        report['lsp_seconds'] = lsp_seconds
+
+        for key, stats in report.items():
+            if isinstance(stats, dict):
+                logging.info(f"{key}: static {stats['static']}, lsp {stats['lsp']}, common {stats['common']}, "
+                             f"precision {stats['precision']:.2%}, recall {stats['recall']:.2%}")
+        logging.info(f"Static resolution took {static_seconds:.2f}s, language server resolution {lsp_seconds:.2f}s")
+
+        return report
+
+    def analyze_files(self, files: list[Path], path: Path, graph: Graph,
+                      sources: Optional[Mapping[Path, bytes]] = None, root: Optional[Path] = None) -> None:
+        """
+        Analyze the given files and merge them into the graph.
+
+        Args:
+            files (list[Path]): The files to analyze.
+            path (Path): The project's root folder.
+            graph (Graph): The graph to write to.
+            sources (Mapping[Path, bytes], optional): The project's files contents,
+                e.g. a git commit's blobs, read in place of the files on disk.
+            root (Path, optional): Folder holding the same files as sources, read by
+                the language servers, see ScratchWorktree.
+        """
+
+        for analyzer in analyzers.values():
+            analyzer.sources = sources
+
+        try:
+            self.first_pass(path, files, [], graph)
+            self.second_pass(graph, files, path, root=root)
+        finally:
+            for analyzer in analyzers.values():
+                analyzer.sources = None
+
+    def analyze_changes(self, path: Path, files: list[Path], graph: Graph, manifest: Manifest) -> None:
+        """
+        Incrementally update the graph with the files changed since the last analysis.
+
+        Modified and removed files are deleted from the graph, added and
+        modified files are then written to the graph. Unchanged files of the
+        same languages are loaded, served from the extraction cache, but not
+        written, their ids are looked up in the graph as symbols may resolve
+        to their entities, see ExistingWriter. Symbols are only resolved for
+        added and modified files and for the files which had relationships
+        into deleted entities.
+
+        Args:
+            path (Path): Path to the project's folder
+            files (list[Path]): The project's current files
+            graph (Graph): The project's graph
+            manifest (Manifest): The files state as of the last analysis
+        """
+
+        added, modified, removed = manifest.diff(files)
+
+        if len(added + modified + removed) == 0:
+            logging.info("No changes detected, graph is up to date")
+            manifest.save()
+            return
+
+        # Files with relationships into entities which are about to be deleted
+        stale = modified + removed
+        changed = set(added + modified)
+        dependents = [Path(p) for p in graph.get_dependent_files(stale)]
+        tracked = set(files)
+        dependents = [p for p in dependents if p in tracked and p not in changed]
+        logging.info(f"Re-resolving {len(dependents)} dependent files")
+
+        if len(stale) > 0:
+            graph.delete_files(stale)
+
+        # Relationships do not cross languages, only the files
+        # handled by the analyzers of the resolved files are loaded
+        resolved = added + modified + dependents
+        languages = {analyzers[file_path.suffix] for file_path in resolved}
+        files = [file_path for file_path in files if analyzers[file_path.suffix] in languages]
+
+        self.first_pass(path, files, [], graph, existing=lambda file_path: file_path not in changed)
+        self.second_pass(graph, resolved, path)
+
+        manifest.save()
+
+    def analyze_sources(self, path: Path, ignore: List[str], graph: Graph, incremental: bool = False) -> None:
         """
         Perform analysis on source files in the given folder.
 
+        A full analysis is built into a shadow graph, promoted in place of
+        the graph once complete so readers never see a partial graph, and is
+        checkpointed, if interrupted the next analysis of the folder resumes
+        it, see Checkpoint. An incremental analysis updates the graph in place.
+
         Args:
             path (Path): Path to a local folder containing source files to process
             ignore (List[str]): List of paths to skip
             graph (Graph): Graph object to populate with analysis results
+            incremental (bool): Only process files changed since the last analysis
         """
         # Ensure we work with an absolute, normalized path
         abs_path = path.resolve()
         logging.info(f"Resolving source folder to absolute path: {abs_path}")
 
-        # Collect Java and Python files recursively
-        files = list(abs_path.rglob("*.java")) + list(abs_path.rglob("*.py"))
-        logging.info(f"Found {len(files)} source files in {abs_path}")
+        # Collect the files of every supported language in a single walk,
+        # ignored and .gitignore'd directories are not entered
+        files = list(SourceWalker(abs_path, self.supported_types(), ignore))
+
+        manifest = Manifest(graph.name)
+        checkpoint = Checkpoint(graph.name)
+        resume = checkpoint.begin(abs_path)
+        if incremental and not resume:
+            if len(manifest) > 0 and not graph.is_empty():
+                checkpoint.complete()
+                self.analyze_changes(abs_path, files, graph, manifest)
+                return
+
+            logging.info(f"No previous analysis of {graph.name}, performing a full analysis")
 
-        # First pass analysis of the source code
-        self.first_pass(abs_path, files, ignore, graph)
+        # Readers keep using the graph while its replacement is built,
+        # a resumed analysis continues the shadow it was building
+        shadow = graph.shadow(fresh=not resume)
+
+        # Analyzing into an empty graph, nothing to merge with
+        # switch to CREATE-only ingestion, a resumed analysis merges
+        # into the records written before it was interrupted
+        create = shadow.is_empty()
+        if create:
+            logging.info(f"Graph {shadow.name} is empty, using CREATE-only ingestion")
+
+        # First pass analysis of the source code, a resumed
+        # analysis loads the files it wrote without writing them again
+        existing = checkpoint.is_written if resume else None
+        self.first_pass(abs_path, files, ignore, shadow, create, checkpoint, existing)
+        checkpoint.enter('second_pass')
 
         # Second pass analysis of the source code
-        self.second_pass(graph, files, abs_path)
+        self.second_pass(shadow, files, abs_path, create, checkpoint)
+
+        # Swap the complete graph into place, the shadow graph
+        # is gone, there is nothing left to resume
+        shadow.promote()
+        checkpoint.complete()
 
+        # Record the analyzed files state for later incremental analysis
+        manifest.update([f for f in files if f in self.files and not analyzers[f.suffix].is_dependency(str(f))])
+        manifest.save()
 
-    def analyze_local_folder(self, path: str, g: Graph, ignore: Optional[list[str]] = []) -> None:
+    def analyze_local_folder(self, path: str, g: Graph, ignore: Optional[list[str]] = [], incremental: bool = False) -> None:
         """
         Analyze path.
 
         Args:
             path (str): Path to a local folder containing source files to process
             ignore (List(str)): List of paths to skip
+            incremental (bool): Only process files changed since the last analysis
         """
 
         logging.info(f"Analyzing local folder {path}")
 
         # Analyze source files
-        self.analyze_sources(Path(path), ignore, g)
+        self.analyze_sources(Path(path), ignore, g, incremental)
 
         logging.info("Done analyzing path")
 
@@ -0,0 +1,303 @@
+import os
+import re
+import logging
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('code_graph')
+
+# Never part of a project's sources, pruned unless re-included by a .gitignore
+DEFAULT_IGNORE = ['.git/', 'node_modules/', 'venv/', '.venv/', '__pycache__/', '.tox/', '.mypy_cache/']
+
+def _translate(pattern: str) -> str:
+    """
+    Translate a gitignore glob into a regular expression matching
+    slash separated paths relative to the .gitignore directory.
+    """
+
+    res = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                # **/ matches any number of directories, a trailing ** anything
+                if pattern.startswith('**/', i):
+                    res.append('(?:.*/)?')
+                    i += 3
+                else:
+                    res.append('.*')
+                    i += 2
+                continue
+            res.append('[^/]*')
+        elif c == '?':
+            res.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                res.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                res.append(f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            res.append(re.escape(pattern[i]))
+        else:
+            res.append(re.escape(c))
+        i += 1
+    return ''.join(res)
+
+class IgnoreSpec:
+    """
+    Compiled gitignore patterns, relative to the directory they apply to.
+
+    Patterns follow gitignore semantics: a pattern without a slash matches
+    at any depth, a leading or inner slash anchors it, a trailing slash
+    only matches directories, ! re-includes and the last match wins.
+    Specs without negations are compiled into a single regex per kind.
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        # (regex, negated, directories only)
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []
+
+        for line in patterns:
+            pattern = line.rstrip('\n').rstrip('\r')
+            if not pattern.strip() or pattern.startswith('#'):
+                continue
+            if not pattern.endswith('\\ '):
+                pattern = pattern.rstrip()
+
+            negated = pattern.startswith('!')
+            if negated:
+                pattern = pattern[1:]
+            elif pattern.startswith('\\!') or pattern.startswith('\\#'):
+                pattern = pattern[1:]
+
+            dir_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if not pattern:
+                continue
+
+            anchored = '/' in pattern
+            pattern = pattern.lstrip('/')
+            prefix = '' if anchored else '(?:.*/)?'
+            # Matching a directory matches everything below it
+            self.rules.append((re.compile(f'{prefix}{_translate(pattern)}'), negated, dir_only))
+
+        self.negations = any(negated for _, negated, _ in self.rules)
+        if not self.negations:
+            files = [r.pattern for r, _, dir_only in self.rules if not dir_only]
+            dirs = [r.pattern for r, _, dir_only in self.rules if dir_only]
+            self._files = re.compile('|'.join(f'(?:{p})' for p in files)) if files else None
+            self._dirs = re.compile('|'.join(f'(?:{p})' for p in files + dirs)) if files or dirs else None
+
+    def __bool__(self) -> bool:
+        return len(self.rules) > 0
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Match a path against the spec.
+
+        Args:
+            path (str): Slash separated path relative to the spec's directory.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            Optional[bool]: True if ignored, False if re-included, None if no pattern matches.
+        """
+
+        if not self.negations:
+            regex = self._dirs if is_dir else self._files
+            return True if regex is not None and regex.fullmatch(path) else None
+
+        res = None
+        for regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(path):
+                res = not negated
+        return res
+
+def ignore_spec(ignore: Optional[List[str]]) -> IgnoreSpec:
+    """
+    Compile an analysis ignore list, entries are gitignore patterns relative
+    to the project root, e.g. "./build" or "tests/fixtures" or "*.pb.py".
+    """
+
+    patterns = []
+    for entry in ignore or []:
+        entry = entry.strip()
+        if entry.startswith('./'):
+            entry = '/' + entry[2:]
+        if entry:
+            patterns.append(entry)
+    return IgnoreSpec(patterns)
+
+def is_ignored(spec: IgnoreSpec, path: str) -> bool:
+    """
+    Whether a file, relative to the spec's directory, or any of its parent directories is ignored.
+    """
+
+    parts = path.split('/')
+    for i in range(1, len(parts)):
+        if spec.match('/'.join(parts[:i]), True):
+            return True
+    return bool(spec.match(path, False))
+
+def _ignored(specs: List[Tuple[str, IgnoreSpec]], path: str, is_dir: bool) -> bool:
+    """
+    Match a path, relative to the root, against the specs applying to it,
+    each relative to its base directory, later specs taking precedence.
+    """
+
+    res = False
+    for base, spec in specs:
+        match = spec.match(path[len(base):], is_dir)
+        if match is not None:
+            res = match
+    return res
+
+class PathIgnore:
+    """
+    Applies the rules of SourceWalker to individual paths, e.g. the files
+    changed by a git commit: the default ignore list, the analysis ignore
+    list and the .gitignore files of the path's directories.
+    """
+
+    def __init__(self, ignore: Optional[List[str]] = None,
+                 gitignore: Optional[Callable[[str], Optional[str]]] = None) -> None:
+        """
+        Args:
+            ignore (list[str], optional): Analysis ignore list, see ignore_spec.
+            gitignore (Callable, optional): Reads the .gitignore of a directory, given
+                relative to the root with a trailing slash ('' for the root), None if
+                the directory has none.
+        """
+
+        self.specs: List[Tuple[str, IgnoreSpec]] = [('', IgnoreSpec(DEFAULT_IGNORE)), ('', ignore_spec(ignore))]
+        self.gitignore = gitignore
+
+        # directory -> its .gitignore spec, None if it has none
+        self.gitignores: dict[str, Optional[IgnoreSpec]] = {}
+
+    def _spec(self, directory: str) -> Optional[IgnoreSpec]:
+        if directory not in self.gitignores:
+            content = self.gitignore(directory) if self.gitignore is not None else None
+            self.gitignores[directory] = (IgnoreSpec(content.splitlines()) or None) if content is not None else None
+        return self.gitignores[directory]
+
+    def __call__(self, path: str) -> bool:
+        """
+        Whether a file, given relative to the root, or any of its parent directories is ignored.
+        """
+
+        parts = path.split('/')
+        specs = self.specs
+        for i in range(len(parts)):
+            directory = '/'.join(parts[:i]) + '/' if i > 0 else ''
+            spec = self._spec(directory)
+            if spec is not None:
+                specs = specs + [(directory, spec)]
+
+            if _ignored(specs, directory + parts[i], i < len(parts) - 1):
+                return True
+
+        return False
+
+class SourceWalker:
+    """
+    Walks a project folder once, yielding the files of the given extensions.
+
+    Built on os.scandir, ignored directories are pruned before being
+    entered: the default ignore list (version control, virtual environments,
+    caches), the analysis ignore list and every .gitignore found along the
+    way, deeper .gitignore files taking precedence. Symbolic links to
+    directories are not followed. Files are yielded in a deterministic
+    order. Skip counts are available once the walk completes.
+    """
+
+    def __init__(self, root: Path, extensions: Iterable[str], ignore: Optional[List[str]] = None, gitignore: bool = True) -> None:
+        """
+        Args:
+            root (Path): The project folder.
+            extensions (Iterable[str]): Extensions to collect, e.g. ['.py', '.java'].
+            ignore (list[str], optional): Analysis ignore list, see ignore_spec.
+            gitignore (bool): Honor .gitignore files.
+        """
+
+        self.root = Path(root)
+        self.extensions = frozenset(extensions)
+        self.gitignore = gitignore
+        self.specs: List[Tuple[str, IgnoreSpec]] = [('', IgnoreSpec(DEFAULT_IGNORE)), ('', ignore_spec(ignore))]
+
+        # Skip counts
+        self.files = 0
+        self.ignored_dirs = 0
+        self.ignored_files = 0
+        self.unsupported = 0
+
+    def _read_gitignore(self, path: str) -> Optional[IgnoreSpec]:
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                spec = IgnoreSpec(f.readlines())
+        except OSError as e:
+            logger.warning(f"Failed to read {path}: {e}")
+            return None
+        return spec or None
+
+    def __iter__(self) -> Iterator[Path]:
+        # (directory, path relative to the root with a trailing slash, applicable specs)
+        stack = [(str(self.root), '', self.specs)]
+        while stack:
+            directory, rel, specs = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                logger.warning(f"Failed to list {directory}: {e}")
+                continue
+
+            if self.gitignore and any(e.name == '.gitignore' for e in entries):
+                spec = self._read_gitignore(os.path.join(directory, '.gitignore'))
+                if spec is not None:
+                    specs = specs + [(rel, spec)]
+
+            subdirs = []
+            for entry in entries:
+                path = rel + entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if _ignored(specs, path, True):
+                        self.ignored_dirs += 1
+                        continue
+                    subdirs.append((entry.path, path + '/', specs))
+                    continue
+
+                if os.path.splitext(entry.name)[1] not in self.extensions:
+                    self.unsupported += 1
+                    continue
+                if _ignored(specs, path, False):
+                    self.ignored_files += 1
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                self.files += 1
+                yield Path(entry.path)
+
+            # Popped in name order
+            stack.extend(reversed(subdirs))
+
+        logger.info(f"Found {self.files} source files in {self.root}, skipped {self.ignored_dirs} ignored directories, "
+                    f"{self.ignored_files} ignored files and {self.unsupported} unsupported files")
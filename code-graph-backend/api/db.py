@@ -0,0 +1,152 @@
+import os
+import redis
+import logging
+import threading
+from typing import Callable, Optional
+from redis.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from falkordb import FalkorDB, Graph as FalkorGraph
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG, format='%(filename)s - %(asctime)s - %(levelname)s - %(message)s')
+
+# Process wide connection registry
+# a single connection pool is shared by every Graph, GitGraph and
+# repository info helper, graph handles are cached per graph name
+_lock: threading.Lock = threading.Lock()
+_pool: Optional[redis.ConnectionPool] = None
+_db: Optional[FalkorDB] = None
+_graphs: dict[str, FalkorGraph] = {}
+
+# Held while a graph handle is created and initialized, per graph name,
+# so a slow initialization only delays lookups of the same graph
+_selecting: dict[str, threading.Lock] = {}
+
+def _create_pool() -> redis.ConnectionPool:
+    """
+    Creates a blocking connection pool using environment variables.
+
+    Environment variables:
+        FALKORDB_POOL_SIZE (int): Maximum number of connections, defaults to 16.
+        FALKORDB_POOL_TIMEOUT (float): Seconds to wait for a free connection, defaults to 20.
+        FALKORDB_HEALTH_CHECK_INTERVAL (int): Seconds a connection may stay idle
+            before it is pinged on checkout, defaults to 30.
+        FALKORDB_RETRIES (int): Number of reconnect attempts on connection failure, defaults to 3.
+
+    Returns:
+        redis.ConnectionPool: A thread-safe connection pool.
+    """
+
+    pool_size = int(os.getenv('FALKORDB_POOL_SIZE', "16"))
+    logging.info(f"Creating FalkorDB connection pool, size: {pool_size}")
+
+    return redis.BlockingConnectionPool(
+        host                  = os.getenv('FALKORDB_HOST', "localhost"),
+        port                  = int(os.getenv('FALKORDB_PORT', "6379")),
+        username              = os.getenv('FALKORDB_USERNAME'),
+        password              = os.getenv('FALKORDB_PASSWORD'),
+        max_connections       = pool_size,
+        timeout               = float(os.getenv('FALKORDB_POOL_TIMEOUT', "20")),
+        health_check_interval = int(os.getenv('FALKORDB_HEALTH_CHECK_INTERVAL', "30")),
+        socket_keepalive      = True,
+        retry                 = Retry(ExponentialBackoff(), int(os.getenv('FALKORDB_RETRIES', "3"))),
+        retry_on_error        = [ConnectionError, TimeoutError],
+        decode_responses      = True  # To ensure string responses
+    )
+
+def get_db() -> FalkorDB:
+    """
+    Returns the process wide FalkorDB client, creating it on first use.
+
+    Returns:
+        FalkorDB: A FalkorDB client backed by the shared connection pool.
+    """
+
+    global _db, _pool
+
+    if _db is None:
+        with _lock:
+            if _db is None:
+                pool = _create_pool()
+                try:
+                    _db = FalkorDB(connection_pool=pool)
+                except Exception:
+                    pool.disconnect()
+                    raise
+                _pool = pool
+
+    return _db
+
+def get_redis() -> redis.Redis:
+    """
+    Returns a Redis client backed by the shared connection pool.
+
+    Returns:
+        redis.Redis: A Redis connection object.
+    """
+
+    return get_db().connection
+
+def select_graph(name: str, init: Optional[Callable[[FalkorGraph], None]] = None) -> FalkorGraph:
+    """
+    Returns a cached handle to the graph under the given name.
+
+    Args:
+        name (str): The graph name.
+        init (Callable, optional): Invoked once, when the handle is first created,
+            e.g. to create indices.
+
+    Returns:
+        falkordb.Graph: The graph handle.
+    """
+
+    g = _graphs.get(name)
+    if g is not None:
+        return g
+
+    db = get_db()
+    with _lock:
+        selecting = _selecting.setdefault(name, threading.Lock())
+
+    # init runs queries, it is kept outside of the process wide lock
+    with selecting:
+        g = _graphs.get(name)
+        if g is not None:
+            return g
+
+        g = db.select_graph(name)
+        if init is not None:
+            init(g)
+
+        with _lock:
+            # Not cached if the connection was reset meanwhile
+            if _db is db:
+                _graphs[name] = g
+            _selecting.pop(name, None)
+
+    return g
+
+def forget_graph(name: str) -> None:
+    """
+    Drops the cached handle for the given graph, e.g. once the graph is deleted
+    """
+
+    with _lock:
+        _graphs.pop(name, None)
+
+def reset() -> None:
+    """
+    Disconnects the shared connection pool and clears every cached handle,
+    the next call to get_db will reconnect.
+    """
+
+    global _db, _pool
+
+    with _lock:
+        if _pool is not None:
+            _pool.disconnect()
+
+        _db   = None
+        _pool = None
+        _graphs.clear()
@@ -0,0 +1,120 @@
+import json
+import zlib
+import base64
+from typing import Callable, Optional
+
+# Bump whenever the encoded layout changes, see Delta.decode
+DELTA_VERSION = 1
+
+# Encoded deltas larger than this are compressed
+COMPRESS_THRESHOLD = 512
+
+# A node's stable key: files are keyed by path, entities by
+# label, path, name and line span, see Graph.add_entities
+NodeKey = tuple[str, list]
+
+def node_key(label: str, path: str, name: Optional[str] = None,
+             src_start: Optional[int] = None, src_end: Optional[int] = None) -> NodeKey:
+    if label == 'File':
+        return (label, [path])
+    return (label, [path, name, src_start, src_end])
+
+class Delta:
+    """
+    A compact transition between two states of a code graph.
+
+    Applying a delta first deletes files, together with every entity they
+    define, then upserts files, entities and relationships. Nodes are
+    identified by stable keys rather than graph ids, which differ from one
+    copy of a graph to another, so a delta recorded on one graph applies to
+    any graph in the same state, see Graph.apply_delta.
+
+    While recorded relationships refer to graph ids, they are keyed once the
+    delta is resolved, see resolve.
+    """
+
+    def __init__(self) -> None:
+        self.deleted: list[str] = []
+        self.files: list[str] = []
+        self.entities: dict[str, list[dict]] = {}
+
+        # "relation:source label:destination label" -> [[source key, destination key]]
+        self.edges: dict[str, list[list]] = {}
+
+        # Recorded relationships by graph ids and the keys of recorded nodes
+        self.pending: list[tuple[str, int, int]] = []
+        self.keys: dict[int, NodeKey] = {}
+
+    def delete_files(self, paths: list[str]) -> None:
+        self.deleted.extend(paths)
+
+    def add_files(self, paths: list[str], ids: list[int]) -> None:
+        self.files.extend(paths)
+        for path, id in zip(paths, ids):
+            self.keys[id] = node_key('File', path)
+
+    def add_entities(self, label: str, entities: list[dict], ids: list[int]) -> None:
+        self.entities.setdefault(label, []).extend(entities)
+        for e, id in zip(entities, ids):
+            self.keys[id] = node_key(label, e['path'], e['name'], e['src_start'], e['src_end'])
+
+    def connect(self, relation: str, edges: list[tuple[int, int]]) -> None:
+        self.pending.extend((relation, src_id, dest_id) for src_id, dest_id in edges)
+
+    def resolve(self, lookup: Callable[[list[int]], dict[int, NodeKey]]) -> None:
+        """
+        Key the recorded relationships.
+
+        Args:
+            lookup (Callable): Returns the keys of nodes by graph ids, invoked
+                for relationship ends which were not recorded, e.g. entities of
+                unchanged files.
+        """
+
+        missing = sorted({id for _, src, dest in self.pending for id in (src, dest) if id not in self.keys})
+        if len(missing) > 0:
+            self.keys.update(lookup(missing))
+
+        for relation, src_id, dest_id in self.pending:
+            src, dest = self.keys.get(src_id), self.keys.get(dest_id)
+            if src is None or dest is None:
+                continue
+            self.edges.setdefault(f"{relation}:{src[0]}:{dest[0]}", []).append([src[1], dest[1]])
+
+        self.pending = []
+        self.keys = {}
+
+    def __len__(self) -> int:
+        return (len(self.deleted) + len(self.files) + len(self.pending) +
+                sum(len(v) for v in self.entities.values()) + sum(len(v) for v in self.edges.values()))
+
+    def encode(self) -> str:
+        """
+        Serialize a resolved delta, compressed if large.
+        """
+
+        data = json.dumps({'version': DELTA_VERSION, 'deleted': self.deleted, 'files': self.files,
+                           'entities': self.entities, 'edges': self.edges}, separators=(',', ':'))
+        if len(data) > COMPRESS_THRESHOLD:
+            return 'z' + base64.b64encode(zlib.compress(data.encode('utf-8'))).decode('ascii')
+        return 'j' + data
+
+    @classmethod
+    def decode(cls, data: str) -> 'Delta':
+        if data[0] == 'z':
+            data = zlib.decompress(base64.b64decode(data[1:])).decode('utf-8')
+        elif data[0] == 'j':
+            data = data[1:]
+        else:
+            raise ValueError(f"Unknown delta encoding {data[0]}")
+
+        fields = json.loads(data)
+        if fields.get('version') != DELTA_VERSION:
+            raise ValueError(f"Unsupported delta version {fields.get('version')}")
+
+        delta = cls()
+        delta.deleted = fields['deleted']
+        delta.files = fields['files']
+        delta.entities = fields['entities']
+        delta.edges = fields['edges']
+        return delta
@@ -2,4 +2,5 @@
 
 from .file import File
 from .entity import Entity
+from .record import EntityRecord, FileRecord, find_node
 from .entity_encoder import encode_node, encode_edge, encode_path, encode_graph_entity
@@ -1,18 +1,107 @@
-from typing import Callable, Self
+import sys
+from collections.abc import Mapping
+from typing import Callable, Iterator, Optional, Self
 from tree_sitter import Node
 
+# (node type, start byte, end byte), locates a node within its file
+Span = tuple[str, int, int]
+
+def span(node: Node) -> Span:
+    return (sys.intern(node.type), node.start_byte, node.end_byte)
+
+
+class EntityMap(Mapping):
+    """
+    Entities by node, keyed internally by the node's span so lookups hold
+    whichever tree the node belongs to, e.g. a file parsed again.
+    """
+
+    __slots__ = ('_entities',)
+
+    def __init__(self) -> None:
+        self._entities: dict[Span, 'Entity'] = {}
+
+    def add(self, entity: 'Entity') -> None:
+        self._entities[entity.span] = entity
+
+    def __getitem__(self, node: Node) -> 'Entity':
+        return self._entities[(node.type, node.start_byte, node.end_byte)]
+
+    def __contains__(self, node: object) -> bool:
+        return isinstance(node, Node) and (node.type, node.start_byte, node.end_byte) in self._entities
+
+    def __iter__(self) -> Iterator[Node]:
+        for entity in self._entities.values():
+            yield entity.node
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def values(self):
+        return self._entities.values()
+
 
 class Entity:
-    def __init__(self, node: Node):
-        self.node = node
-        self.symbols: dict[str, list[Node]] = {}
+    """
+    An entity defined by a file, e.g. a class or a function.
+
+    Entities hold spans rather than tree-sitter nodes, so the file's tree
+    can be released once extracted, node and symbols are mapped back onto
+    the file's tree, parsed again if needed, see File.tree.
+    """
+
+    __slots__ = ('span', 'file', 'parent', 'children', 'spans', 'resolved_symbols', 'id', '_node')
+
+    def __init__(self, node: Optional[Node] = None, entity_span: Optional[Span] = None) -> None:
+        """
+        Initialize an Entity object.
+
+        Args:
+            node (Node, optional): The entity node.
+            entity_span (Span, optional): The entity span, when created without a node.
+        """
+
+        self.span: Span = span(node) if node is not None else entity_span
+        self.file = None
+        self.parent = None
+        self.children = EntityMap()
+        # Symbol spans by key
+        self.spans: dict[str, list[Span]] = {}
         self.resolved_symbols: dict[str, set[Self]] = {}
-        self.children: dict[Node, Self] = {}
+
+        # Only kept until the entity is added to a file
+        self._node = node
+
+    @property
+    def start_byte(self) -> int:
+        return self.span[1]
+
+    @property
+    def end_byte(self) -> int:
+        return self.span[2]
+
+    @property
+    def node(self) -> Node:
+        if self.file is None:
+            return self._node
+        return self.file.node(self.span)
+
+    @property
+    def symbols(self) -> dict[str, list[Node]]:
+        """
+        Symbol nodes by key, mapped onto the file's current tree.
+        """
+
+        return {key: [node for node in (self.file.node(s) for s in spans) if node is not None]
+                for key, spans in self.spans.items()}
 
     def add_symbol(self, key: str, symbol: Node):
-        if key not in self.symbols:
-            self.symbols[key] = []
-        self.symbols[key].append(symbol)
+        self.add_symbol_span(key, span(symbol))
+
+    def add_symbol_span(self, key: str, symbol: Span):
+        if key not in self.spans:
+            self.spans[key] = []
+        self.spans[key].append(symbol)
 
     def add_resolved_symbol(self, key: str, symbol: Self):
         if key not in self.resolved_symbols:
@@ -21,11 +110,11 @@ class Entity:
 
     def add_child(self, child: Self):
         child.parent = self
-        self.children[child.node] = child
+        self.children.add(child)
 
     def resolved_symbol(self, f: Callable[[str, Node], list[Self]]):
         for key, symbols in self.symbols.items():
             self.resolved_symbols[key] = set()
             for symbol in symbols:
                 for resolved_symbol in f(key, symbol):
-                    self.resolved_symbols[key].add(resolved_symbol)
\ No newline at end of file
+                    self.resolved_symbols[key].add(resolved_symbol)
@@ -1,30 +1,119 @@
+import os
+import weakref
 from pathlib import Path
+from collections import OrderedDict
+from typing import Callable, Optional
 from tree_sitter import Node, Tree
 
-from api.entities.entity import Entity
+from api.entities.entity import Entity, EntityMap, Span
+from api.entities.record import find_node
+
+
+class TreeCache:
+    """
+    Bounds the number of parsed trees held by files at once.
+
+    Files able to parse themselves again register their tree, once more
+    than max_trees are held the least recently used tree is released.
+    """
+
+    def __init__(self, max_trees: Optional[int] = None) -> None:
+        """
+        Args:
+            max_trees (int, optional): Number of trees kept in memory,
+                defaults to $CODE_GRAPH_TREES or 256.
+        """
+
+        if max_trees is None:
+            max_trees = int(os.getenv('CODE_GRAPH_TREES', "256"))
+
+        self.max_trees = max(1, max_trees)
+        self.files: OrderedDict = OrderedDict()
+
+    def touch(self, file: 'File') -> None:
+        key = id(file)
+        if key in self.files:
+            self.files.move_to_end(key)
+            return
+
+        self.files[key] = weakref.ref(file)
+        while len(self.files) > self.max_trees:
+            evicted = self.files.popitem(last=False)[1]()
+            if evicted is not None:
+                evicted._tree = None
+
+    def discard(self, file: 'File') -> None:
+        self.files.pop(id(file), None)
+
+# Shared by every file of the process
+trees = TreeCache()
 
 
 class File:
     """
     Represents a file with basic properties like path, name, and extension.
+
+    Files created with their source and a parse function only hold their
+    tree while in use, it is released once evicted from the tree cache or
+    by release, and parsed again on demand.
     """
 
-    def __init__(self, path: Path, tree: Tree) -> None:
+    __slots__ = ('path', 'source', 'entities', 'id', '_tree', '_parse', '__weakref__')
+
+    def __init__(self, path: Path, tree: Optional[Tree], source: Optional[bytes] = None,
+                 parse: Optional[Callable[[bytes], Tree]] = None) -> None:
         """
         Initialize a File object.
 
         Args:
             path (Path): The full path to the file.
-            tree (Tree): The parsed AST of the file content.
+            tree (Tree, optional): The parsed AST of the file content, parsed on demand if missing.
+            source (bytes, optional): The file content, required to parse the file again.
+            parse (Callable, optional): Parses the file content, required to parse the file again.
         """
 
         self.path = path
-        self.tree = tree
-        self.entities: dict[Node, Entity] = {}
+        self.source = source
+        self.entities = EntityMap()
+        self._tree = tree
+        self._parse = parse
+
+        if tree is not None and self.reparsable:
+            trees.touch(self)
+
+    @property
+    def reparsable(self) -> bool:
+        return self.source is not None and self._parse is not None
+
+    @property
+    def tree(self) -> Optional[Tree]:
+        if self._tree is None and self.reparsable:
+            self._tree = self._parse(self.source)
+        if self._tree is not None and self.reparsable:
+            trees.touch(self)
+        return self._tree
+
+    def release(self) -> None:
+        """
+        Drop the file's tree, nodes already handed out remain valid.
+        """
+
+        if self.reparsable:
+            self._tree = None
+            trees.discard(self)
+
+    def node(self, span: Span) -> Optional[Node]:
+        """
+        The node with the given span.
+        """
+
+        return find_node(self.tree, *span)
 
     def add_entity(self, entity: Entity):
         entity.parent = self
-        self.entities[entity.node] = entity
+        entity.file = self
+        entity._node = None
+        self.entities.add(entity)
 
     def __str__(self) -> str:
         return f"path: {self.path}"
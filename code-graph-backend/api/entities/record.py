@@ -0,0 +1,77 @@
+from pathlib import Path
+from typing import Optional
+from tree_sitter import Node, Tree
+
+
+def find_node(tree: Tree, node_type: str, start_byte: int, end_byte: int) -> Optional[Node]:
+    """
+    Locate the node of the given type spanning exactly [start_byte, end_byte).
+
+    Args:
+        tree (Tree): The parsed AST.
+        node_type (str): The node type.
+        start_byte (int): The node start offset.
+        end_byte (int): The node end offset.
+
+    Returns:
+        Optional[Node]: The node if found, otherwise None.
+    """
+
+    node = tree.root_node.descendant_for_byte_range(start_byte, end_byte)
+
+    # Several nodes may share the same span, e.g. an expression statement
+    # wrapping a call, climb up until the node type matches
+    while node is not None and node.start_byte == start_byte and node.end_byte == end_byte:
+        if node.type == node_type:
+            return node
+        node = node.parent
+
+    return None
+
+
+class EntityRecord:
+    """
+    A picklable, tree-sitter free description of an extracted entity.
+    """
+
+    __slots__ = ('label', 'name', 'doc', 'type', 'start_byte', 'end_byte',
+                 'start_line', 'end_line', 'props', 'parent', 'symbols')
+
+    def __init__(self, label: str, name: str, doc: Optional[str], node: Node, props: Optional[dict] = None) -> None:
+        """
+        Initialize an EntityRecord object.
+
+        Args:
+            label (str): The entity label.
+            name (str): The entity name.
+            doc (Optional[str]): The entity docstring.
+            node (Node): The entity node.
+            props (Optional[dict]): Additional entity properties.
+        """
+
+        self.label      = label
+        self.name       = name
+        self.doc        = doc
+        self.type       = node.type
+        self.start_byte = node.start_byte
+        self.end_byte   = node.end_byte
+        self.start_line = node.start_point.row
+        self.end_line   = node.end_point.row
+        self.props      = props or {}
+
+        # Index of the defining entity within the file record, -1 for the file itself
+        self.parent: int = -1
+
+        # (key, node type, start byte, end byte) of each symbol
+        self.symbols: list[tuple[str, str, int, int]] = []
+
+
+class FileRecord:
+    """
+    A picklable description of a source file and the entities it defines,
+    entities are listed in extraction order, a parent always precedes its children.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entities: list[EntityRecord] = []
@@ -1,9 +1,9 @@
-import os
 import logging
-from falkordb import FalkorDB, Node
+from falkordb import Node
 from typing import List, Optional
 
 from pygit2 import Commit
+from ..db import forget_graph, select_graph
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(filename)s - %(asctime)s - %(levelname)s - %(message)s')
@@ -12,23 +12,27 @@ class GitGraph():
     """
     Represents a git commit graph
     nodes are commits where one commit leads to its parents and children
-    edges contains queries and parameters for transitioning the code-graph
-    from the current commit to parent / child
+    edges contains the delta (see Delta) transitioning the code-graph
+    from the current commit to parent / child, edges stored by earlier
+    versions hold the transition's queries and parameters instead
     """
 
     def __init__(self, name: str):
 
-        self.db = FalkorDB(host=os.getenv('FALKORDB_HOST', 'localhost'),
-                           port=os.getenv('FALKORDB_PORT', 6379),
-                           username=os.getenv('FALKORDB_USERNAME', None),
-                           password=os.getenv('FALKORDB_PASSWORD', None))
+        self.name = name
 
-        self.g = self.db.select_graph(name)
+        # Reuse the process wide connection pool and cached graph handle
+        self.g = select_graph(name, self._create_indices)
+
+    @staticmethod
+    def _create_indices(g) -> None:
+        """
+            Creates the git graph indices, invoked once per graph handle
+        """
 
-        # create indicies
         # index commit hash
         try:
-            self.g.create_node_range_index("Commit", "hash")
+            g.create_node_range_index("Commit", "hash")
         except Exception:
             pass
 
@@ -84,6 +88,113 @@ class GitGraph():
         logging.info(f"retrived commits: {commits}")
         return commits
 
+    def get_head_commit(self) -> Optional[dict]:
+        """
+            Returns the newest commit, the tip of the commit chain
+            None if the graph holds no commits
+
+            CHILD edges are added once the transitions into the child
+            commit are stored, an interrupted build leaves the head at
+            the newest commit whose transitions are stored, commits only
+            reached going backwards are not considered
+        """
+
+        q = """MATCH (c:Commit)
+               WHERE NOT (c)-[:CHILD]->() AND ((:Commit)-[:CHILD]->(c) OR NOT (c)-[:PARENT]->())
+               RETURN c
+               ORDER BY c.date DESC
+               LIMIT 1"""
+
+        res = self.g.query(q).result_set
+
+        if len(res) > 0:
+            return self._commit_from_node(res[0][0])
+
+        return None
+
+    def delete(self) -> None:
+        """
+            Delete the git graph and its snapshots
+        """
+
+        q = "MATCH (c:Commit) WHERE c.snapshot IS NOT NULL RETURN c.snapshot"
+        for row in self.g.query(q).result_set:
+            select_graph(row[0]).delete()
+            forget_graph(row[0])
+
+        self.g.delete()
+        forget_graph(self.name)
+
+    def set_snapshot(self, commit: str, snapshot: str, stats: dict) -> None:
+        """
+            Record the graph holding the code-graph at the given commit
+            together with its size, see Graph.stats
+        """
+
+        q = """MATCH (c:Commit {hash: $hash})
+               SET c.snapshot = $snapshot, c.snapshot_nodes = $nodes, c.snapshot_edges = $edges"""
+
+        params = {'hash': commit, 'snapshot': snapshot, 'nodes': stats['node_count'], 'edges': stats['edge_count']}
+        self.g.query(q, params)
+
+    def get_nearest_snapshot(self, commit: str, max_distance: int, relation: str) -> Optional[dict]:
+        """
+            Returns the snapshot nearest to the given commit, following
+            PARENT (older) or CHILD (newer) edges, at most max_distance away
+
+            Returns:
+                Optional[dict]: The snapshot's commit hash, graph and distance
+        """
+
+        q = f"""MATCH path = (:Commit {{hash: $hash}})-[:{relation}*0..{int(max_distance)}]->(s:Commit)
+                WHERE s.snapshot IS NOT NULL
+                RETURN s.hash, s.snapshot, length(path)
+                ORDER BY length(path)
+                LIMIT 1"""
+
+        res = self.g.query(q, {'hash': commit}).result_set
+
+        if len(res) > 0:
+            return {'hash': res[0][0], 'graph': res[0][1], 'distance': res[0][2]}
+
+        return None
+
+    def get_distance(self, src: str, dest: str, max_distance: Optional[int] = None) -> Optional[int]:
+        """
+            Returns the number of transitions between two commits
+            None if they are not connected, or further than max_distance apart
+        """
+
+        bound = int(max_distance) if max_distance is not None else ''
+        for relation in ['PARENT', 'CHILD']:
+            q = f"""MATCH path = (:Commit {{hash: $src}})-[:{relation}*0..{bound}]->(:Commit {{hash: $dest}})
+                    RETURN length(path)
+                    LIMIT 1"""
+
+            res = self.g.query(q, {'src': src, 'dest': dest}).result_set
+            if len(res) > 0:
+                return res[0][0]
+
+        return None
+
+    def storage(self) -> dict:
+        """
+            Returns the storage cost of the history: the number of commits,
+            the size of the stored transitions in bytes and the number and
+            total size of the snapshots
+        """
+
+        q = """MATCH (c:Commit)
+               OPTIONAL MATCH (c)-[e]->(:Commit)
+               WITH c, sum(coalesce(size(e.delta), 0)) AS delta_bytes
+               RETURN count(c), sum(delta_bytes), count(c.snapshot),
+                      sum(coalesce(c.snapshot_nodes, 0)), sum(coalesce(c.snapshot_edges, 0))"""
+
+        row = self.g.query(q).result_set[0]
+
+        return {'commits': row[0], 'delta_bytes': row[1], 'snapshots': row[2],
+                'snapshot_nodes': row[3], 'snapshot_edges': row[4]}
+
     def get_child_commit(self, parent) -> Optional[dict]:
         q = """MATCH (c:Commit {hash: $parent})-[:CHILD]->(child: Commit)
                RETURN child"""
@@ -96,16 +207,29 @@ class GitGraph():
 
         return None
 
-    def connect_commits(self, child: str, parent: str) -> None:
+    def connect_parent(self, child: str, parent: str) -> None:
         """
-            connect commits via both PARENT and CHILD edges
+            connect a commit to its parent via a PARENT edge
         """
 
         logging.info(f"Connecting commits {child} -PARENT-> {parent}")
+
+        q = """MATCH (child :Commit {hash: $child_hash}), (parent :Commit {hash: $parent_hash})
+               MERGE (child)-[:PARENT]->(parent)"""
+
+        params = {'child_hash': child, 'parent_hash': parent}
+
+        self.g.query(q, params)
+
+    def connect_child(self, parent: str, child: str) -> None:
+        """
+            connect a commit to its child via a CHILD edge, the child
+            becomes the head commit, see get_head_commit
+        """
+
         logging.info(f"Connecting commits {parent} -CHILD-> {child}")
 
         q = """MATCH (child :Commit {hash: $child_hash}), (parent :Commit {hash: $parent_hash})
-               MERGE (child)-[:PARENT]->(parent)
                MERGE (parent)-[:CHILD]->(child)"""
 
         params = {'child_hash': child, 'parent_hash': parent}
@@ -113,66 +237,63 @@ class GitGraph():
         self.g.query(q, params)
 
 
-    def set_parent_transition(self, child: str, parent: str, queries: list[str], params: list[str]) -> None:
+    def set_parent_transition(self, child: str, parent: str, delta: str) -> None:
         """
-            Sets the queries and parameters needed to transition the code-graph
+            Sets the encoded delta transitioning the code-graph
             from the child commit to the parent commit
         """
 
         q = """MATCH (child :Commit {hash: $child})-[e:PARENT]->(parent :Commit {hash: $parent})
-               SET e.queries = $queries, e.params = $params"""
+               SET e.delta = $delta"""
 
-        _params = {'child': child, 'parent': parent, 'queries': queries, 'params': params}
+        _params = {'child': child, 'parent': parent, 'delta': delta}
 
         self.g.query(q, _params)
 
 
-    def set_child_transition(self, child: str, parent: str, queries: list[str], params: list[str]) -> None:
+    def set_child_transition(self, child: str, parent: str, delta: str) -> None:
         """
-            Sets the queries and parameters needed to transition the code-graph
+            Sets the encoded delta transitioning the code-graph
             from the parent commit to the child commit
         """
 
-        q = """MATCH (parent :Commit {hash: $parent})-[e:CHILD]->(child :Commit {hash: $child})
-               SET e.queries = $queries, e.params = $params"""
+        q = """MATCH (parent :Commit {hash: $parent}), (child :Commit {hash: $child})
+               MERGE (parent)-[e:CHILD]->(child)
+               SET e.delta = $delta"""
 
-        _params = {'child': child, 'parent': parent, 'queries': queries, 'params': params}
+        _params = {'child': child, 'parent': parent, 'delta': delta}
 
         self.g.query(q, _params)
 
 
-    def get_parent_transitions(self, child: str, parent: str) -> List[tuple[str: dict]]:
-        """
-            Get queries and parameters transitioning from child commit to parent commit
-        """
-        q = """MATCH path = (:Commit {hash: $child_hash})-[:PARENT*]->(:Commit {hash: $parent_hash})
+    def _get_transitions(self, src: str, dest: str, relation: str) -> list[list]:
+        q = f"""MATCH path = (:Commit {{hash: $src}})-[:{relation}*]->(:Commit {{hash: $dest}})
                WITH path
                LIMIT 1
                UNWIND relationships(path) AS e
                WITH e
-               WHERE e.queries is not NULL
-               RETURN collect(e.queries), collect(e.params)
+               WHERE e.delta IS NOT NULL OR e.queries IS NOT NULL
+               RETURN collect([e.delta, e.queries, e.params])
         """
 
-        res = self.g.query(q, {'child_hash': child, 'parent_hash': parent}).result_set
+        res = self.g.query(q, {'src': src, 'dest': dest}).result_set
 
-        return (res[0][0], res[0][1])
+        return res[0][0] if len(res) > 0 else []
 
 
-    def get_child_transitions(self, child: str, parent: str) -> List[tuple[str: dict]]:
+    def get_parent_transitions(self, child: str, parent: str) -> list[list]:
         """
-            Get queries and parameters transitioning from parent commit to child commit
-        """
-        q = """MATCH path = (:Commit {hash: $parent_hash})-[:CHILD*]->(:Commit {hash: $child_hash})
-               WITH path
-               LIMIT 1
-               UNWIND relationships(path) AS e
-               WITH e
-               WHERE e.queries is not NULL
-               RETURN collect(e.queries), collect(e.params)
+            Get the transitions from child commit to parent commit, in order,
+            each either [delta, None, None] or [None, queries, params]
         """
 
-        res = self.g.query(q, {'child_hash': child, 'parent_hash': parent}).result_set
+        return self._get_transitions(child, parent, 'PARENT')
+
 
-        return (res[0][0], res[0][1])
+    def get_child_transitions(self, child: str, parent: str) -> list[list]:
+        """
+            Get the transitions from parent commit to child commit, in order,
+            each either [delta, None, None] or [None, queries, params]
+        """
 
+        return self._get_transitions(parent, child, 'CHILD')
@@ -1,15 +1,19 @@
+import os
 import json
 import logging
+import tempfile
 
-from pygit2 import Diff
+from pygit2 import Commit, Diff, Oid
 from ..info import *
 from pygit2.repository import Repository
-from pygit2.enums import DeltaStatus, CheckoutStrategy
+from pygit2.enums import CheckoutStrategy, DeltaStatus, FileMode
 from pathlib import Path
-from ..graph import Graph
+from ..graph import Graph, graph_exists, snapshot_graph_name
+from ..delta import Delta
 from .git_graph import GitGraph
-from typing import List, Optional
+from typing import Callable, Iterator, List, Mapping, Optional
 from ..analyzers import SourceAnalyzer
+from ..analyzers.walker import PathIgnore
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(filename)s - %(asctime)s - %(levelname)s - %(message)s')
@@ -18,31 +22,192 @@ def GitRepoName(repo_name):
     """ Returns the git repository name """
     return "{" + repo_name + "}_git"
 
-def is_ignored(file_path: str, ignore_list: List[str]) -> bool:
+def commit_ignore(commit: Commit, ignore_list: List[str]) -> PathIgnore:
     """
-    Checks if a file should be ignored based on the ignore list.
+    The ignore rules of a commit's files, those of a working directory
+    analysis, see SourceWalker, with the .gitignore files read from the commit.
 
     Args:
-        file_path (str): The file path to check.
-        ignore_list (List[str]): List of patterns to ignore.
+        commit (Commit): The commit.
+        ignore_list (List[str]): Analysis ignore list, see ignore_spec.
 
     Returns:
-        bool: True if the file should be ignored, False otherwise.
+        PathIgnore: Tells whether a path, relative to the repository, is ignored.
     """
 
-    return any(file_path.startswith(ignore) for ignore in ignore_list)
+    tree = commit.tree
+
+    def gitignore(directory: str) -> Optional[str]:
+        try:
+            entry = tree[directory + '.gitignore']
+        except KeyError:
+            return None
+        if entry.type_str != 'blob':
+            return None
+        return entry.data.decode('utf-8', errors='replace')
+
+    return PathIgnore(ignore_list, gitignore)
+
+class CommitSources(Mapping):
+    """
+    The files of a commit read straight from the git object database, keyed
+    by their path within the repository's working directory, the working
+    directory itself is never read nor written.
+
+    Blobs are looked up in the commit's tree on access, the blob ids of
+    changed files, known from the diff, are used as is.
+    """
+
+    def __init__(self, repo: Repository, commit: Commit, blobs: Optional[dict[Path, Oid]] = None) -> None:
+        """
+        Args:
+            repo (Repository): The repository.
+            commit (Commit): The commit whose files are read.
+            blobs (dict[Path, Oid], optional): Blob ids of files known to the caller.
+        """
+
+        self.repo = repo
+        self.tree = commit.tree
+        self.root = Path(repo.workdir)
+        self.blobs = blobs if blobs is not None else {}
+
+    def oid(self, file_path: Path) -> Optional[Oid]:
+        """
+        The blob id of a file, None if the commit does not hold the file.
+        """
+
+        oid = self.blobs.get(file_path)
+        if oid is not None:
+            return oid
+
+        try:
+            entry = self.tree[Path(file_path).relative_to(self.root).as_posix()]
+        except (ValueError, KeyError):
+            return None
+
+        if entry.type_str != 'blob':
+            return None
+
+        self.blobs[file_path] = entry.id
+        return entry.id
+
+    def checkout(self, directory: Path) -> None:
+        """
+        Write the commit's files into directory, e.g. for language servers
+        which read files from disk, the repository's working directory and
+        index are left untouched.
+
+        Args:
+            directory (Path): The folder the files are written to.
+        """
+
+        self.repo.checkout_tree(self.tree, directory=str(directory),
+                                strategy=CheckoutStrategy.FORCE | CheckoutStrategy.DONT_UPDATE_INDEX)
+
+    def __contains__(self, file_path) -> bool:
+        return self.oid(file_path) is not None
+
+    def __getitem__(self, file_path: Path) -> bytes:
+        oid = self.oid(file_path)
+        if oid is None:
+            raise KeyError(file_path)
+        return self.repo[oid].data
+
+    def __iter__(self) -> Iterator[Path]:
+        stack = [(self.tree, self.root)]
+        while stack:
+            tree, base = stack.pop()
+            for entry in tree:
+                if entry.type_str == 'tree':
+                    stack.append((entry, base / entry.name))
+                elif entry.type_str == 'blob':
+                    yield base / entry.name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+class ScratchWorktree:
+    """
+    A scratch copy of the repository's files at the commit being
+    processed, for the language servers which read files from disk.
+
+    The commit is checked out once, the copy is then moved between
+    commits by writing the files a diff changes and removing the files it
+    deletes, the repository's working directory and index are left untouched.
+    """
+
+    def __init__(self, repo: Repository, commit: Commit) -> None:
+        """
+        Args:
+            repo (Repository): The repository.
+            commit (Commit): The commit initially checked out.
+        """
+
+        self.repo = repo
+        self.directory = tempfile.TemporaryDirectory(prefix="code-graph-")
+        self.path = Path(self.directory.name)
+        CommitSources(repo, commit).checkout(self.path)
+
+    def apply(self, diff: Diff) -> None:
+        """
+        Move the copy along a diff, from the diff's old commit to its new commit.
+
+        Args:
+            diff (Diff): The diff between the checked out commit and the next one.
+        """
+
+        # Deletions first, a file may replace a removed folder
+        for change in diff.deltas:
+            if change.status == DeltaStatus.ADDED:
+                continue
+
+            file_path = self.path / change.old_file.path
+            file_path.unlink(missing_ok=True)
+
+            # Drop the folders left empty
+            folder = file_path.parent
+            while folder != self.path:
+                try:
+                    folder.rmdir()
+                except OSError:
+                    break
+                folder = folder.parent
+
+        for change in diff.deltas:
+            if change.status == DeltaStatus.DELETED or change.new_file.mode == FileMode.COMMIT:
+                continue
+
+            file_path = self.path / change.new_file.path
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            data = self.repo[change.new_file.id].data
+            if change.new_file.mode == FileMode.LINK:
+                os.symlink(data, file_path)
+            else:
+                file_path.write_bytes(data)
+
+    def cleanup(self) -> None:
+        self.directory.cleanup()
 
 def classify_changes(
     diff: Diff,
     repo: Repository,
     supported_types: list[str],
-    ignore_list: List[str]) -> tuple[list[Path], list[Path], list[Path]]:
+    old_ignored: Callable[[str], bool],
+    new_ignored: Callable[[str], bool],
+    blobs: Optional[dict[Path, Oid]] = None) -> tuple[list[Path], list[Path], list[Path]]:
     """
     Classifies changes into added, deleted, and modified files.
 
+    A file is part of a commit's graph unless ignored by the commit's
+    rules, see commit_ignore, a modified file whose rules changed is
+    either added or deleted.
+
     Args:
         diff: The git diff object representing changes between two commits.
-        ignore_list (List[str]): List of file patterns to ignore.
+        old_ignored (Callable): Whether a path is ignored in the diff's old commit.
+        new_ignored (Callable): Whether a path is ignored in the diff's new commit.
+        blobs (dict[Path, Oid], optional): Populated with the new blob id
+            of every added and modified file.
 
     Returns:
         (List[str], List[str], List[str]): A tuple of lists representing added, deleted, and modified files.
@@ -51,33 +216,82 @@ def classify_changes(
     added, deleted, modified = [], [], []
 
     for change in diff.deltas:
-        if change.status == DeltaStatus.ADDED and not is_ignored(change.new_file.path, ignore_list):
+        if change.status not in [DeltaStatus.ADDED, DeltaStatus.DELETED, DeltaStatus.MODIFIED]:
+            continue
+
+        old_path = Path(f"{repo.workdir}/{change.old_file.path}")
+        new_path = Path(f"{repo.workdir}/{change.new_file.path}")
+        old = (change.status != DeltaStatus.ADDED and old_path.suffix in supported_types
+               and not old_ignored(change.old_file.path))
+        new = (change.status != DeltaStatus.DELETED and new_path.suffix in supported_types
+               and not new_ignored(change.new_file.path))
+
+        if old and new:
+            logging.debug("change file: %s", change.new_file.path)
+            modified.append(new_path)
+        elif new:
             logging.debug("new file: %s", change.new_file)
-            file_path = Path(f"{repo.workdir}/{change.new_file.path}")
-            if file_path.suffix in supported_types:
-                added.append(file_path)
-        if change.status == DeltaStatus.DELETED and not is_ignored(change.old_file.path, ignore_list):
+            added.append(new_path)
+        elif old:
             logging.debug("deleted file: %s", change.old_file.path)
-            file_path = Path(f"{repo.workdir}/{change.old_file.path}")
-            if file_path.suffix in supported_types:
-                deleted.append(file_path)
-        if change.status == DeltaStatus.MODIFIED and not is_ignored(change.new_file.path, ignore_list):
-            logging.debug("change file: %s", change.new_file.path)
-            file_path = Path(f"{repo.workdir}/{change.new_file.path}")
-            if file_path.suffix in supported_types:
-                modified.append(file_path)
+            deleted.append(old_path)
+
+        if new and blobs is not None:
+            blobs[new_path] = change.new_file.id
 
     return added, deleted, modified
 
+def snapshot_interval() -> int:
+    """
+    The number of commits between two materialized snapshots of the
+    code-graph, 0 disables snapshots, see CODE_GRAPH_SNAPSHOT_INTERVAL.
+    """
+
+    return max(0, int(os.getenv('CODE_GRAPH_SNAPSHOT_INTERVAL', '100')))
+
+def take_snapshot(g: Graph, git_graph: GitGraph, repo_name: str, commit: str) -> None:
+    """
+    Materialize the code-graph g, at the given commit, as a snapshot
+
+    Args:
+        g (Graph): The code-graph at commit.
+        git_graph (GitGraph): The git graph recording the snapshot.
+        repo_name (str): Name of the repository.
+        commit (str): The commit hash.
+    """
+
+    name = snapshot_graph_name(repo_name, commit)
+    if graph_exists(name):
+        Graph(name).delete()
+
+    snapshot = g.clone(name)
+    git_graph.set_snapshot(commit, name, snapshot.stats())
+    logging.info(f"Saved snapshot {name} of commit {commit}")
+
 # build a graph capturing the git commit history
-def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, ignore_list: Optional[List[str]] = None) -> GitGraph:
+def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, ignore_list: Optional[List[str]] = None,
+                       incremental: bool = False) -> GitGraph:
     """
     Builds a graph representation of the git commit history.
 
+    The working directory is left untouched, the files of every visited
+    commit are read from the object database, see CommitSources. Language
+    servers read a scratch copy of the visited commit, see ScratchWorktree.
+
+    A full build deletes the previous git graph and its snapshots. In
+    incremental mode only the commits newer than the newest commit
+    already held by the git graph are processed, their transitions are
+    appended to the graph. If that commit is no longer part of the
+    history, e.g. the history was rewritten, the graph is rebuilt.
+
+    Every snapshot_interval commits the code-graph is materialized as a
+    snapshot, bounding the number of transitions switch_commit replays.
+
     Args:
         path (str): Path to the git repository.
         repo_name (str): Name of the repository.
         ignore_list (List[str], optional): List of file patterns to ignore.
+        incremental (bool): Only process commits missing from the git graph.
 
     Returns:
         GitGraph: Graph object representing the commit history.
@@ -86,39 +300,87 @@ def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, igno
     if ignore_list is None:
         ignore_list = []
 
+    git_graph       = GitGraph(GitRepoName(repo_name))
+    supported_types = analyzer.supported_types()
+
+    # A full build replaces the previous git graph, its snapshots
+    # included, switch_commit must not restore a stale snapshot
+    if not incremental:
+        git_graph.delete()
+        git_graph = GitGraph(GitRepoName(repo_name))
+
+    # Initialize with the current commit
+    repo = Repository(path)
+    current_commit = repo.walk(repo.head.target).__next__()
+
+    # Newest commit already processed
+    head = git_graph.get_head_commit() if incremental else None
+    stop = head['hash'] if head is not None else None
+
+    # Commits to process along the first parent chain, newest first
+    chain = [current_commit]
+    while len(chain[-1].parents) > 0 and chain[-1].short_id != stop:
+        chain.append(chain[-1].parents[0])
+
+    if stop is not None:
+        if chain[-1].short_id != stop:
+            logging.warning(f"Commit {stop} is no longer part of {repo_name}'s history, rebuilding its git graph")
+            git_graph.delete()
+            git_graph = GitGraph(GitRepoName(repo_name))
+        elif len(chain) == 1:
+            logging.info(f"Git graph of {repo_name} is up to date at commit {stop}")
+            return git_graph
+        else:
+            logging.info(f"Appending {len(chain) - 1} commits to the git graph of {repo_name}")
+
+    # Commits since the last snapshot, an incremental build resumes
+    # counting from the newest snapshot older than the head commit,
+    # or from the root commit if there is none
+    interval = snapshot_interval()
+    since = 0
+    if interval > 0 and stop is not None and chain[-1].short_id == stop:
+        snapshot = git_graph.get_nearest_snapshot(stop, interval, 'PARENT')
+        if snapshot is not None:
+            since = snapshot['distance']
+        else:
+            commit = chain[-1]
+            while since < interval and len(commit.parents) > 0:
+                commit = commit.parents[0]
+                since += 1
+
     # Copy the graph into a temporary graph
     logging.info("Cloning source graph %s -> %s_tmp", repo_name, repo_name)
     # Will be deleted at the end of this function
     g = Graph(repo_name).clone(repo_name + "_tmp")
     g.enable_backlog()
 
-    git_graph       = GitGraph(GitRepoName(repo_name))
-    supported_types = analyzer.supported_types()
-
-    # Initialize with the current commit
-    # Save current git for later restoration
-    repo = Repository('.')
-    current_commit = repo.walk(repo.head.target).__next__()
-    current_commit_hexsha = current_commit.short_id
+    # Files read by the language servers, moved along with the walks
+    worktree = ScratchWorktree(repo, current_commit)
 
     # Add commit to the git graph
     git_graph.add_commit(current_commit)
 
+    # Every commit along the first parent chain is visited twice,
+    # files analyzed within a commit are reported as part of the history
+    report = analyzer.progress
+    total = 2 * (len(chain) - 1)
+    done = 0
+    if report is not None:
+        report("git_history", done, total)
+        analyzer.progress = lambda phase, files_done, files_total: report("git_history", done, total)
+
     #--------------------------------------------------------------------------
     # Process git history going backwards
     #--------------------------------------------------------------------------
 
     logging.info("Computing transition queries moving backwards")
 
-    child_commit = current_commit
-    while len(child_commit.parents) > 0:
-        parent_commit = child_commit.parents[0]
-
+    for child_commit, parent_commit in zip(chain, chain[1:]):
         # add commit to the git graph
         git_graph.add_commit(parent_commit)
 
         # connect child parent commits relation
-        git_graph.connect_commits(child_commit.short_id, parent_commit.short_id)
+        git_graph.connect_parent(child_commit.short_id, parent_commit.short_id)
 
         # Represents the changes going backward!
         # e.g. which files need to be deleted when moving back one commit
@@ -133,12 +395,14 @@ def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, igno
             child {child_commit.short_id}: {child_commit.message}
             and {parent_commit.short_id}: {parent_commit.message}""")
 
+        blobs = {}
         diff = repo.diff(child_commit, parent_commit)
-        added, deleted, modified = classify_changes(diff, repo, supported_types, ignore_list)
+        added, deleted, modified = classify_changes(diff, repo, supported_types, commit_ignore(child_commit, ignore_list),
+                                                    commit_ignore(parent_commit, ignore_list), blobs)
+        worktree.apply(diff)
 
-        # Checkout prev commit
-        logging.info(f"Checking out commit: {parent_commit.short_id}")
-        repo.checkout_tree(parent_commit.tree, strategy=CheckoutStrategy.FORCE)
+        # Files are read from the parent commit's blobs
+        sources = CommitSources(repo, parent_commit, blobs)
 
         #-----------------------------------------------------------------------
         # Apply changes going backwards
@@ -154,41 +418,32 @@ def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, igno
 
         if len(added + modified) > 0:
             logging.info(f"Introducing a new filed: {added + modified}")
-            analyzer.analyze_files(added + modified, Path(path), g)
-
-        queries, params = g.clear_backlog()
+            analyzer.analyze_files(added + modified, Path(path), g, sources, worktree.path)
 
-        # Save transition queries to the git graph
-        if len(queries) > 0:
-            assert(len(queries) == len(params))
+        delta = g.clear_backlog()
 
-            # Covert parameters from dict to JSON formatted string
-            params = [json.dumps(p) for p in params]
+        # Save transition delta to the git graph
+        if len(delta) > 0:
+            delta = delta.encode()
 
             # Log transitions
             logging.debug(f"""Save graph transition from
                              commit: {child_commit.short_id}
                              to
                              commit: {parent_commit.short_id}
-                             Queries: {queries}
-                             Parameters: {params}
+                             Delta: {len(delta)} bytes
                           """)
 
-            git_graph.set_parent_transition(child_commit.short_id,
-                                            parent_commit.short_id, queries, params)
-        # advance to the next commit
-        child_commit = parent_commit
+            git_graph.set_parent_transition(child_commit.short_id, parent_commit.short_id, delta)
+        done += 1
+        analyzer.report("git_history", done, total)
 
     #--------------------------------------------------------------------------
     # Process git history going forward
     #--------------------------------------------------------------------------
 
     logging.info("Computing transition queries moving forward")
-    parent_commit = child_commit
-    while parent_commit.short_id != current_commit_hexsha:
-        child_commit = git_graph.get_child_commit(parent_commit.short_id)
-        child_commit = repo.walk(child_commit['hash']).__next__()
-
+    for parent_commit, child_commit in zip(reversed(chain[1:]), reversed(chain[:-1])):
         # Represents the changes going forward
         # e.g. which files need to be deleted when moving forward one commit
 
@@ -197,12 +452,14 @@ def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, igno
             child {parent_commit.short_id}: {parent_commit.message}
             and {child_commit.short_id}: {child_commit.message}""")
 
+        blobs = {}
         diff = repo.diff(parent_commit, child_commit)
-        added, deleted, modified = classify_changes(diff, repo, supported_types, ignore_list)
+        added, deleted, modified = classify_changes(diff, repo, supported_types, commit_ignore(parent_commit, ignore_list),
+                                                    commit_ignore(child_commit, ignore_list), blobs)
+        worktree.apply(diff)
 
-        # Checkout child commit
-        logging.info(f"Checking out commit: {child_commit.short_id}")
-        repo.checkout_tree(child_commit.tree, strategy=CheckoutStrategy.FORCE)
+        # Files are read from the child commit's blobs
+        sources = CommitSources(repo, child_commit, blobs)
 
         #-----------------------------------------------------------------------
         # Apply changes going forward
@@ -218,37 +475,46 @@ def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, igno
 
         if len(added + modified) > 0:
             logging.info(f"Introducing a new files: {added + modified}")
-            analyzer.analyze_files(added + modified, Path(path), g)
-
-        queries, params = g.clear_backlog()
+            analyzer.analyze_files(added + modified, Path(path), g, sources, worktree.path)
 
-        # Save transition queries to the git graph
-        if len(queries) > 0:
-            assert(len(queries) == len(params))
+        delta = g.clear_backlog()
 
-            # Covert parameters from dict to JSON formatted string
-            params = [json.dumps(p) for p in params]
+        # Save transition delta to the git graph
+        if len(delta) > 0:
+            delta = delta.encode()
 
             # Log transitions
             logging.debug(f"""Save graph transition from
                              commit: {parent_commit.short_id}
                              to
                              commit: {child_commit.short_id}
-                             Queries: {queries}
-                             Parameters: {params}
+                             Delta: {len(delta)} bytes
                           """)
 
-            git_graph.set_child_transition(child_commit.short_id,
-                                            parent_commit.short_id, queries, params)
-        # advance to the child_commit
-        parent_commit = child_commit
+            git_graph.set_child_transition(child_commit.short_id, parent_commit.short_id, delta)
+
+        # connect parent child commits relation, the child commit
+        # is now the head of the git graph, see GitGraph.get_head_commit
+        git_graph.connect_child(parent_commit.short_id, child_commit.short_id)
+
+        since += 1
+        if interval > 0 and since >= interval:
+            take_snapshot(g, git_graph, repo_name, child_commit.short_id)
+            since = 0
+
+        done += 1
+        analyzer.report("git_history", done, total)
 
     logging.debug("Done processing repository commit history")
+    logging.info(f"Git history storage of {repo_name}: {git_graph.storage()}")
 
     #--------------------------------------------------------------------------
     # Clean up
     #--------------------------------------------------------------------------
 
+    analyzer.progress = report
+    worktree.cleanup()
+
     # Delete temporaty graph
     g.disable_backlog()
 
@@ -257,6 +523,46 @@ def build_commit_graph(path: str, analyzer: SourceAnalyzer, repo_name: str, igno
 
     return git_graph
 
+def nearest_snapshot(git_graph: GitGraph, commit: str, max_distance: int) -> Optional[dict]:
+    """
+    The snapshot nearest to commit, either older or newer, at most max_distance commits away
+
+    Returns:
+        Optional[dict]: The snapshot's commit hash, graph, distance and the relation
+            leading from commit to the snapshot, None if there is no such snapshot
+    """
+
+    nearest = None
+    for relation in ['PARENT', 'CHILD']:
+        snapshot = git_graph.get_nearest_snapshot(commit, max_distance, relation)
+        if snapshot is not None and (nearest is None or snapshot['distance'] < nearest['distance']):
+            nearest = {**snapshot, 'relation': relation}
+
+    return nearest
+
+def apply_transitions(g: Graph, transitions: list[list]) -> None:
+    """
+    Apply transitions, as returned by GitGraph.get_parent_transitions
+    and GitGraph.get_child_transitions, to a graph in order
+
+    Args:
+        g (Graph): The graph to update.
+        transitions (list[list]): The transitions to apply.
+    """
+
+    for delta, queries, params in transitions:
+        if delta is not None:
+            g.apply_delta(Delta.decode(delta))
+            continue
+
+        # Transitions stored by earlier versions, replay their queries
+        for _q, _p in zip(queries, params):
+            _p = json.loads(_p)
+            logging.debug(f"Executing query: {_q} with params: {_p}")
+
+            # Rerun the query with parameters on the graph
+            g.rerun_query(_q, _p)
+
 def switch_commit(repo: str, to: str):
     """
     Switches the state of a graph repository from its current commit to the given commit.
@@ -309,24 +615,51 @@ def switch_commit(repo: str, to: str):
     if current_commit['date'] > new_commit['date']:
         child_commit  = current_commit
         parent_commit = new_commit
-        logging.info(f"Moving backward from {child_commit['hash']} to {parent_commit['hash']}")
-        # Get the transitions (queries and parameters) for moving backward
-        queries, params = git_graph.get_parent_transitions(child_commit['hash'], parent_commit['hash'])
+        relation = 'PARENT'
     else:
         child_commit  = new_commit
         parent_commit = current_commit
-        logging.info(f"Moving forward from {parent_commit['hash']} to {child_commit['hash']}")
-        # Get the transitions (queries and parameters) for moving forward
-        queries, params = git_graph.get_child_transitions(child_commit['hash'], parent_commit['hash'])
-
-    # Apply each transition query with its respective parameters
-    for q, p in zip(queries, params):
-        for _q, _p in zip(q, p):
-            _p = json.loads(_p)
-            logging.debug(f"Executing query: {_q} with params: {_p}")
-
-            # Rerun the query with parameters on the graph
-            g.rerun_query(_q, _p)
+        relation = 'CHILD'
+
+    # Restore the snapshot nearest to the target commit
+    # if it is closer than the current commit
+    snapshot = None
+    interval = snapshot_interval()
+    if interval > 0:
+        # Snapshots are looked up within interval, commits further apart are not measured
+        distance = git_graph.get_distance(current_hash, to, interval)
+        snapshot = nearest_snapshot(git_graph, to, interval if distance is None else distance)
+        if snapshot is not None and distance is not None and snapshot['distance'] >= distance:
+            snapshot = None
+
+    if snapshot is not None:
+        logging.info(f"Restoring snapshot of commit {snapshot['hash']}, {snapshot['distance']} commits from {to}")
+        name = snapshot_graph_name(repo, 'restore')
+        if graph_exists(name):
+            Graph(name).delete()
+
+        restored = Graph(snapshot['graph']).clone(name)
+
+        if snapshot['relation'] == 'PARENT':
+            # The snapshot is an ancestor of the target commit, move forward
+            transitions = git_graph.get_child_transitions(to, snapshot['hash'])
+        else:
+            # The snapshot is a descendant of the target commit, move backward
+            transitions = git_graph.get_parent_transitions(snapshot['hash'], to)
+
+        apply_transitions(restored, transitions)
+        restored.replace(repo)
+    else:
+        if relation == 'PARENT':
+            logging.info(f"Moving backward from {child_commit['hash']} to {parent_commit['hash']}")
+            # Get the transitions for moving backward
+            transitions = git_graph.get_parent_transitions(child_commit['hash'], parent_commit['hash'])
+        else:
+            logging.info(f"Moving forward from {parent_commit['hash']} to {child_commit['hash']}")
+            # Get the transitions for moving forward
+            transitions = git_graph.get_child_transitions(child_commit['hash'], parent_commit['hash'])
+
+        apply_transitions(g, transitions)
 
     # Update the graph's commit to the new target commit
     set_repo_commit(repo, to)
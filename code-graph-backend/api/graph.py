@@ -1,66 +1,170 @@
 import os
 import time
+import pathlib
 from .entities import *
-from typing import Optional
-from falkordb import FalkorDB, Path, Node, QueryResult
+from typing import Callable, Optional
+from falkordb import Path, Node, QueryResult
+from .db import get_db, select_graph, forget_graph
+from .delta import Delta, NodeKey, node_key
 
 # Configure the logger
 import logging
 logging.basicConfig(level=logging.DEBUG,
                     format='%(filename)s - %(asctime)s - %(levelname)s - %(message)s')
 
-def graph_exists(name: str):
-    db = FalkorDB(host=os.getenv('FALKORDB_HOST', 'localhost'),
-                  port=os.getenv('FALKORDB_PORT', 6379),
-                  username=os.getenv('FALKORDB_USERNAME', None),
-                  password=os.getenv('FALKORDB_PASSWORD', None))
+# Prefix of the shared, per package@version, dependency graphs
+DEPENDENCY_GRAPH_PREFIX = "deps:"
+
+def dependency_graph_name(package: str) -> str:
+    """
+    Name of the shared graph holding a dependency package, e.g. deps:requests@2.31.0
+    """
+
+    return f"{DEPENDENCY_GRAPH_PREFIX}{package}"
+
+# Suffixes of the graph a full analysis is built into and of the graph it replaced
+SHADOW_GRAPH_SUFFIX = "_shadow"
+PREVIOUS_GRAPH_SUFFIX = "_previous"
+
+def shadow_graph_name(name: str) -> str:
+    return f"{name}{SHADOW_GRAPH_SUFFIX}"
+
+def previous_graph_name(name: str) -> str:
+    return f"{name}{PREVIOUS_GRAPH_SUFFIX}"
 
-    return name in db.list_graphs()
+# Suffix of the graphs holding the state of a repository at a past commit
+SNAPSHOT_GRAPH_SUFFIX = "_snapshot"
+
+def snapshot_graph_name(name: str, commit: str) -> str:
+    return f"{name}_{commit}{SNAPSHOT_GRAPH_SUFFIX}"
+
+def graph_exists(name: str):
+    return name in get_db().list_graphs()
 
 def get_repos() -> list[str]:
     """
         List processed repositories
     """
 
-    db = FalkorDB(host=os.getenv('FALKORDB_HOST', 'localhost'),
-                  port=os.getenv('FALKORDB_PORT', 6379),
-                  username=os.getenv('FALKORDB_USERNAME', None),
-                  password=os.getenv('FALKORDB_PASSWORD', None))
-
-    graphs = db.list_graphs()
-    graphs = [g for g in graphs if not (g.endswith('_git') or g.endswith('_schema'))]
+    graphs = get_db().list_graphs()
+    graphs = [g for g in graphs if not (g.endswith('_git') or g.endswith('_schema') or g.startswith(DEPENDENCY_GRAPH_PREFIX)
+                                        or g.endswith(SHADOW_GRAPH_SUFFIX) or g.endswith(PREVIOUS_GRAPH_SUFFIX)
+                                        or g.endswith(SNAPSHOT_GRAPH_SUFFIX))]
     return graphs
 
-class Graph():
+def _swap_graphs(src: str, dest: str, backup: Optional[str]) -> None:
     """
-    Represents a connection to a graph database using FalkorDB.
+    Atomically rename src to dest, the current dest, if any, is kept as backup
+    or deleted if no backup is given
+
+    Redis transactions are not rolled back, src and dest are therefore
+    checked within the transaction, watched so they can not change
+    until it is applied, and nothing is renamed if src is missing
     """
 
-    def __init__(self, name: str) -> None:
-        self.name = name
-        self.db = FalkorDB(host=os.getenv('FALKORDB_HOST', 'localhost'),
-                           port=os.getenv('FALKORDB_PORT', 6379),
-                           username=os.getenv('FALKORDB_USERNAME', None),
-                           password=os.getenv('FALKORDB_PASSWORD', None))
-        self.g = self.db.select_graph(name)
+    def swap(pipe) -> None:
+        if not pipe.exists(src):
+            raise Exception(f"Can not swap graph {src} into {dest}, {src} does not exist")
+        live = pipe.exists(dest)
 
-        # Initialize the backlog as disabled by default
-        self.backlog = None
+        # Renames are applied at once, readers either see the former or the new graph
+        pipe.multi()
+        if backup is None:
+            pipe.delete(dest)
+        else:
+            pipe.delete(backup)
+            if live:
+                pipe.rename(dest, backup)
+        pipe.rename(src, dest)
 
-        # create indicies
+    get_db().connection.transaction(swap, src, dest)
 
-        # index File path, name and ext fields
-        try:
-            self.g.create_node_range_index("File", "name", "ext")
-        except Exception:
-            pass
+    for name in [src, dest, backup]:
+        if name is not None:
+            forget_graph(name)
+
+def rollback_graph(name: str) -> None:
+    """
+    Restore the graph a full analysis replaced, the replacing graph is kept
+    in its place, so a rollback can be undone by another rollback.
+
+    Args:
+        name (str): The repository graph name.
+    """
+
+    previous, shadow = previous_graph_name(name), shadow_graph_name(name)
+
+    def swap(pipe) -> None:
+        if not pipe.exists(previous) or not pipe.exists(name):
+            raise Exception(f"No previous graph to restore for {name}")
+
+        # The replacing graph is parked under the shadow name while swapping
+        pipe.multi()
+        pipe.delete(shadow)
+        pipe.rename(name, shadow)
+        pipe.rename(previous, name)
+        pipe.rename(shadow, previous)
+
+    get_db().connection.transaction(swap, previous, name)
+
+    for graph in [name, previous, shadow]:
+        forget_graph(graph)
+
+    logging.info(f"Graph {name} rolled back")
+
+# Entity labels produced by the analyzers, see AbstractAnalyzer.get_entity_label
+ENTITY_LABELS = ["Class", "Interface", "Enum", "Struct", "Union", "Namespace",
+                 "Function", "Method", "Constructor"]
 
-        # index Function using full-text search
+def _create_indices(g) -> None:
+    """
+    Creates the code graph indices, invoked once per graph handle
+    """
+
+    # index File name and ext fields
+    try:
+        g.create_node_range_index("File", "name", "ext")
+    except Exception:
+        pass
+
+    # index File and entity paths, nodes are matched by path
+    # when applying a delta, see Graph.apply_delta
+    for label in ["File"] + ENTITY_LABELS:
         try:
-            self.g.create_node_fulltext_index("Searchable", "name")
+            g.create_node_range_index(label, "path")
         except Exception:
             pass
 
+    # index Function using full-text search
+    try:
+        g.create_node_fulltext_index("Searchable", "name")
+    except Exception:
+        pass
+
+class Graph():
+    """
+    Represents a connection to a graph database using FalkorDB.
+    """
+
+    def __init__(self, name: str, repo: Optional[str] = None) -> None:
+        """
+        Args:
+            name (str): The graph name.
+            repo (str, optional): The repository the graph belongs to, defaults to name,
+                differs for a shadow graph, see shadow.
+        """
+
+        self.name = name
+        self.repo = repo if repo is not None else name
+
+        # Connections are pooled and graph handles are cached process wide
+        # indices are created the first time a handle is selected
+        self.db = get_db()
+        self.g = select_graph(name, _create_indices)
+
+        # Initialize the backlog as disabled by default
+        self.backlog = None
+
     def clone(self, clone: str) -> "Graph":
         """
         Create a copy of the graph under the name clone
@@ -83,18 +187,101 @@ class Graph():
         return Graph(clone)
 
 
+    def shadow(self, fresh: bool = True) -> "Graph":
+        """
+        The graph a full analysis of the repository is built into, readers
+        keep using this graph until the shadow is promoted.
+
+        Args:
+            fresh (bool): Delete the shadow left over by a previous build,
+                otherwise it is kept, e.g. to resume an interrupted build.
+
+        Returns:
+            Graph: The shadow graph.
+        """
+
+        name = shadow_graph_name(self.name)
+        if fresh and self.db.connection.exists(name):
+            logging.info(f"Deleting stale shadow graph {name}")
+            Graph(name).delete()
+
+        return Graph(name, self.name)
+
+    def promote(self) -> None:
+        """
+        Atomically replace the repository's graph with this shadow graph,
+        the replaced graph is kept for rollback, see rollback_graph.
+        """
+
+        if self.name == self.repo:
+            raise Exception(f"Graph {self.name} is not a shadow graph")
+
+        _swap_graphs(self.name, self.repo, previous_graph_name(self.repo))
+        logging.info(f"Shadow graph {self.name} promoted to {self.repo}")
+
+        self.name = self.repo
+        self.g = select_graph(self.name, _create_indices)
+
+    def replace(self, name: str) -> None:
+        """
+        Atomically replace the graph name with this graph, e.g. a restored snapshot,
+        the replaced graph is deleted.
+
+        Args:
+            name (str): The graph to replace.
+        """
+
+        _swap_graphs(self.name, name, None)
+        logging.info(f"Graph {self.name} replaced {name}")
+
+        self.name = name
+        self.repo = name
+        self.g = select_graph(self.name, _create_indices)
+
+    def is_empty(self) -> bool:
+        """
+        Check if the graph holds no nodes, e.g. it is analyzed for the first time.
+
+        Returns:
+            bool: True if the graph is empty, False otherwise.
+        """
+
+        q = "MATCH (n) RETURN n LIMIT 1"
+        return len(self._query(q).result_set) == 0
+
+    def is_package_indexed(self) -> bool:
+        """
+        Check if the graph holds a completely indexed dependency package,
+        see set_package_indexed.
+        """
+
+        q = "MATCH (p:Package) RETURN p LIMIT 1"
+        return len(self._query(q).result_set) > 0
+
+    def set_package_indexed(self, package: str) -> None:
+        """
+        Mark a dependency graph as completely indexed.
+
+        Args:
+            package (str): The package, name@version.
+        """
+
+        q = "MERGE (p:Package {name: $package})"
+        self._query(q, {'package': package})
+
     def delete(self) -> None:
         """
         Delete graph
         """
         self.g.delete()
+        forget_graph(self.name)
 
     def enable_backlog(self) -> None:
         """
-        Enables the backlog by initializing an empty list.
+        Enables the backlog, changes made to the graph are recorded as a Delta.
         """
 
-        self.backlog = {'queries': [], 'params': []}
+        self.backlog = Delta()
         logging.debug("Backlog enabled")
 
     def disable_backlog(self) -> None:
@@ -105,39 +292,91 @@ class Graph():
         self.backlog = None
         logging.debug("Backlog disabled")
 
-    def clear_backlog(self) -> tuple[list[str], list[dict]]:
+    def clear_backlog(self) -> Delta:
         """
-        Clears and returns the backlog of queries and parameters.
+        Clears and returns the backlog.
 
         Returns:
-            tuple[list[str], list[dict]]: A tuple containing two lists:
-            - The first list contains the backlog of queries.
-            - The second list contains the backlog of query parameters.
+            Delta: The changes made since the backlog was enabled or last
+                cleared, empty if the backlog is disabled.
         """
 
-        res = [], []  # Default return value
+        if self.backlog is None:
+            return Delta()
+
+        delta = self.backlog
+        delta.resolve(self._node_keys)
 
-        if self.backlog:
-            params  = self.backlog['params']
-            queries = self.backlog['queries']
+        # Clear backlog
+        self.backlog = Delta()
 
-            # Clear backlog
-            self.backlog = {'queries': [], 'params': []}
+        logging.debug(f"Backlog cleared, {len(delta)} changes")
 
-            logging.debug(f"Backlog queries: {queries}")
-            logging.debug(f"Backlog params: {params}")
+        return delta
 
-            # Set return value
-            res = queries, params
+    def _node_keys(self, ids: list[int]) -> dict[int, NodeKey]:
+        """
+        The stable keys of nodes, see Delta.
+        """
 
-        logging.debug("Backlog cleared")
+        q = """MATCH (n)
+               WHERE ID(n) IN $ids
+               RETURN ID(n), [l IN labels(n) WHERE l <> 'Searchable'][0], n.path, n.name, n.src_start, n.src_end"""
 
-        return res
+        res = self._query(q, {'ids': ids})
+        return {row[0]: node_key(*row[1:]) for row in res.result_set}
 
+    def apply_delta(self, delta: Delta) -> None:
+        """
+        Apply a transition recorded by the backlog of a graph in the same state,
+        using a single UNWIND query per operation, label and relation.
+
+        Args:
+            delta (Delta): The transition.
+        """
+
+        if len(delta.deleted) > 0:
+            self.delete_files([pathlib.Path(path) for path in delta.deleted])
+
+        if len(delta.files) > 0:
+            q = """UNWIND $files AS file
+                   MERGE (f:File:Searchable {path: file['path'], name: file['name'], ext: file['ext']})"""
+            files = [pathlib.Path(path) for path in delta.files]
+            self._query(q, {'files': [{'path': str(f), 'name': f.name, 'ext': f.suffix} for f in files]})
+
+        for label, entities in delta.entities.items():
+            self.add_entities(label, entities)
+
+        for group, edges in delta.edges.items():
+            self._query(self._delta_edges_query(*group.split(':')), {'edges': edges})
+
+    @staticmethod
+    def _delta_edges_query(relation: str, src_label: str, dest_label: str) -> str:
+        """
+        The query connecting the nodes of a delta's edge group, nodes are
+        matched by their stable keys through the path indices, see _create_indices.
+
+        Args:
+            relation (str): The relationship type.
+            src_label (str): The source nodes label.
+            dest_label (str): The destination nodes label.
+
+        Returns:
+            str: The query, taking the edges as the $edges parameter.
+        """
+
+        def match(var: str, label: str, key: str) -> str:
+            if label == 'File':
+                return f"({var}:File {{path: {key}[0]}})"
+            return f"({var}:{label} {{path: {key}[0], name: {key}[1], src_start: {key}[2], src_end: {key}[3]}})"
+
+        return f"""UNWIND $edges AS edge
+                   MATCH {match('src', src_label, 'edge[0]')}, {match('dest', dest_label, 'edge[1]')}
+                   MERGE (src)-[e:{relation}]->(dest)"""
 
     def _query(self, q: str, params: Optional[dict] = None) -> QueryResult:
         """
-        Executes a query on the graph database and logs changes to the backlog if any.
+        Executes a query on the graph database.
 
         Args:
             q (str): The query string to execute.
@@ -147,28 +386,7 @@ class Graph():
             QueryResult: The result of the query execution.
         """
 
-        result_set = self.g.query(q, params)
-
-        if self.backlog is not None:
-            # Check if any change occurred in the query results
-            change_detected = any(
-                getattr(result_set, attr) > 0
-                for attr in [
-                    'relationships_deleted', 'nodes_deleted', 'labels_added',
-                    'labels_removed', 'nodes_created', 'properties_set',
-                    'properties_removed', 'relationships_created'
-                ]
-            )
-            logging.info(f"change_detected: {change_detected}")
-
-            # Append the query and parameters to the backlog if changes occurred
-            if change_detected:
-                logging.debug(f"logging queries: {q}")
-                logging.debug(f"logging params: {params}")
-                self.backlog['queries'].append(q)
-                self.backlog['params'].append(params)
-
-        return result_set
+        return self.g.query(q, params)
 
     def get_sub_graph(self, l: int) -> dict:
 
@@ -264,8 +482,47 @@ class Graph():
 
         res  = self._query(q, params)
         node = res.result_set[0][0]
+
+        if self.backlog is not None:
+            self.backlog.add_entities(label, [params], [node.id])
+
         return node.id
 
+    def add_entities(self, label: str, entities: list[dict], create: bool = False) -> list[int]:
+        """
+        Adds multiple nodes sharing the same label to the graph database
+        using a single UNWIND query.
+
+        Args:
+            label (str): The nodes label.
+            entities (list[dict]): Node records, each holding
+                name, doc, path, src_start, src_end and props.
+            create (bool): Use CREATE instead of MERGE, the caller guarantees
+                none of the nodes exists.
+
+        Returns:
+            list[int]: The IDs of the nodes, in the order of the given records.
+        """
+
+        if len(entities) == 0:
+            return []
+
+        op = "CREATE" if create else "MERGE"
+        q = f"""UNWIND $entities AS e
+               {op} (c:{label}:Searchable {{name: e['name'], path: e['path'],
+                               src_start: e['src_start'], src_end: e['src_end']}})
+               SET c.doc = e['doc']
+               SET c += e['props']
+               RETURN ID(c)"""
+
+        res = self._query(q, {'entities': entities})
+        ids = [row[0] for row in res.result_set]
+
+        if self.backlog is not None:
+            self.backlog.add_entities(label, entities, ids)
+
+        return ids
+
     def get_class_by_name(self, class_name: str) -> Optional[Node]:
         q = "MATCH (c:Class) WHERE c.name = $name RETURN c LIMIT 1"
         res = self._query(q, {'name': class_name}).result_set
@@ -405,6 +662,35 @@ class Graph():
         node    = res.result_set[0][0]
         file.id = node.id
 
+        if self.backlog is not None:
+            self.backlog.add_files([str(file.path)], [file.id])
+
+    def add_files(self, files: list[File], create: bool = False) -> None:
+        """
+        Add multiple file nodes to the graph database using a single UNWIND query.
+
+        Args:
+            files (list[File]): The files, each file's id is set.
+            create (bool): Use CREATE instead of MERGE, the caller guarantees
+                none of the files exists.
+        """
+
+        if len(files) == 0:
+            return
+
+        op = "CREATE" if create else "MERGE"
+        q = f"""UNWIND $files AS file
+               {op} (f:File:Searchable {{path: file['path'], name: file['name'], ext: file['ext']}})
+               RETURN ID(f)"""
+        params = {'files': [{'path': str(file.path), 'name': file.path.name, 'ext': file.path.suffix} for file in files]}
+
+        res = self._query(q, params)
+        for file, row in zip(files, res.result_set):
+            file.id = row[0]
+
+        if self.backlog is not None:
+            self.backlog.add_files([str(file.path) for file in files], [file.id for file in files])
+
     def delete_files(self, files: list[Path]) -> tuple[str, dict, list[int]]:
         """
         Deletes file(s) from the graph in addition to any other entity
@@ -423,8 +709,69 @@ class Graph():
         params = {'files': [{'path': str(file_path), 'name': file_path.name, 'ext' : file_path.suffix} for file_path in files]}
         self._query(q, params)
 
+        if self.backlog is not None:
+            self.backlog.delete_files([str(file_path) for file_path in files])
+
         return None
 
+    def get_dependent_files(self, files: list[Path]) -> list[str]:
+        """
+        Find the files defining entities with a resolved relationship
+        (e.g. CALLS, EXTENDS) to an entity defined in one of the given files.
+
+        Args:
+            files (list[Path]): The files depended upon.
+
+        Returns:
+            list[str]: Paths of the dependent files, excluding the given files.
+        """
+
+        if len(files) == 0:
+            return []
+
+        q = """UNWIND $files AS file
+               MATCH (f:File {path: file['path'], name: file['name'], ext: file['ext']})-[:DEFINES*]->(e)
+               MATCH (dependent:File)-[:DEFINES*]->(src)-[r]->(e)
+               WHERE type(r) <> 'DEFINES' AND dependent <> f
+               RETURN DISTINCT dependent.path"""
+
+        params = {'files': [{'path': str(file_path), 'name': file_path.name, 'ext' : file_path.suffix} for file_path in files]}
+        paths = {row[0] for row in self._query(q, params).result_set}
+
+        return sorted(paths - {str(file_path) for file_path in files})
+
+    def get_node_ids(self, files: list[Path]) -> dict[tuple, int]:
+        """
+        Find the ids of the given files and of every entity they define.
+
+        Args:
+            files (list[Path]): The files.
+
+        Returns:
+            dict[tuple, int]: Node ids keyed by ('File', path) for files and by
+                (label, path, name, src_start, src_end) for entities.
+        """
+
+        if len(files) == 0:
+            return {}
+
+        q = """UNWIND $files AS file
+               MATCH (f:File {path: file['path'], name: file['name'], ext: file['ext']})
+               OPTIONAL MATCH (f)-[:DEFINES*]->(e)
+               WITH f, collect(e) AS entities
+               RETURN ID(f), f.path, [e IN entities | [ID(e), [l IN labels(e) WHERE l <> 'Searchable'][0],
+                                                     e.name, e.src_start, e.src_end]]"""
+
+        params = {'files': [{'path': str(file_path), 'name': file_path.name, 'ext' : file_path.suffix} for file_path in files]}
+
+        ids = {}
+        for file_id, path, entities in self._query(q, params).result_set:
+            ids[('File', path)] = file_id
+            for entity_id, label, name, src_start, src_end in entities:
+                ids[(label, path, name, src_start, src_end)] = entity_id
+
+        return ids
+
     def get_file(self, path: str, name: str, ext: str) -> Optional[File]:
         """
         Retrieves a File entity from the graph database based on its path, name, and extension.
@@ -496,6 +843,49 @@ class Graph():
         params = {'src_id': src_id, 'dest_id': dest_id}
         self._query(q, params)
 
+        if self.backlog is not None:
+            self.backlog.connect(relation, [(src_id, dest_id)])
+
+    def connect_entities_bulk(self, relation: str, edges: list[tuple[int, int]], create: bool = False) -> None:
+        """
+        Establish multiple relationships of the same type using a single UNWIND query.
+
+        Args:
+            relation (str): The relationship type.
+            edges (list[tuple[int, int]]): (source ID, destination ID) pairs.
+            create (bool): Use CREATE instead of MERGE, the caller guarantees
+                none of the relationships exists.
+        """
+
+        if len(edges) == 0:
+            return
+
+        op = "CREATE" if create else "MERGE"
+        q = f"""UNWIND $edges AS edge
+                MATCH (src), (dest)
+                WHERE ID(src) = edge[0] AND ID(dest) = edge[1]
+                {op} (src)-[e:{relation}]->(dest)"""
+
+        params = {'edges': [[src_id, dest_id] for src_id, dest_id in edges]}
+        self._query(q, params)
+
+        if self.backlog is not None:
+            self.backlog.connect(relation, edges)
+
+    def bulk_writer(self, batch_size: Optional[int] = None, create: bool = False) -> "BulkWriter":
+        """
+        Create a buffered writer for bulk ingestion into this graph.
+
+        Args:
+            batch_size (int, optional): Number of buffered records which triggers a flush.
+            create (bool): CREATE-only mode, see BulkWriter.
+
+        Returns:
+            BulkWriter: The writer, use as a context manager to flush on exit.
+        """
+
+        return BulkWriter(self, batch_size, create)
+
     def function_calls_function(self, caller_id: int, callee_id: int, pos: int) -> None:
         """
         Establish a 'CALLS' relationship between two function nodes.
@@ -626,3 +1016,194 @@ class Graph():
 
         return unreachables
 
+
+class BulkWriter():
+    """
+    Buffers files, entities and relationships and writes them to the graph
+    in UNWIND batches.
+
+    Nodes are flushed before relationships, a relationship may therefore
+    refer to a file or entity which is still buffered, its ID is looked up
+    at flush time. Once flushed, the id attribute of every buffered
+    file and entity is set.
+
+    In CREATE-only mode nodes and relationships are written with CREATE
+    rather than MERGE, skipping the lookup MERGE performs. This is only valid
+    when none of the written records exists in the graph, e.g. when analyzing
+    into an empty graph. Duplicates are dropped by the writer before writing,
+    a duplicated file or entity gets the id of the first one added.
+
+    Progress can be tracked through marks, e.g. a file path once all of
+    its records were added, every mark is passed to on_flush once the
+    records added before it are written.
+
+    Usage:
+        with graph.bulk_writer() as writer:
+            writer.add_file(file)
+            writer.add_entity(entity, 'Function', name, doc, path, start, end)
+            writer.connect('DEFINES', file, entity)
+    """
+
+    def __init__(self, graph: Graph, batch_size: Optional[int] = None, create: bool = False) -> None:
+        if batch_size is None:
+            batch_size = int(os.getenv('CODE_GRAPH_BATCH_SIZE', "1000"))
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+
+        self.graph      = graph
+        self.batch_size = batch_size
+        self.create     = create
+
+        # CREATE-only mode dedup state
+        # key -> first object added under that key
+        self.seen_nodes: dict[tuple, object] = {}
+        # duplicated objects, their id is copied from the first object once flushed
+        self.aliases: list[tuple[object, object]] = []
+        self.seen_edges: set[tuple[str, int, int]] = set()
+
+        self.files: list[File] = []
+        self.entities: dict[str, list[tuple[object, dict]]] = {}
+        self.edges: dict[str, list[tuple[object, object]]] = {}
+        self.pending = 0
+
+        # Marks added since the last flush, passed to on_flush once flushed
+        self.marks: list = []
+        self.on_flush: Optional[Callable[[list], None]] = None
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Always flush, records buffered before a failure are still written
+        if exc_type is None:
+            self.flush()
+            return
+
+        # A flush failing while an exception propagates, e.g. as the
+        # connection was lost, must not replace the original exception
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Failed to flush buffered records after {exc_type.__name__}: {e}")
+
+    def add_file(self, file: File) -> None:
+        """
+        Buffer a file node, file.id is set once flushed.
+        """
+
+        if self.create and self._is_duplicate(file, ('File', str(file.path))):
+            return
+
+        self.files.append(file)
+        self._added()
+
+    def add_entity(self, entity, label: str, name: str, doc: Optional[str], path: str,
+                   src_start: int, src_end: int, props: Optional[dict] = None) -> None:
+        """
+        Buffer an entity node, entity.id is set once flushed.
+        """
+
+        record = {
+            'doc': doc,
+            'name': name,
+            'path': path,
+            'src_start': src_start,
+            'src_end': src_end,
+            'props': props or {}
+        }
+
+        if self.create and self._is_duplicate(entity, (label, name, path, src_start, src_end)):
+            return
+
+        self.entities.setdefault(label, []).append((entity, record))
+        self._added()
+
+    def connect(self, relation: str, src, dest) -> None:
+        """
+        Buffer a relationship between src and dest,
+        either a node ID or an object with an id attribute.
+        """
+
+        self.edges.setdefault(relation, []).append((src, dest))
+        self._added()
+
+    def mark(self, item) -> None:
+        """
+        Mark progress, item is passed to on_flush once every record added so far is written.
+        """
+
+        self.marks.append(item)
+
+    def _is_duplicate(self, obj, key: tuple) -> bool:
+        first = self.seen_nodes.get(key)
+        if first is None:
+            self.seen_nodes[key] = obj
+            return False
+
+        if first is not obj:
+            self.aliases.append((obj, first))
+        return True
+
+    def _added(self) -> None:
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    @staticmethod
+    def _id(obj) -> int:
+        return obj if isinstance(obj, int) else obj.id
+
+    def flush(self) -> None:
+        """
+        Write every buffered record to the graph.
+        """
+
+        if self.pending == 0 and len(self.aliases) == 0:
+            self._flushed()
+            return
+
+        files, entities, edges = self.files, self.entities, self.edges
+        self.files, self.entities, self.edges = [], {}, {}
+        self.pending = 0
+
+        logging.debug(f"Flushing {len(files)} files, "
+                      f"{sum(len(v) for v in entities.values())} entities and "
+                      f"{sum(len(v) for v in edges.values())} relationships")
+
+        self.graph.add_files(files, self.create)
+
+        # At most batch_size records are buffered, one query per label / relation
+        for label, records in entities.items():
+            ids = self.graph.add_entities(label, [record for _, record in records], self.create)
+            for (entity, _), id in zip(records, ids):
+                entity.id = id
+
+        # Duplicates share the id of the node written in their place
+        aliases, self.aliases = self.aliases, []
+        for obj, first in aliases:
+            obj.id = first.id
+
+        for relation, pairs in edges.items():
+            pairs = [(self._id(src), self._id(dest)) for src, dest in pairs]
+
+            if self.create:
+                unique = []
+                for src_id, dest_id in pairs:
+                    key = (relation, src_id, dest_id)
+                    if key not in self.seen_edges:
+                        self.seen_edges.add(key)
+                        unique.append((src_id, dest_id))
+                pairs = unique
+
+            self.graph.connect_entities_bulk(relation, pairs, self.create)
+
+        self._flushed()
+
+    def _flushed(self) -> None:
+        if len(self.marks) == 0:
+            return
+
+        marks, self.marks = self.marks, []
+        if self.on_flush is not None:
+            self.on_flush(marks)
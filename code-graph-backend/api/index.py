@@ -1,5 +1,6 @@
 """ Main API module for CodeGraph. """
 import os
+import validators
 from pathlib import Path
 from functools import wraps
 from dotenv import load_dotenv
@@ -10,6 +11,7 @@ from api.git_utils import git_utils
 from api.git_utils.git_graph import GitGraph
 from api.graph import Graph, get_repos, graph_exists
 from api.info import get_repo_info
+from api.jobs import SUCCEEDED, Job, job_queue
 from api.llm import ask
 from api.project import Project
 from .auto_complete import prefix_search
@@ -216,7 +218,8 @@ def repo_info():
     Returns:
         JSON: A response containing the status and graph statistics (node and edge counts).
             - 'status': 'success' if successful, or an error message.
-            - 'info': A dictionary with the node and edge counts if the request is successful.
+            - 'info': A dictionary with the node and edge counts if the request is successful,
+              and the storage cost of the commit history under 'history' once it is processed.
     """
 
     # Get JSON data from the request
@@ -239,6 +242,10 @@ def repo_info():
 
     stats |= info
 
+    # Storage cost of the commit history, if processed
+    if graph_exists(git_utils.GitRepoName(repo)):
+        stats['history'] = GitGraph(git_utils.GitRepoName(repo)).storage()
+
     # Create a response
     response = {
         'status': 'success',
@@ -332,12 +339,17 @@ def chat():
 def analyze_folder():
     """
     Endpoint to analyze local source code
-    Expects 'path' and optionally an ignore list.
+    Expects 'path' and optionally an ignore list, the number of parsing workers
+    and whether to only re-analyze the files changed since the last analysis.
+
+    The analysis runs as a background job unless 'wait' is set,
+    see /jobs/<job_id> for its progress.
 
     Returns:
         JSON response with status and error message if applicable
         Status codes:
-            200: Success
+            200: Success, when waiting for the analysis
+            202: Analysis job queued
             400: Invalid input
             500: Internal server error
     """
@@ -348,6 +360,9 @@ def analyze_folder():
     # Get query parameters
     path      = data.get('path')
     ignore    = data.get('ignore', [])
+    workers   = data.get('workers')
+    incremental = data.get('incremental', False)
+    wait      = data.get('wait', False)
 
     # Validate input parameters
     if not path:
@@ -364,21 +379,54 @@ def analyze_folder():
         logging.error("'ignore' must be a list of paths")
         return jsonify({"status": "'ignore' must be a list of paths"}), 400
 
+    # Validate workers is a positive integer
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        logging.error("'workers' must be a positive integer")
+        return jsonify({"status": "'workers' must be a positive integer"}), 400
+
+    # Validate incremental is a boolean
+    if not isinstance(incremental, bool):
+        logging.error("'incremental' must be a boolean")
+        return jsonify({"status": "'incremental' must be a boolean"}), 400
+
+    # Validate wait is a boolean
+    if not isinstance(wait, bool):
+        logging.error("'wait' must be a boolean")
+        return jsonify({"status": "'wait' must be a boolean"}), 400
+
     proj_name = Path(path).name
 
-    # Initialize the graph with the provided project name
-    g = Graph(proj_name)
+    def analyze(job: Job) -> dict:
+        # Initialize the graph with the provided project name
+        g = Graph(proj_name)
+
+        # Analyze source code within given folder
+        analyzer = SourceAnalyzer(workers=workers, progress=job.report)
+        analyzer.analyze_local_folder(path, g, ignore, incremental)
+
+        return {'project': proj_name}
+
+    # Analyses run one at a time, even when waited for, see JobQueue
+    job = job_queue().submit('analyze_folder', {'path': path, 'incremental': incremental}, analyze)
 
-    # Analyze source code within given folder
-    analyzer = SourceAnalyzer()
-    analyzer.analyze_local_folder(path, g, ignore)
+    if wait:
+        job.wait()
+        if job.state != SUCCEEDED:
+            return jsonify({'status': job.error or f'Analysis {job.state}', 'job_id': job.id}), 500
+
+        # Return response
+        response = {
+                'status': 'success',
+                'project': proj_name
+            }
+        return jsonify(response), 200
 
-    # Return response
     response = {
-            'status': 'success',
-            'project': proj_name
+            'status': 'queued',
+            'project': proj_name,
+            'job_id': job.id
         }
-    return jsonify(response), 200
+    return jsonify(response), 202
 
 @app.route('/analyze_repo', methods=['POST'])
 @public_access  # Apply public access decorator
@@ -390,11 +438,20 @@ def analyze_repo():
     Expected JSON payload:
     {
         "repo_url": "string",
-        "ignore": ["string"]  # optional
+        "ignore": ["string"],  # optional
+        "incremental": false,  # optional, only process new commits
+        "wait": false          # optional, wait for the analysis to complete
     }
 
+    Cloning, analysis and git history processing run as a background
+    job unless 'wait' is set, see /jobs/<job_id> for its progress.
+
+    An incremental analysis pulls new commits into the previous clone,
+    applies the changed files to the graph and appends the new commits
+    to the git graph.
+
     Returns:
-        JSON response with processing status
+        JSON response with processing status, the job id once queued
     """
 
     data = request.get_json()
@@ -404,14 +461,119 @@ def analyze_repo():
     logger.debug('Received repo_url: %s', url)
 
     ignore = data.get('ignore', [])
+    incremental = data.get('incremental', False)
+    wait = data.get('wait', False)
 
-    proj = Project.from_git_repository(url)
-    proj.analyze_sources(ignore)
-    proj.process_git_history(ignore)
+    if not validators.url(url):
+        return jsonify({'status': f'Invalid url {url}'}), 400
+
+    if not isinstance(ignore, list):
+        return jsonify({'status': "'ignore' must be a list of paths"}), 400
+
+    if not isinstance(incremental, bool):
+        return jsonify({'status': "'incremental' must be a boolean"}), 400
+
+    if not isinstance(wait, bool):
+        return jsonify({'status': "'wait' must be a boolean"}), 400
+
+    def analyze(job: Job) -> dict:
+        job.report('cloning', 0, 1)
+
+        proj = Project.from_git_repository(url, update=incremental)
+        proj.analyze_sources(ignore, incremental, progress=job.report)
+        proj.process_git_history(ignore, incremental)
+
+        return {'project': proj.name}
+
+    # Analyses run one at a time, even when waited for, see JobQueue
+    job = job_queue().submit('analyze_repo', {'repo_url': url, 'incremental': incremental}, analyze)
+
+    if wait:
+        job.wait()
+        if job.state != SUCCEEDED:
+            return jsonify({'status': job.error or f'Analysis {job.state}', 'job_id': job.id}), 500
+
+        # Create a response
+        response = {
+            'status': 'success',
+        }
+
+        return jsonify(response), 200
+
+    response = {
+        'status': 'queued',
+        'job_id': job.id
+    }
+
+    return jsonify(response), 202
+
+@app.route('/jobs', methods=['GET'])
+@token_required  # Apply token authentication decorator
+def list_jobs():
+    """
+    Endpoint to list analysis jobs, queued, running and recently completed.
+
+    Returns:
+        JSON response with the status of every job
+    """
+
+    response = {
+        'status': 'success',
+        'jobs': [job.status() for job in job_queue().list()]
+    }
+
+    return jsonify(response), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@token_required  # Apply token authentication decorator
+def job_status(job_id: str):
+    """
+    Endpoint to query an analysis job: its state (queued, running, succeeded,
+    failed or cancelled), current phase, number of processed and total items
+    within the phase, throughput in items per second and ETA in seconds.
+
+    Returns:
+        JSON response with the job's status
+        Status codes:
+            200: Success
+            404: Unknown job
+    """
+
+    job = job_queue().get(job_id)
+    if job is None:
+        return jsonify({'status': f'Unknown job {job_id}'}), 404
+
+    response = {
+        'status': 'success',
+        'job': job.status()
+    }
+
+    return jsonify(response), 200
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+@token_required  # Apply token authentication decorator
+def cancel_job(job_id: str):
+    """
+    Endpoint to cancel an analysis job, a running job stops once the file
+    being processed completes.
+
+    Returns:
+        JSON response with the job's status
+        Status codes:
+            200: Cancellation requested
+            404: Unknown job
+            409: Job already completed
+    """
+
+    cancelled = job_queue().cancel(job_id)
+    if cancelled is None:
+        return jsonify({'status': f'Unknown job {job_id}'}), 404
+    if not cancelled:
+        return jsonify({'status': f'Job {job_id} already completed'}), 409
 
-    # Create a response
     response = {
         'status': 'success',
+        'job': job_queue().get(job_id).status()
     }
 
     return jsonify(response), 200
@@ -1,7 +1,8 @@
-import os
+import json
 import redis
 import logging
 from typing import Optional, Dict
+from .db import get_redis
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -9,21 +10,21 @@ logging.basicConfig(level=logging.INFO)
 def _repo_info_key(repo_name: str) -> str:
     return f"{{{repo_name}}}_info"
 
+def _repo_manifest_key(repo_name: str) -> str:
+    return f"{{{repo_name}}}_manifest"
+
+def _repo_checkpoint_key(repo_name: str, part: str) -> str:
+    return f"{{{repo_name}}}_checkpoint_{part}"
+
 def get_redis_connection() -> redis.Redis:
     """
-    Establishes a connection to Redis using environment variables.
+    Returns a Redis client backed by the process wide connection pool.
 
     Returns:
         redis.Redis: A Redis connection object.
     """
     try:
-        return redis.Redis(
-            host             = os.getenv('FALKORDB_HOST', "localhost"),
-            port             = int(os.getenv('FALKORDB_PORT', "6379")),
-            username         = os.getenv('FALKORDB_USERNAME'),
-            password         = os.getenv('FALKORDB_PASSWORD'),
-            decode_responses = True  # To ensure string responses
-        )
+        return get_redis()
     except Exception as e:
         logging.error(f"Error connecting to Redis: {e}")
         raise
@@ -118,3 +119,180 @@ def get_repo_info(repo_name: str) -> Optional[Dict[str, str]]:
         logging.error(f"Error retrieving repo info for '{repo_name}': {e}")
         raise
 
+def get_repo_manifest(repo_name: str) -> Dict[str, list]:
+    """
+    Retrieves the manifest of the files analyzed for the repository.
+
+    Args:
+        repo_name (str): The name of the repository.
+
+    Returns:
+        Dict[str, list]: Maps a file path to its [size, mtime, hash], empty if missing.
+    """
+
+    try:
+        r = get_redis_connection()
+        key = _repo_manifest_key(repo_name)
+
+        manifest = r.hgetall(key)
+        return {path: json.loads(state) for path, state in manifest.items()}
+
+    except Exception as e:
+        logging.error(f"Error retrieving manifest for '{repo_name}': {e}")
+        raise
+
+def update_repo_manifest(repo_name: str, changed: Dict[str, list], removed: list[str]) -> None:
+    """
+    Updates the manifest of the files analyzed for the repository.
+
+    Args:
+        repo_name (str): The name of the repository.
+        changed (Dict[str, list]): Added or modified entries, file path to [size, mtime, hash].
+        removed (list[str]): Paths of files no longer part of the repository.
+    """
+
+    try:
+        r = get_redis_connection()
+        key = _repo_manifest_key(repo_name)
+
+        pipe = r.pipeline()
+        if len(removed) > 0:
+            pipe.hdel(key, *removed)
+        if len(changed) > 0:
+            pipe.hset(key, mapping={path: json.dumps(state) for path, state in changed.items()})
+        pipe.execute()
+
+        logging.info(f"Manifest of {repo_name} updated, changed: {len(changed)}, removed: {len(removed)}")
+
+    except Exception as e:
+        logging.error(f"Error saving manifest for '{repo_name}': {e}")
+        raise
+
+def set_repo_dependencies(repo_name: str, graphs: list[str]) -> None:
+    """
+    Saves the names of the shared dependency graphs the repository refers to.
+
+    Args:
+        repo_name (str): The name of the repository.
+        graphs (list[str]): Dependency graph names, see dependency_graph_name.
+    """
+
+    try:
+        r = get_redis_connection()
+        key = _repo_info_key(repo_name)
+
+        r.hset(key, 'dependencies', json.dumps(sorted(graphs)))
+        logging.info(f"Repository {repo_name} refers to {len(graphs)} dependency graphs")
+
+    except Exception as e:
+        logging.error(f"Error saving dependencies of '{repo_name}': {e}")
+        raise
+
+def get_repo_dependencies(repo_name: str) -> list[str]:
+    """
+    Retrieves the names of the shared dependency graphs the repository refers to.
+
+    Args:
+        repo_name (str): The name of the repository.
+
+    Returns:
+        list[str]: Dependency graph names, empty if none.
+    """
+
+    try:
+        r = get_redis_connection()
+        key = _repo_info_key(repo_name)
+
+        graphs = r.hget(key, 'dependencies')
+        return json.loads(graphs) if graphs else []
+
+    except Exception as e:
+        logging.error(f"Error retrieving dependencies of '{repo_name}': {e}")
+        raise
+
+def get_repo_checkpoint(repo_name: str) -> Optional[Dict]:
+    """
+    Retrieves the checkpoint of an interrupted analysis of the repository.
+
+    Args:
+        repo_name (str): The name of the repository.
+
+    Returns:
+        Optional[Dict]: The analysis state ('path', 'phase') along with the
+            'written' and 'resolved' file paths, None if no analysis is pending.
+    """
+
+    try:
+        r = get_redis_connection()
+
+        state = r.hgetall(_repo_checkpoint_key(repo_name, 'state'))
+        if not state:
+            return None
+
+        state['written'] = r.smembers(_repo_checkpoint_key(repo_name, 'written'))
+        state['resolved'] = r.smembers(_repo_checkpoint_key(repo_name, 'resolved'))
+        return state
+
+    except Exception as e:
+        logging.error(f"Error retrieving checkpoint of '{repo_name}': {e}")
+        raise
+
+def set_repo_checkpoint(repo_name: str, state: Dict[str, str], reset: bool = False) -> None:
+    """
+    Saves the state of the repository's ongoing analysis.
+
+    Args:
+        repo_name (str): The name of the repository.
+        state (Dict[str, str]): Analysis state fields, e.g. 'phase'.
+        reset (bool): Start a new checkpoint, dropping the recorded files.
+    """
+
+    try:
+        r = get_redis_connection()
+
+        pipe = r.pipeline()
+        if reset:
+            pipe.delete(*[_repo_checkpoint_key(repo_name, part) for part in ['state', 'written', 'resolved']])
+        pipe.hset(_repo_checkpoint_key(repo_name, 'state'), mapping=state)
+        pipe.execute()
+
+    except Exception as e:
+        logging.error(f"Error saving checkpoint of '{repo_name}': {e}")
+        raise
+
+def add_repo_checkpoint_files(repo_name: str, part: str, paths: list[str]) -> None:
+    """
+    Records files whose analysis output is persisted in the graph.
+
+    Args:
+        repo_name (str): The name of the repository.
+        part (str): 'written' for first pass output, 'resolved' for second pass output.
+        paths (list[str]): The files.
+    """
+
+    if len(paths) == 0:
+        return
+
+    try:
+        r = get_redis_connection()
+        r.sadd(_repo_checkpoint_key(repo_name, part), *paths)
+
+    except Exception as e:
+        logging.error(f"Error saving checkpoint of '{repo_name}': {e}")
+        raise
+
+def delete_repo_checkpoint(repo_name: str) -> None:
+    """
+    Drops the checkpoint of the repository, once its analysis completed.
+
+    Args:
+        repo_name (str): The name of the repository.
+    """
+
+    try:
+        r = get_redis_connection()
+        r.delete(*[_repo_checkpoint_key(repo_name, part) for part in ['state', 'written', 'resolved']])
+
+    except Exception as e:
+        logging.error(f"Error deleting checkpoint of '{repo_name}': {e}")
+        raise
@@ -0,0 +1,236 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger('code_graph')
+
+# Job states
+QUEUED    = "queued"
+RUNNING   = "running"
+SUCCEEDED = "succeeded"
+FAILED    = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATES = [SUCCEEDED, FAILED, CANCELLED]
+
+class JobCancelled(Exception):
+    """ Raised within a job once it is cancelled """
+
+class Job:
+    """
+    A background analysis job.
+
+    The job's function is invoked with the job itself, it reports progress
+    through report and is cancelled cooperatively: once cancel is called
+    the next report raises JobCancelled.
+    """
+
+    def __init__(self, kind: str, params: dict, fn: Callable[['Job'], Any]) -> None:
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.fn = fn
+
+        self.state = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+        # Current phase, e.g. first_pass, and its progress
+        self.phase: Optional[str] = None
+        self.phase_started: Optional[float] = None
+        self.done = 0
+        self.total = 0
+
+        self.cancelled = threading.Event()
+        self.completed = threading.Event()
+        self.lock = threading.Lock()
+
+    def report(self, phase: str, done: int, total: int) -> None:
+        """
+        Report progress, raises JobCancelled if the job was cancelled.
+
+        Args:
+            phase (str): The current phase.
+            done (int): Number of items processed within the phase.
+            total (int): Number of items to process within the phase.
+        """
+
+        if self.cancelled.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+        with self.lock:
+            if phase != self.phase:
+                logger.info(f"Job {self.id} entering phase {phase}")
+                self.phase = phase
+                self.phase_started = time.time()
+            self.done = done
+            self.total = total
+
+    def cancel(self) -> bool:
+        """
+        Request cancellation, a queued job is cancelled right away.
+
+        Returns:
+            bool: False if the job already completed.
+        """
+
+        with self.lock:
+            if self.state in FINAL_STATES:
+                return False
+            self.cancelled.set()
+            if self.state == QUEUED:
+                self.state = CANCELLED
+                self.finished = time.time()
+                self.completed.set()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the job to complete.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait.
+
+        Returns:
+            bool: False if the job did not complete within timeout.
+        """
+
+        return self.completed.wait(timeout)
+
+    def run(self) -> None:
+        with self.lock:
+            if self.state != QUEUED:
+                return
+            self.state = RUNNING
+            self.started = time.time()
+
+        try:
+            result = self.fn(self)
+        except JobCancelled:
+            logger.info(f"Job {self.id} cancelled")
+            state, result, error = CANCELLED, None, None
+        except Exception as e:
+            logger.exception(f"Job {self.id} failed")
+            state, result, error = FAILED, None, str(e)
+        else:
+            state, error = SUCCEEDED, None
+
+        with self.lock:
+            self.state = state
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            self.completed.set()
+
+    def status(self) -> dict:
+        """
+        The job's state and progress, throughput is in items per second
+        within the current phase and eta in seconds.
+        """
+
+        with self.lock:
+            now = time.time()
+            elapsed = now - self.phase_started if self.phase_started is not None else 0
+            throughput = self.done / elapsed if self.state == RUNNING and elapsed > 0 else None
+            eta = (self.total - self.done) / throughput if throughput else None
+
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'params': self.params,
+                'state': self.state,
+                'phase': self.phase,
+                'done': self.done,
+                'total': self.total,
+                'throughput': throughput,
+                'eta': eta,
+                'submitted': self.submitted,
+                'started': self.started,
+                'finished': self.finished,
+                'result': self.result,
+                'error': self.error,
+            }
+
+class JobQueue:
+    """
+    Runs analysis jobs one at a time on a background thread, jobs are kept
+    in memory, the most recent completed ones are retained for status queries.
+
+    Analyses share the process wide analyzers, which hold per analysis
+    state, e.g. the project's root or symbol index, every analysis, waited
+    for or not, therefore runs through the queue.
+    """
+
+    def __init__(self, history: int = 100) -> None:
+        """
+        Args:
+            history (int): Number of completed jobs retained.
+        """
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='code_graph_job')
+        self.history = history
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind: str, params: dict, fn: Callable[[Job], Any]) -> Job:
+        """
+        Queue a job.
+
+        Args:
+            kind (str): The job kind, e.g. analyze_folder.
+            params (dict): The job parameters, reported by status.
+            fn (Callable): The job function, invoked with the job.
+
+        Returns:
+            Job: The queued job.
+        """
+
+        job = Job(kind, params, fn)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._trim()
+        self.executor.submit(job.run)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def _trim(self) -> None:
+        completed = [job_id for job_id, job in self.jobs.items() if job.state in FINAL_STATES]
+        for job_id in completed[:max(0, len(completed) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[bool]:
+        """
+        Cancel a job.
+
+        Returns:
+            Optional[bool]: None if the job is unknown, False if it already completed.
+        """
+
+        job = self.get(job_id)
+        return job.cancel() if job is not None else None
+
+# Shared by every request of the process, created on first use
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def job_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
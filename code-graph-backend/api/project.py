@@ -1,4 +1,3 @@
-import os
 import shutil
 import logging
 import validators
@@ -8,17 +7,29 @@ from .info import *
 from shlex import quote
 from pathlib import Path
 from .graph import Graph
-from typing import Optional, List
+from typing import Callable, Optional, List
 from urllib.parse import urlparse
 from .analyzers import SourceAnalyzer
-from .git_utils import build_commit_graph, GitGraph
+from .git_utils import build_commit_graph, switch_commit, GitGraph, GitRepoName
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def _clone_source(url: str, name: str) -> Path:
+def _clone_source(url: str, name: str, update: bool = False) -> Path:
     # path to local repositories
     path = Path.cwd() / "repositories" / name
+
+    # Pull new commits into a previous clone
+    if update and (path / ".git").exists():
+        logging.info(f"Pulling repository at: {path}")
+        cmd = ["git", "-C", str(path), "pull", "--ff-only"]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            return path
+        except subprocess.CalledProcessError as e:
+            # e.g. the history was rewritten
+            logging.warning(f"Failed to pull {url}, cloning again: {e.stderr}")
+
     print(f"Cloning repository to: {path}")
 
     # Delete local repository if exists
@@ -48,7 +59,7 @@ class Project():
             save_repo_info(name, url)
 
     @classmethod
-    def from_git_repository(cls, url: str):
+    def from_git_repository(cls, url: str, update: bool = False):
         # Validate url
         if not validators.url(url):
             raise Exception(f"invalid url: {url}")
@@ -56,7 +67,7 @@ class Project():
         # Extract project name from URL
         parsed_url = urlparse(url)
         name = parsed_url.path.split('/')[-1]
-        path = _clone_source(url, name)
+        path = _clone_source(url, name, update)
 
         return cls(name, path, url)
 
@@ -77,11 +88,20 @@ class Project():
 
         return cls(name, path, url)
 
-    def analyze_sources(self, ignore: Optional[List[str]] = None) -> Graph:
+    def analyze_sources(self, ignore: Optional[List[str]] = None, incremental: bool = False,
+                        progress: Optional[Callable[[str, int, int], None]] = None) -> Graph:
         if ignore is None:
             ignore = []
-        self.analyzer = SourceAnalyzer()
-        self.analyzer.analyze_local_folder(self.path, self.graph, ignore)
+
+        # Changes are applied on top of the last analyzed commit,
+        # the graph may have been switched to another commit since
+        if incremental:
+            head = GitGraph(GitRepoName(self.name)).get_head_commit()
+            if head is not None and get_repo_commit(self.name) not in [None, head['hash']]:
+                switch_commit(self.name, head['hash'])
+
+        self.analyzer = SourceAnalyzer(progress=progress)
+        self.analyzer.analyze_local_folder(self.path, self.graph, ignore, incremental)
 
         try:
             # Save processed commit hash to the DB
@@ -94,20 +114,17 @@ class Project():
 
         return self.graph
 
-    def process_git_history(self, ignore: Optional[List[str]] = []) -> GitGraph:
-        logging.info(f"processing {self.name} git commit history")
-
-        # Save original working directory for later restore
-        original_dir = Path.cwd()
+    def process_git_history(self, ignore: Optional[List[str]] = [], incremental: bool = False) -> GitGraph:
+        """
+        Build the project's git graph.
 
-        # change working directory to local repository
-        logging.info(f"Switching current working directory to: {self.path}")
-        os.chdir(self.path)
+        Args:
+            ignore (List[str], optional): List of paths to skip
+            incremental (bool): Only process commits missing from the git graph
+        """
 
-        git_graph = build_commit_graph(self.path, self.analyzer, self.name, ignore)
-
-        # Restore original working directory
-        logging.info(f"Restoring current working directory to: {original_dir}")
-        os.chdir(original_dir)
+        logging.info(f"processing {self.name} git commit history")
 
-        return git_graph
+        # Commits are read from the object database, the
+        # repository's working directory is left untouched
+        return build_commit_graph(self.path, self.analyzer, self.name, ignore, incremental)
@@ -0,0 +1,32 @@
+import unittest
+
+from api.graph import BulkWriter
+from tests.test_checkpoint import Node, StubGraph
+
+
+class Test_Bulk_Writer(unittest.TestCase):
+    def test_flush_on_exit(self):
+        graph = StubGraph()
+        with BulkWriter(graph, batch_size=10) as writer:
+            writer.add_file(Node('a.py'))
+        self.assertEqual(graph.writes, 1)
+
+    def test_flush_failure_keeps_exception(self):
+        # The exception raised within the block propagates, not the flush's
+        graph = StubGraph(fail_after=0)
+        with self.assertLogs(level='ERROR'):
+            with self.assertRaises(KeyError):
+                with BulkWriter(graph, batch_size=10) as writer:
+                    writer.add_file(Node('a.py'))
+                    raise KeyError('a.py')
+
+        # Records buffered before a failure are still written
+        graph = StubGraph()
+        with self.assertRaises(KeyError):
+            with BulkWriter(graph, batch_size=10) as writer:
+                writer.add_file(Node('a.py'))
+                raise KeyError('a.py')
+        self.assertEqual(graph.writes, 1)
+
+if __name__ == '__main__':
+    unittest.main()
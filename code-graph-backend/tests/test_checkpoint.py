@@ -0,0 +1,101 @@
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from api.graph import BulkWriter
+from api.info import get_repo_checkpoint
+from api.analyzers.checkpoint import Checkpoint
+
+
+class StubGraph:
+    """ Assigns ids, fails once fail_after writes were issued """
+
+    def __init__(self, fail_after: int = -1):
+        self.writes = 0
+        self.next_id = 0
+        self.fail_after = fail_after
+
+    def _write(self, count: int) -> list[int]:
+        if self.writes == self.fail_after:
+            raise RuntimeError('crash')
+        self.writes += 1
+        ids = list(range(self.next_id, self.next_id + count))
+        self.next_id += count
+        return ids
+
+    def add_files(self, files, create=False):
+        for file, id in zip(files, self._write(len(files))):
+            file.id = id
+
+    def add_entities(self, label, entities, create=False):
+        return self._write(len(entities))
+
+    def connect_entities_bulk(self, relation, edges, create=False):
+        self._write(len(edges))
+
+
+class Node:
+    def __init__(self, path):
+        self.path = path
+
+
+class Test_Checkpoint(unittest.TestCase):
+    def setUp(self):
+        self.repo = 'test_checkpoint'
+        self.path = Path('/project')
+        Checkpoint(self.repo).complete()
+
+    def tearDown(self):
+        Checkpoint(self.repo).complete()
+
+    def test_marks(self):
+        checkpoint = Checkpoint(self.repo)
+        self.assertFalse(checkpoint.begin(self.path))
+
+        # Files are recorded once flushed, a.py and b.py by the first flush
+        graph = StubGraph(fail_after=1)
+        with self.assertRaises(RuntimeError):
+            with BulkWriter(graph, batch_size=3) as writer:
+                writer.on_flush = checkpoint.on_written
+                for name in ['a.py', 'b.py', 'c.py', 'd.py']:
+                    writer.add_file(Node(name))
+                    writer.mark(name)
+
+        self.assertEqual(checkpoint.written, {'a.py', 'b.py'})
+
+        # A later analysis of the same folder resumes
+        resumed = Checkpoint(self.repo)
+        with patch.object(Checkpoint, 'has_shadow', return_value=True):
+            self.assertTrue(resumed.begin(self.path))
+        self.assertTrue(resumed.is_written(Path('a.py')))
+        self.assertFalse(resumed.is_written(Path('c.py')))
+        self.assertEqual((resumed.phase, resumed.written), ('first_pass', {'a.py', 'b.py'}))
+
+        resumed.enter('second_pass')
+        with BulkWriter(StubGraph(), batch_size=10) as writer:
+            writer.on_flush = resumed.on_resolved
+            writer.mark('a.py')
+        self.assertTrue(resumed.is_resolved('a.py'))
+        self.assertFalse(resumed.is_resolved('b.py'))
+        self.assertEqual(get_repo_checkpoint(self.repo)['phase'], 'second_pass')
+
+        # Completed analyses are not resumed, nor analyses of another folder
+        resumed.complete()
+        self.assertIsNone(get_repo_checkpoint(self.repo))
+        self.assertFalse(Checkpoint(self.repo).begin(Path('/other')))
+        self.assertFalse(Checkpoint(self.repo).begin(self.path))
+
+    def test_missing_shadow(self):
+        checkpoint = Checkpoint(self.repo)
+        self.assertFalse(checkpoint.begin(self.path))
+        checkpoint.on_written(['a.py'])
+
+        # The records written before the interruption are gone, start over
+        with patch.object(Checkpoint, 'has_shadow', return_value=False):
+            resumed = Checkpoint(self.repo)
+            self.assertFalse(resumed.begin(self.path))
+        self.assertEqual(resumed.written, set())
+        self.assertEqual(get_repo_checkpoint(self.repo)['written'], set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pygit2 import Signature, init_repository
+
+from api import SourceAnalyzer
+from api.analyzers.cache import ExtractionCache, blob_id
+from api.analyzers.source_analyzer import analyzers
+from api.analyzers.walker import PathIgnore
+from api.git_utils.git_utils import CommitSources, ScratchWorktree, classify_changes, commit_ignore
+from tests.test_parallel_first_pass import RecordingWriter
+
+
+class Test_Commit_Sources(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.repo = init_repository(self.tmp.name)
+        self.first = self.commit({'pkg/a.py': 'def f(): pass\n', 'b.py': 'x = 1\n'})
+        self.second = self.commit({'pkg/a.py': 'def g(): pass\n', 'c.py': 'y = 2\n'})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def commit(self, files: dict):
+        for name, content in files.items():
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+            self.repo.index.add(name)
+        self.repo.index.write()
+        tree = self.repo.index.write_tree()
+        signature = Signature('test', 'test@example.com')
+        parents = [] if self.repo.head_is_unborn else [self.repo.head.target]
+        oid = self.repo.create_commit('HEAD', signature, signature, 'commit', tree, parents)
+        return self.repo[oid]
+
+    def test_read(self):
+        # The working directory is never read
+        (self.root / 'pkg' / 'a.py').write_text('dirty\n')
+
+        sources = CommitSources(self.repo, self.first)
+        self.assertEqual(sources[self.root / 'pkg' / 'a.py'], b'def f(): pass\n')
+        self.assertNotIn(self.root / 'c.py', sources)
+        self.assertNotIn(self.root / 'pkg', sources)
+        self.assertNotIn(Path('/elsewhere/b.py'), sources)
+        self.assertEqual(sorted(sources), [self.root / 'b.py', self.root / 'pkg' / 'a.py'])
+
+        self.assertEqual(CommitSources(self.repo, self.second)[self.root / 'pkg' / 'a.py'], b'def g(): pass\n')
+
+    def test_checkout(self):
+        (self.root / 'pkg' / 'a.py').write_text('dirty\n')
+        index = (self.root / '.git' / 'index').read_bytes()
+
+        with tempfile.TemporaryDirectory() as directory:
+            CommitSources(self.repo, self.first).checkout(Path(directory))
+            self.assertEqual((Path(directory) / 'pkg' / 'a.py').read_text(), 'def f(): pass\n')
+            self.assertEqual((Path(directory) / 'b.py').read_text(), 'x = 1\n')
+            self.assertFalse((Path(directory) / 'c.py').exists())
+
+        # The working directory and index are left untouched
+        self.assertEqual((self.root / 'pkg' / 'a.py').read_text(), 'dirty\n')
+        self.assertEqual((self.root / '.git' / 'index').read_bytes(), index)
+
+    def test_scratch_worktree(self):
+        worktree = ScratchWorktree(self.repo, self.second)
+        try:
+            # Moving back writes the changed files and removes the added ones
+            worktree.apply(self.repo.diff(self.second, self.first))
+            self.assertEqual((worktree.path / 'pkg' / 'a.py').read_text(), 'def f(): pass\n')
+            self.assertFalse((worktree.path / 'c.py').exists())
+
+            worktree.apply(self.repo.diff(self.first, self.second))
+            self.assertEqual((worktree.path / 'pkg' / 'a.py').read_text(), 'def g(): pass\n')
+            self.assertEqual((worktree.path / 'c.py').read_text(), 'y = 2\n')
+            self.assertEqual((worktree.path / 'b.py').read_text(), 'x = 1\n')
+        finally:
+            worktree.cleanup()
+        self.assertFalse(worktree.path.exists())
+
+    def test_changed_blobs(self):
+        blobs = {}
+        diff = self.repo.diff(self.second, self.first)
+        added, deleted, modified = classify_changes(diff, self.repo, ['.py'], PathIgnore(), PathIgnore(), blobs)
+
+        self.assertEqual((added, deleted, modified), ([], [self.root / 'c.py'], [self.root / 'pkg' / 'a.py']))
+        self.assertEqual(blobs, {self.root / 'pkg' / 'a.py': self.first.tree['pkg/a.py'].id})
+
+    def test_ignored_changes(self):
+        third = self.commit({'.gitignore': 'pkg/\n', 'pkg/a.py': 'def h(): pass\n', 'venv/lib.py': 'z = 3\n', 'build/out.py': 'w = 4\n'})
+
+        # Ignored by the analysis ignore list, the default ignore list and the commit's .gitignore
+        diff = self.repo.diff(self.second, third)
+        changes = classify_changes(diff, self.repo, ['.py'], commit_ignore(self.second, ['./build']),
+                                   commit_ignore(third, ['./build']))
+        self.assertEqual(changes, ([], [self.root / 'pkg' / 'a.py'], []))
+
+        # Going back, pkg/a.py is no longer ignored
+        diff = self.repo.diff(third, self.second)
+        changes = classify_changes(diff, self.repo, ['.py'], commit_ignore(third, ['./build']),
+                                   commit_ignore(self.second, ['./build']))
+        self.assertEqual(changes, ([self.root / 'pkg' / 'a.py'], [], []))
+
+    def test_blob_cache(self):
+        # Blobs are extracted once, a file restored by a later commit is served from the cache
+        cache = ExtractionCache(self.root / '.cache' / 'extraction.sqlite')
+        analyzer = SourceAnalyzer(cache=cache)
+        file_path = self.root / 'pkg' / 'a.py'
+        for commit in [self.first, self.second, self.first]:
+            analyzers['.py'].sources = CommitSources(self.repo, commit)
+            try:
+                analyzer.first_pass_file(file_path, RecordingWriter())
+            finally:
+                analyzers['.py'].sources = None
+
+        self.assertEqual((cache.misses, cache.hits), (2, 1))
+        self.assertEqual(blob_id(b'def f(): pass\n'), str(self.first.tree['pkg/a.py'].id))
+        cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
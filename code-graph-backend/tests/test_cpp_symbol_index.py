@@ -0,0 +1,72 @@
+import unittest
+from pathlib import Path
+
+from api import SourceAnalyzer
+from api.entities.file import File
+from api.analyzers.source_analyzer import analyzers
+from api.analyzers.c.symbol_index import SymbolIndex
+from tests.test_parallel_first_pass import RecordingWriter
+
+HEADER = b'''
+namespace geo {
+class Shape {
+public:
+    void scale(double f);
+    void scale(double fx, double fy);
+};
+class Circle : public Shape {};
+double helper(int x);
+}
+int helper(int x, int y);
+'''
+
+SOURCE = b'''
+namespace geo {
+void Shape::scale(double f) { scale(f, f); }
+void Shape::scale(double fx, double fy) {}
+double helper(int x) { return x; }
+}
+int helper(int x, int y) { return x + y; }
+void run() { geo::Circle c; c.scale(2); geo::helper(3); helper(1, 2); }
+'''
+
+
+class Test_Cpp_Symbol_Index(unittest.TestCase):
+    def setUp(self):
+        analyzer = analyzers['.cpp']
+        writer = RecordingWriter()
+
+        self.files = {}
+        for path, source in [(Path('shapes.h'), HEADER), (Path('shapes.cpp'), SOURCE)]:
+            file = File(path, analyzer.parser.parse(source))
+            writer.add_file(file)
+            SourceAnalyzer(cache=False).create_hierarchy(file, analyzer, writer, False)
+            self.files[path] = file
+
+        self.index = SymbolIndex().build(self.files)
+
+    def entity(self, path: str, row: int):
+        file = self.files[Path(path)]
+        return next(e for node, e in file.entities.items() if node.start_point.row == row and node.type == 'function_definition')
+
+    def calls(self, path: str, row: int) -> dict[str, list[int]]:
+        entity = self.entity(path, row)
+        return {symbol.text.decode('utf-8'): [e.node.start_point.row for e in self.index.lookup('function', symbol, Path(path))]
+                for symbol in entity.symbols['call']}
+
+    def test_overloads(self):
+        # Overloads are told apart by the number of arguments
+        self.assertEqual(self.calls('shapes.cpp', 2), {'scale': [3]})
+
+    def test_qualified_and_member_calls(self):
+        self.assertEqual(self.calls('shapes.cpp', 7), {'scale': [2], 'geo::helper': [4], 'helper': [6]})
+
+    def test_base_class(self):
+        circle = next(e for node, e in self.files[Path('shapes.h')].entities.items()
+                      if node.type == 'class_specifier' and node.child_by_field_name('name').text == b'Circle')
+        base = circle.symbols['base_class'][0]
+        resolved = self.index.lookup('type', base, Path('shapes.h'))
+        self.assertEqual([e.node.child_by_field_name('name').text for e in resolved], [b'Shape'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import threading
+import unittest
+from unittest.mock import patch
+from api.db import get_db, get_redis, select_graph, forget_graph, reset
+from api import Graph, GitGraph
+
+
+class TestDB(unittest.TestCase):
+    def setUp(self):
+        reset()
+
+    def test_shared_client(self):
+        # Every helper should share the same client and connection pool
+        self.assertIs(get_db(), get_db())
+        self.assertIs(get_redis().connection_pool, get_db().connection.connection_pool)
+
+    def test_graph_handle_cache(self):
+        a = Graph('test_db')
+        b = Graph('test_db')
+
+        self.assertIs(a.g, b.g)
+        self.assertIs(a.g, select_graph('test_db'))
+
+        # A forgotten handle is re-selected
+        forget_graph('test_db')
+        self.assertIsNot(a.g, Graph('test_db').g)
+
+    def test_git_graph_handle_cache(self):
+        self.assertIs(GitGraph('test_db_git').g, GitGraph('test_db_git').g)
+
+    def test_init_invoked_once(self):
+        calls = []
+        select_graph('test_db_init', calls.append)
+        select_graph('test_db_init', calls.append)
+
+        self.assertEqual(len(calls), 1)
+
+    def test_init_outside_global_lock(self):
+        class FakeDB:
+            def select_graph(self, name):
+                return object()
+
+        started, release = threading.Event(), threading.Event()
+
+        def slow_init(g):
+            started.set()
+            release.wait(5)
+
+        with patch('api.db.get_db', FakeDB), patch('api.db._db', None):
+            thread = threading.Thread(target=select_graph, args=('test_db_slow', slow_init))
+            thread.start()
+            self.assertTrue(started.wait(5))
+
+            # Other graphs are served while the first is being initialized
+            done = threading.Event()
+            threading.Thread(target=lambda: (select_graph('test_db_other'), forget_graph('test_db_other'), done.set())).start()
+            self.assertTrue(done.wait(5))
+
+            release.set()
+            thread.join()
+
+    def test_reconnect_after_reset(self):
+        db = get_db()
+        reset()
+
+        self.assertIsNot(db, get_db())
+        self.assertTrue(get_redis().ping())
+
+if __name__ == '__main__':
+    unittest.main()
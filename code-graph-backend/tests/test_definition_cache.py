@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from api.analyzers.cache import DefinitionCache
+from api.analyzers.source_analyzer import analyzers
+
+
+class FakeSources(dict):
+    """ In-memory sources whose blob ids are known """
+
+    def __init__(self, blobs):
+        super().__init__()
+        self.blobs = blobs
+
+    def oid(self, file_path):
+        return self.blobs.get(file_path)
+
+
+class Test_Definition_Cache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.cache = DefinitionCache(self.root / 'definitions.sqlite')
+
+        self.caller = self.root / 'caller.py'
+        self.caller.write_text('from target import f\nf()\n')
+        self.target = self.root / 'target.py'
+        self.target.write_text('def f():\n    pass\n')
+
+        self.location = {'absolutePath': str(self.target),
+                         'range': {'start': {'line': 0, 'character': 4}, 'end': {'line': 0, 'character': 5}}}
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def touch(self, path: Path, content: str):
+        # Make sure the change is detected regardless of mtime resolution
+        path.write_text(content)
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_hit(self):
+        key = self.cache.key(self.caller, 1, 0, analyzers['.py'])
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, [self.location], [str(self.target)])
+        self.assertEqual(self.cache.get(key), [self.location])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_caller_changed(self):
+        key = self.cache.key(self.caller, 1, 0, analyzers['.py'])
+        self.cache.put(key, [self.location], [str(self.target)])
+
+        self.touch(self.caller, 'from target import f\nf(1)\n')
+        self.assertNotEqual(self.cache.key(self.caller, 1, 0, analyzers['.py']), key)
+
+    def test_target_changed(self):
+        key = self.cache.key(self.caller, 1, 0, analyzers['.py'])
+        self.cache.put(key, [self.location], [str(self.target)])
+
+        self.touch(self.target, 'def g():\n    pass\n')
+        self.assertIsNone(self.cache.get(key))
+
+    def test_commit_sources(self):
+        # Files read from a commit are identified by their blob id, not by the file on disk
+        analyzer = analyzers['.py']
+        blobs = {self.caller: 'caller-blob', self.target: 'target-blob'}
+        analyzer.sources = FakeSources(blobs)
+        try:
+            key = self.cache.key(self.caller, 1, 0, analyzer)
+            self.assertIn(':caller-blob:', key)
+            self.cache.put(key, [self.location], [str(self.target)], analyzer)
+
+            self.touch(self.target, 'def g():\n    pass\n')
+            self.assertEqual(self.cache.get(key, analyzer), [self.location])
+
+            blobs[self.target] = 'other-blob'
+            self.assertIsNone(self.cache.get(key, analyzer))
+        finally:
+            analyzer.sources = None
+
+        # The working directory holds other contents
+        self.assertNotEqual(self.cache.key(self.caller, 1, 0, analyzer), key)
+
+    def test_empty_lookup_not_cached(self):
+        key = self.cache.key(self.caller, 1, 0, analyzers['.py'])
+        self.cache.put(key, [], [])
+        self.assertIsNone(self.cache.get(key))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from api.delta import Delta, node_key
+
+
+class Test_Delta(unittest.TestCase):
+    def record(self) -> Delta:
+        delta = Delta()
+        delta.delete_files(['/src/old.py'])
+        delta.add_files(['/src/a.py'], [10])
+        delta.add_entities('Function', [{'name': 'f', 'path': '/src/a.py', 'src_start': 1, 'src_end': 2,
+                                         'doc': None, 'props': {}}], [11])
+        delta.connect('DEFINES', [(10, 11)])
+        delta.connect('CALLS', [(11, 42), (11, 99)])
+        return delta
+
+    def test_resolve(self):
+        delta = self.record()
+
+        # Ends which were not recorded are looked up, unknown ones dropped
+        lookups = []
+        def lookup(ids):
+            lookups.append(ids)
+            return {42: node_key('Function', '/src/b.py', 'g', 5, 9)}
+
+        delta.resolve(lookup)
+        self.assertEqual(lookups, [[42, 99]])
+        self.assertEqual(delta.edges, {
+            'DEFINES:File:Function': [[['/src/a.py'], ['/src/a.py', 'f', 1, 2]]],
+            'CALLS:Function:Function': [[['/src/a.py', 'f', 1, 2], ['/src/b.py', 'g', 5, 9]]],
+        })
+        self.assertEqual(len(delta), 5)
+
+    def test_encode(self):
+        delta = self.record()
+        delta.resolve(lambda ids: {})
+
+        for size in [1, 100]:
+            delta.files = [f'/src/{i}.py' for i in range(size)]
+            encoded = delta.encode()
+
+            # Large deltas are compressed
+            self.assertEqual(encoded[0], 'z' if size > 1 else 'j')
+            decoded = Delta.decode(encoded)
+            self.assertEqual((decoded.deleted, decoded.files, decoded.entities, decoded.edges),
+                             (delta.deleted, delta.files, delta.entities, delta.edges))
+
+        with self.assertRaises(ValueError):
+            Delta.decode('j{"version": 0}')
+
+if __name__ == '__main__':
+    unittest.main()
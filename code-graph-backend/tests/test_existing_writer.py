@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from api import SourceAnalyzer
+from api.analyzers.source_analyzer import ExistingWriter
+from tests.test_parallel_first_pass import RecordingWriter
+
+
+class StubGraph:
+    """ Graph stand-in, holds the nodes recorded by a writer """
+
+    name = 'test_existing'
+
+    def __init__(self, log):
+        self.ids = {}
+        for id, entry in enumerate(log):
+            if entry[0] == 'File':
+                self.ids[entry] = 100 + id
+            elif len(entry) == 6:
+                label, name, doc, path, src_start, src_end = entry
+                self.ids[(label, path, name, src_start, src_end)] = 100 + id
+        self.lookups = []
+
+    def get_node_ids(self, files):
+        self.lookups.append(files)
+        return self.ids
+
+
+class Test_Existing_Writer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.a = self.root / 'a.py'
+        self.a.write_text('class A:\n    def f(self):\n        pass\n')
+        self.b = self.root / 'b.py'
+        self.b.write_text('def g():\n    pass\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ids_from_graph(self):
+        # The graph as written by a previous analysis of a.py
+        previous = RecordingWriter()
+        SourceAnalyzer(cache=False).first_pass_file(self.a, previous)
+        graph = StubGraph(previous.log)
+
+        analyzer = SourceAnalyzer(cache=False)
+        writer = RecordingWriter()
+        existing = ExistingWriter(graph, lambda file_path: True, writer, batch_size=1)
+        for file_path in [self.a, self.b]:
+            analyzer.first_pass_file(file_path, existing)
+        existing.flush()
+
+        # a.py is loaded from the graph, nothing is written
+        file = analyzer.files[self.a]
+        self.assertEqual(file.id, graph.ids[('File', str(self.a))])
+        self.assertEqual(sorted(e.id for e in file.entities.values()),
+                         sorted(id for key, id in graph.ids.items() if key[0] != 'File'))
+        self.assertEqual(existing.loaded, {self.a})
+        self.assertEqual(graph.lookups, [[self.a], [self.b]])
+
+        # b.py is missing from the graph, it is written
+        self.assertEqual(writer.log[0], ('File', str(self.b)))
+        self.assertEqual([entry[0] for entry in writer.log], ['File', 'Function', 'DEFINES'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from api import SourceAnalyzer
+from api.analyzers.cache import ExtractionCache, blob_id
+from api.analyzers.source_analyzer import analyzers
+from tests.test_parallel_first_pass import RecordingWriter
+
+
+class Test_Extraction_Cache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = sorted((Path(__file__).parent.parent / 'api').rglob('*.py'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def analyze(self, workers: int = 1) -> tuple[RecordingWriter, ExtractionCache]:
+        cache = ExtractionCache(Path(self.tmp.name) / 'extraction.sqlite')
+        analyzer = SourceAnalyzer(workers=workers, cache=cache)
+        writer = RecordingWriter()
+
+        if workers > 1:
+            analyzer.parallel_first_pass(self.files, writer)
+        else:
+            for file_path in self.files:
+                analyzer.first_pass_file(file_path, writer)
+
+        cache.close()
+        return writer, cache
+
+    def test_unchanged_files_are_cached(self):
+        cold_writer, cold = self.analyze()
+        self.assertEqual(cold.hits, 0)
+        self.assertEqual(cold.misses, len(self.files))
+
+        # Second run is served entirely from the cache
+        warm_writer, warm = self.analyze()
+        self.assertEqual(warm.hits, len(self.files))
+        self.assertEqual(warm.misses, 0)
+        self.assertEqual(cold_writer.log, warm_writer.log)
+
+    def test_parallel_shares_cache(self):
+        serial_writer, _ = self.analyze()
+        parallel_writer, cache = self.analyze(workers=2)
+
+        self.assertEqual(cache.hits, len(self.files))
+        self.assertEqual(serial_writer.log, parallel_writer.log)
+
+    def test_key(self):
+        py = analyzers['.py']
+        self.assertEqual(ExtractionCache.key(b'x = 1', py, False), ExtractionCache.key(b'x = 1', py, False))
+        self.assertNotEqual(ExtractionCache.key(b'x = 1', py, False), ExtractionCache.key(b'x = 2', py, False))
+        self.assertNotEqual(ExtractionCache.key(b'x = 1', py, False), ExtractionCache.key(b'x = 1', py, True))
+
+        # Contents are identified by their git blob id
+        self.assertEqual(blob_id(b''), 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391')
+        self.assertEqual(ExtractionCache.key(b'', py, False), ExtractionCache.key(b'x = 1', py, False, oid=blob_id(b'')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 from falkordb import FalkorDB
 from typing import List, Optional
 from api import *
+from api.delta import Delta
+from pathlib import Path
 
 
 class TestGraphOps(unittest.TestCase):
@@ -58,5 +60,166 @@ class TestGraphOps(unittest.TestCase):
         res = self.g.query(query, params).result_set
         self.assertTrue(res[0][0])
 
+    def test_bulk_writer(self):
+        class Record:
+            pass
+
+        file   = File(Path('/path/to/bulk.py'), None)
+        caller = Record()
+        callee = Record()
+
+        # Buffer more records than the batch size to force intermediate flushes
+        with self.graph.bulk_writer(batch_size=2) as writer:
+            writer.add_file(file)
+            writer.add_entity(caller, 'Function', 'bulk_A', '', str(file.path), 1, 10)
+            writer.add_entity(callee, 'Function', 'bulk_B', '', str(file.path), 11, 21)
+            writer.connect('DEFINES', file, caller)
+            writer.connect('DEFINES', file, callee)
+            writer.connect('CALLS', caller, callee)
+
+        query = """MATCH (file:File)-[:DEFINES]->(caller:Function)-[:CALLS]->(callee:Function)<-[:DEFINES]-(file)
+                   WHERE ID(file) = $file_id AND ID(caller) = $caller_id AND ID(callee) = $callee_id
+                   RETURN true"""
+
+        params = {'file_id': file.id, 'caller_id': caller.id, 'callee_id': callee.id}
+        res = self.g.query(query, params).result_set
+        self.assertTrue(res[0][0])
+
+    def test_bulk_writer_create_only(self):
+        class Record:
+            pass
+
+        # Start from an empty graph
+        Graph('test_create').delete()
+        graph = Graph('test_create')
+        self.assertTrue(graph.is_empty())
+
+        file  = File(Path('/path/to/create.py'), None)
+        first = Record()
+        dup   = Record()
+
+        # Duplicated entities and edges are dropped before writing
+        with graph.bulk_writer(create=True) as writer:
+            writer.add_file(file)
+            writer.add_entity(first, 'Function', 'func', '', str(file.path), 1, 10)
+            writer.add_entity(dup, 'Function', 'func', '', str(file.path), 1, 10)
+            writer.connect('DEFINES', file, first)
+            writer.connect('DEFINES', file, dup)
+
+        self.assertFalse(graph.is_empty())
+        self.assertEqual(first.id, dup.id)
+        self.assertEqual(graph.stats(), {'node_count': 2, 'edge_count': 1})
+
+    def test_shadow_promote(self):
+        for name in ['test_swap', 'test_swap_shadow', 'test_swap_previous']:
+            if graph_exists(name):
+                Graph(name).delete()
+
+        live = Graph('test_swap')
+        with live.bulk_writer(create=True) as writer:
+            writer.add_file(File(Path('/path/to/old.py'), None))
+
+        # Readers keep seeing the live graph while the shadow is built
+        shadow = live.shadow()
+        self.assertEqual((shadow.name, shadow.repo), ('test_swap_shadow', 'test_swap'))
+        with shadow.bulk_writer(create=True) as writer:
+            writer.add_file(File(Path('/path/to/new.py'), None))
+            writer.add_file(File(Path('/path/to/other.py'), None))
+        self.assertEqual(live.stats()['node_count'], 1)
+
+        shadow.promote()
+        self.assertEqual(Graph('test_swap').stats()['node_count'], 2)
+        self.assertEqual(Graph('test_swap_previous').stats()['node_count'], 1)
+        self.assertFalse(graph_exists('test_swap_shadow'))
+        self.assertNotIn('test_swap_previous', get_repos())
+
+        # Rolling back swaps the previous graph back in
+        rollback_graph('test_swap')
+        self.assertEqual(Graph('test_swap').stats()['node_count'], 1)
+        self.assertEqual(Graph('test_swap_previous').stats()['node_count'], 2)
+
+    def test_promote_missing_shadow(self):
+        for name in ['test_swap_missing', 'test_swap_missing_shadow', 'test_swap_missing_previous']:
+            if graph_exists(name):
+                Graph(name).delete()
+
+        live = Graph('test_swap_missing')
+        with live.bulk_writer(create=True) as writer:
+            writer.add_file(File(Path('/path/to/old.py'), None))
+
+        # The shadow disappeared, nothing is renamed, the live graph is left in place
+        shadow = live.shadow()
+        shadow.delete()
+        with self.assertRaises(Exception):
+            shadow.promote()
+        self.assertEqual(Graph('test_swap_missing').stats()['node_count'], 1)
+        self.assertFalse(graph_exists('test_swap_missing_previous'))
+
+    def test_snapshot_replace(self):
+        snapshot = snapshot_graph_name('test_restore', 'abc1234')
+        for name in ['test_restore', snapshot]:
+            if graph_exists(name):
+                Graph(name).delete()
+
+        live = Graph('test_restore')
+        with live.bulk_writer(create=True) as writer:
+            writer.add_file(File(Path('/path/to/new.py'), None))
+            writer.add_file(File(Path('/path/to/other.py'), None))
+
+        restored = Graph(snapshot)
+        with restored.bulk_writer(create=True) as writer:
+            writer.add_file(File(Path('/path/to/old.py'), None))
+        self.assertNotIn(snapshot, get_repos())
+
+        # The replaced graph is deleted
+        restored.replace('test_restore')
+        self.assertEqual(restored.name, 'test_restore')
+        self.assertEqual(Graph('test_restore').stats()['node_count'], 1)
+        self.assertFalse(graph_exists(snapshot))
+
+    def test_apply_delta(self):
+        class Record:
+            pass
+
+        for name in ['test_delta', 'test_delta_replica']:
+            if graph_exists(name):
+                Graph(name).delete()
+
+        graph = Graph('test_delta')
+        kept, callee = File(Path('/path/to/kept.py'), None), Record()
+        with graph.bulk_writer(create=True) as writer:
+            writer.add_file(kept)
+            writer.add_file(File(Path('/path/to/gone.py'), None))
+            writer.add_entity(callee, 'Function', 'callee', '', str(kept.path), 1, 2)
+            writer.connect('DEFINES', kept, callee)
+        replica = graph.clone('test_delta_replica')
+
+        # Changes are recorded by stable keys, an edge into an unchanged file included
+        graph.enable_backlog()
+        graph.delete_files([Path('/path/to/gone.py')])
+        added, caller = File(Path('/path/to/added.py'), None), Record()
+        with graph.bulk_writer() as writer:
+            writer.add_file(added)
+            writer.add_entity(caller, 'Function', 'caller', '', str(added.path), 1, 5)
+            writer.connect('DEFINES', added, caller)
+            writer.connect('CALLS', caller, callee)
+        delta = graph.clear_backlog()
+        graph.disable_backlog()
+
+        replica.apply_delta(Delta.decode(delta.encode()))
+        self.assertEqual(replica.stats(), graph.stats())
+
+        query = """MATCH (:File {path: '/path/to/added.py'})-[:DEFINES]->(:Function {name: 'caller'})-[:CALLS]->(:Function {name: 'callee'})
+                   RETURN count(1)"""
+        self.assertEqual(replica.g.query(query).result_set[0][0], 1)
+        self.assertIsNone(replica.get_file('/path/to/gone.py', 'gone.py', '.py'))
+
+    def test_delta_edges_use_path_index(self):
+        graph = Graph('test_delta_index')
+        for relation, src, dest in [('CALLS', 'Function', 'Method'), ('DEFINES', 'File', 'Class')]:
+            plan = str(graph.g.explain(Graph._delta_edges_query(relation, src, dest), {'edges': []}))
+            self.assertNotIn('Label Scan', plan)
+            self.assertIn('Node By Index Scan', plan)
+
 if __name__ == '__main__':
     unittest.main()
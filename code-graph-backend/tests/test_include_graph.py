@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from api.analyzers.cache import IncludeCache
+from api.analyzers.c.include_graph import IncludeGraph, scan_includes
+
+
+class Test_Include_Graph(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'project'
+        (self.root / 'src').mkdir(parents=True)
+        (self.root / 'include' / 'util').mkdir(parents=True)
+
+        self.main = self.root / 'src' / 'main.c'
+        self.main.write_text('#include <stdio.h>\n#include "local.h"\n  #  include "util/log.h"\n#include "missing.h"\n')
+        self.local = self.root / 'src' / 'local.h'
+        self.local.write_text('#include "util/log.h"\n')
+        self.log = self.root / 'include' / 'util' / 'log.h'
+        self.log.write_text('// #include "nope.h" is not a preprocessor line\nint log(void);\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scan(self):
+        self.assertEqual(scan_includes(str(self.main)), ['local.h', 'util/log.h', 'missing.h'])
+        self.assertEqual(scan_includes(str(self.log)), [])
+
+    def test_build(self):
+        graph = IncludeGraph(self.root, workers=1)
+        discovered = graph.build([self.main])
+
+        # Included files are found in the including file's directory and the search directories
+        self.assertEqual(sorted(discovered), sorted([self.local, self.log]))
+        self.assertEqual(graph.includes(self.main), [self.local, self.log])
+        self.assertEqual(graph.includes(self.local), [self.log])
+        self.assertEqual(graph.includes(self.log), [])
+
+    def test_parallel(self):
+        serial = IncludeGraph(self.root, workers=1)
+        serial.build([self.main, self.local, self.log])
+        parallel = IncludeGraph(self.root, workers=2)
+        parallel.build([self.main, self.local, self.log])
+
+        self.assertEqual(serial.edges, parallel.edges)
+
+    def test_cache(self):
+        cache = IncludeCache(Path(self.tmp.name) / 'includes.sqlite')
+        IncludeGraph(self.root, cache).build([self.main])
+        self.assertEqual(cache.misses, 3)
+
+        graph = IncludeGraph(self.root, cache)
+        graph.build([self.main])
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(graph.includes(self.main), [self.local, self.log])
+        cache.close()
+
+    def test_sources(self):
+        # In-memory contents take precedence over the files on disk
+        extra = self.root / 'src' / 'extra.h'
+        sources = {self.main: b'#include "extra.h"\n', extra: b'#include "local.h"\n', self.local: b''}
+        graph = IncludeGraph(self.root, sources=sources)
+        discovered = graph.build([self.main])
+
+        self.assertEqual(sorted(discovered), sorted([extra, self.local]))
+        self.assertEqual(graph.includes(self.main), [extra])
+        self.assertEqual(graph.includes(self.local), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import os
+import contextlib
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from pygit2 import Signature, init_repository
+
+from api import SourceAnalyzer
+from api.delta import Delta
+from api.git_utils.git_graph import GitGraph
+from api.git_utils import git_utils
+from tests.test_parallel_first_pass import RecordingWriter
+
+
+class StubGraph:
+    """ Code graph stand-in, records the files written and deleted """
+
+    def __init__(self, name: str = 'repo'):
+        self.name = name
+        self.repo = name
+        self.writer = RecordingWriter()
+        self.deleted = []
+
+    def clone(self, name):
+        return StubGraph(name)
+
+    def enable_backlog(self):
+        pass
+
+    def disable_backlog(self):
+        pass
+
+    def delete(self):
+        pass
+
+    def stats(self):
+        return {'node_count': 0, 'edge_count': 0}
+
+    def bulk_writer(self, *args):
+        return contextlib.nullcontext(self.writer)
+
+    def delete_files(self, files):
+        self.deleted.extend(files)
+
+    def clear_backlog(self):
+        delta = Delta()
+        delta.delete_files([str(p) for p in self.deleted])
+        files = [e[1] for e in self.writer.log if e[0] == 'File']
+        delta.add_files(files, list(range(len(files))))
+        self.deleted, self.writer.log = [], []
+        return delta
+
+
+class StubGitGraph:
+    """ Git graph stand-in, shared by every instance """
+
+    commits, parents, children, snapshots, transitions, deleted = {}, {}, {}, {}, [], []
+
+    def __init__(self, name: str):
+        pass
+
+    def add_commit(self, commit):
+        self.commits[commit.short_id] = commit.commit_time
+
+    def connect_parent(self, child, parent):
+        self.parents[child] = parent
+
+    def connect_child(self, parent, child):
+        self.children[parent] = child
+
+    def get_head_commit(self):
+        heads = [c for c in self.commits if c not in self.children and
+                 (c in self.children.values() or c not in self.parents)]
+        return {'hash': max(heads, key=self.commits.get)} if heads else None
+
+    def set_parent_transition(self, child, parent, delta):
+        self.transitions.append((child, parent))
+
+    def set_child_transition(self, child, parent, delta):
+        self.transitions.append((parent, child))
+
+    def set_snapshot(self, commit, snapshot, stats):
+        self.snapshots[commit] = snapshot
+
+    def get_nearest_snapshot(self, commit, max_distance, relation):
+        edges = self.parents if relation == 'PARENT' else self.children
+        for distance in range(max_distance + 1):
+            if commit in self.snapshots:
+                return {'hash': commit, 'graph': self.snapshots[commit], 'distance': distance}
+            if commit not in edges:
+                break
+            commit = edges[commit]
+        return None
+
+    def delete(self):
+        self.deleted.extend(self.snapshots.values())
+        for store in [self.commits, self.parents, self.children, self.snapshots]:
+            store.clear()
+
+    def storage(self):
+        return {'commits': len(self.commits), 'snapshots': len(self.snapshots)}
+
+
+class Test_Incremental_History(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.repo = init_repository(self.tmp.name)
+        for store in [StubGitGraph.commits, StubGitGraph.parents, StubGitGraph.children, StubGitGraph.snapshots]:
+            store.clear()
+        StubGitGraph.transitions.clear()
+        StubGitGraph.deleted.clear()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def commit(self, name: str, content: str):
+        (self.root / name).write_text(content)
+        self.repo.index.add(name)
+        self.repo.index.write()
+        signature = Signature('test', 'test@example.com')
+        parents = [] if self.repo.head_is_unborn else [self.repo.head.target]
+        oid = self.repo.create_commit('HEAD', signature, signature, name, self.repo.index.write_tree(), parents)
+        return self.repo[oid].short_id
+
+    def build(self, incremental: bool) -> list:
+        StubGitGraph.transitions.clear()
+        with patch.object(git_utils, 'Graph', StubGraph), patch.object(git_utils, 'GitGraph', StubGitGraph), \
+             patch.object(git_utils, 'graph_exists', lambda name: False):
+            git_utils.build_commit_graph(self.tmp.name, SourceAnalyzer(cache=False, python_resolution='static'), 'repo', incremental=incremental)
+        return list(StubGitGraph.transitions)
+
+    def test_append(self):
+        first = self.commit('a.py', 'def f(): pass\n')
+        second = self.commit('b.py', 'def g(): pass\n')
+        self.assertEqual(self.build(False), [(second, first), (first, second)])
+        self.assertEqual(StubGitGraph('repo').get_head_commit()['hash'], second)
+
+        # Nothing new
+        self.assertEqual(self.build(True), [])
+
+        # Only the new commit is processed
+        third = self.commit('c.py', 'def h(): pass\n')
+        self.assertEqual(self.build(True), [(third, second), (second, third)])
+        self.assertEqual(StubGitGraph('repo').get_head_commit()['hash'], third)
+
+    def test_snapshots(self):
+        commits = [self.commit(f'{name}.py', f'def {name}(): pass\n') for name in 'abc']
+
+        with patch.dict(os.environ, {'CODE_GRAPH_SNAPSHOT_INTERVAL': '2'}):
+            self.build(False)
+            self.assertEqual(list(StubGitGraph.snapshots), [commits[2]])
+
+            # Counting resumes from the newest snapshot
+            commits += [self.commit(f'{name}.py', f'def {name}(): pass\n') for name in 'de']
+            self.build(True)
+            self.assertEqual(list(StubGitGraph.snapshots), [commits[2], commits[4]])
+
+        self.assertEqual(StubGitGraph.snapshots[commits[4]], f'repo_{commits[4]}_snapshot')
+
+    def test_rebuild_drops_snapshots(self):
+        commits = [self.commit(f'{name}.py', f'def {name}(): pass\n') for name in 'abc']
+
+        with patch.dict(os.environ, {'CODE_GRAPH_SNAPSHOT_INTERVAL': '2'}):
+            self.build(False)
+        self.assertEqual(list(StubGitGraph.snapshots), [commits[2]])
+
+        # A full build replaces the previous snapshots
+        with patch.dict(os.environ, {'CODE_GRAPH_SNAPSHOT_INTERVAL': '0'}):
+            self.build(False)
+        self.assertEqual(StubGitGraph.snapshots, {})
+        self.assertEqual(StubGitGraph.deleted, [f'repo_{commits[2]}_snapshot'])
+
+    def test_snapshots_disabled(self):
+        for name in 'abc':
+            self.commit(f'{name}.py', f'def {name}(): pass\n')
+
+        with patch.dict(os.environ, {'CODE_GRAPH_SNAPSHOT_INTERVAL': '0'}):
+            self.build(False)
+        self.assertEqual(StubGitGraph.snapshots, {})
+
+    def test_distance_bounded(self):
+        queries = []
+
+        class FakeGraph:
+            def query(self, q, params=None):
+                queries.append(q)
+                return SimpleNamespace(result_set=[])
+
+        git_graph = GitGraph.__new__(GitGraph)
+        git_graph.g = FakeGraph()
+
+        # Both directions are searched, no further than max_distance
+        self.assertIsNone(git_graph.get_distance('a', 'b', 5))
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all('*0..5]' in q for q in queries))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import threading
+import unittest
+
+from api.jobs import CANCELLED, FAILED, QUEUED, SUCCEEDED, Job, JobQueue
+
+
+class Test_Jobs(unittest.TestCase):
+    def setUp(self):
+        self.queue = JobQueue(history=2)
+
+    def tearDown(self):
+        self.queue.executor.shutdown(wait=True)
+
+    def wait(self, job: Job) -> dict:
+        self.queue.executor.submit(lambda: None).result(timeout=10)
+        return job.status()
+
+    def test_progress(self):
+        def analyze(job):
+            job.report('first_pass', 0, 4)
+            job.report('first_pass', 2, 4)
+            status = job.status()
+            self.assertEqual((status['state'], status['phase'], status['done'], status['total']), ('running', 'first_pass', 2, 4))
+            self.assertGreater(status['throughput'], 0)
+            self.assertGreater(status['eta'], 0)
+            return {'project': 'p'}
+
+        job = self.queue.submit('analyze_folder', {'path': '/p'}, analyze)
+        status = self.wait(job)
+        self.assertEqual(status['state'], SUCCEEDED)
+        self.assertEqual(status['result'], {'project': 'p'})
+        self.assertIsNone(status['eta'])
+
+    def test_failure(self):
+        def analyze(job):
+            raise ValueError('boom')
+
+        status = self.wait(self.queue.submit('analyze_folder', {}, analyze))
+        self.assertEqual((status['state'], status['error']), (FAILED, 'boom'))
+
+    def test_cancel(self):
+        started, release = threading.Event(), threading.Event()
+
+        def analyze(job):
+            started.set()
+            release.wait(10)
+            job.report('second_pass', 1, 2)
+            return 'never'
+
+        running = self.queue.submit('analyze_folder', {}, analyze)
+        queued = self.queue.submit('analyze_folder', {}, analyze)
+        started.wait(10)
+
+        # Queued jobs are cancelled right away, running ones on their next report
+        self.assertEqual(queued.status()['state'], QUEUED)
+        self.assertTrue(self.queue.cancel(queued.id))
+        self.assertEqual(queued.status()['state'], CANCELLED)
+        self.assertTrue(self.queue.cancel(running.id))
+        release.set()
+        self.assertEqual(self.wait(running)['state'], CANCELLED)
+        self.assertFalse(self.queue.cancel(running.id))
+        self.assertIsNone(self.queue.cancel('missing'))
+
+    def test_wait(self):
+        order = []
+
+        def analyze(name):
+            def run(job):
+                order.append(f'{name} started')
+                order.append(f'{name} done')
+                return name
+            return run
+
+        first = self.queue.submit('analyze_folder', {}, analyze('first'))
+        second = self.queue.submit('analyze_folder', {}, analyze('second'))
+        self.assertTrue(second.wait(10))
+        self.assertTrue(first.completed.is_set())
+        self.assertEqual(second.status()['result'], 'second')
+
+        # Jobs never overlap
+        self.assertEqual(order, ['first started', 'first done', 'second started', 'second done'])
+
+        # A cancelled queued job completes right away
+        started, release = threading.Event(), threading.Event()
+        self.queue.submit('analyze_folder', {}, lambda job: (started.set(), release.wait(10)))
+        queued = self.queue.submit('analyze_folder', {}, analyze('queued'))
+        started.wait(10)
+        self.assertFalse(queued.wait(0))
+        queued.cancel()
+        self.assertTrue(queued.wait(0))
+        release.set()
+
+    def test_history(self):
+        jobs = [self.queue.submit('analyze_folder', {}, lambda job: None) for _ in range(3)]
+        self.wait(jobs[-1])
+        self.queue.submit('analyze_folder', {}, lambda job: None)
+        self.assertIsNone(self.queue.get(jobs[0].id))
+        self.assertIsNotNone(self.queue.get(jobs[2].id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from api.analyzers.lsp_pool import LanguageServerPool, RelocatedLanguageServer
+
+
+class FakeProcess:
+    def __init__(self):
+        self.returncode = None
+
+
+class FakeHandler:
+    def __init__(self):
+        self.process = FakeProcess()
+
+
+class FakeServer:
+    """ Language server stand-in, crashes on request when asked to """
+
+    instances = []
+
+    def __init__(self):
+        self.server = FakeHandler()
+        self.files = set()
+        self.crash = False
+        FakeServer.instances.append(self)
+
+    @asynccontextmanager
+    async def start_server(self):
+        yield self
+
+    async def request_definition(self, relative_file_path, line, column):
+        if self.crash:
+            self.server.process.returncode = 1
+            raise ConnectionResetError()
+
+        self.files.add(relative_file_path)
+        return [{'absolutePath': relative_file_path, 'line': line}]
+
+
+class Test_LSP_Pool(unittest.TestCase):
+    def setUp(self):
+        FakeServer.instances = []
+
+    def test_sharding(self):
+        async def run():
+            pool = LanguageServerPool(FakeServer, size=3)
+            async with pool.start_server():
+                for i in range(30):
+                    for line in range(3):
+                        await pool.request_definition(f'file_{i}.py', line, 0)
+
+        asyncio.run(run())
+
+        # Each file is served by a single server
+        self.assertEqual(len(FakeServer.instances), 3)
+        files = [server.files for server in FakeServer.instances]
+        self.assertEqual(sum(len(f) for f in files), 30)
+        self.assertTrue(all(len(f) > 0 for f in files))
+
+    def test_capped_by_files(self):
+        self.assertEqual(len(LanguageServerPool(FakeServer, size=4, files=1).shards), 1)
+        self.assertEqual(len(LanguageServerPool(FakeServer, size=4, files=10).shards), 4)
+
+    def test_restart_on_crash(self):
+        async def run():
+            pool = LanguageServerPool(FakeServer, size=1, max_restarts=1)
+            async with pool.start_server():
+                FakeServer.instances[0].crash = True
+                self.assertEqual(await pool.request_definition('a.py', 1, 0), [{'absolutePath': 'a.py', 'line': 1}])
+                self.assertEqual(pool.shards[0].restarts, 1)
+
+                # Out of restarts
+                FakeServer.instances[1].crash = True
+                with self.assertRaises(RuntimeError):
+                    await pool.request_definition('a.py', 1, 0)
+                self.assertTrue(pool.shards[0].down)
+
+        asyncio.run(run())
+
+    def test_relocated(self):
+        async def run():
+            server = RelocatedLanguageServer(FakeServer(), Path('/project'), Path('/tmp/checkout'))
+            async with server.start_server():
+                locations = await server.request_definition('/project/pkg/a.py', 1, 0)
+                self.assertEqual(FakeServer.instances[0].files, {'/tmp/checkout/pkg/a.py'})
+                self.assertEqual(locations, [{'absolutePath': '/project/pkg/a.py', 'line': 1}])
+
+                # Paths outside of the checkout are left as is
+                locations = await server.request_definition('/venv/lib/b.py', 2, 0)
+                self.assertEqual(locations, [{'absolutePath': '/venv/lib/b.py', 'line': 2}])
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from api.info import get_redis_connection
+from api.analyzers.manifest import Manifest
+
+
+class Test_Manifest(unittest.TestCase):
+    def setUp(self):
+        self.repo = 'test_manifest'
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        get_redis_connection().delete(f'{self.repo}_manifest')
+
+    def tearDown(self):
+        get_redis_connection().delete(f'{self.repo}_manifest')
+        self.tmp.cleanup()
+
+    def write(self, name: str, content: str) -> Path:
+        path = self.root / name
+        path.write_text(content)
+        return path
+
+    def test_diff(self):
+        a = self.write('a.py', 'def a(): pass\n')
+        b = self.write('b.py', 'def b(): pass\n')
+        c = self.write('c.py', 'def c(): pass\n')
+
+        manifest = Manifest(self.repo)
+        self.assertEqual(len(manifest), 0)
+
+        added, modified, removed = manifest.diff([a, b, c])
+        self.assertEqual(added, [a, b, c])
+        self.assertEqual(modified, [])
+        self.assertEqual(removed, [])
+        manifest.save()
+
+        # Modify b, touch c without changing its content, remove a
+        self.write('b.py', 'def b(): return 1\n')
+        stat = c.stat()
+        os.utime(c, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        a.unlink()
+        d = self.write('d.py', 'def d(): pass\n')
+
+        # Reload from the DB
+        manifest = Manifest(self.repo)
+        self.assertEqual(len(manifest), 3)
+
+        added, modified, removed = manifest.diff([b, c, d])
+        self.assertEqual(added, [d])
+        self.assertEqual(modified, [b])
+        self.assertEqual(removed, [a])
+        manifest.save()
+
+        manifest = Manifest(self.repo)
+        self.assertEqual(manifest.diff([b, c, d]), ([], [], []))
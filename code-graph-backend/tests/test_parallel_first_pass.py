@@ -0,0 +1,62 @@
+import unittest
+from pathlib import Path
+
+from api import SourceAnalyzer
+
+
+class RecordingWriter:
+    """ Graph writer stand-in, assigns ids and records every write """
+
+    def __init__(self):
+        self.log = []
+        self.next_id = 0
+
+    def _assign(self, obj):
+        obj.id = self.next_id
+        self.next_id += 1
+
+    def add_file(self, file):
+        self._assign(file)
+        self.log.append(('File', str(file.path)))
+
+    def add_entity(self, entity, label, name, doc, path, src_start, src_end, props=None):
+        self._assign(entity)
+        self.log.append((label, name, doc, path, src_start, src_end))
+
+    def connect(self, relation, src, dest):
+        self.log.append((relation, src.id, dest.id))
+
+    def mark(self, item):
+        pass
+
+
+class Test_Parallel_First_Pass(unittest.TestCase):
+    def test_parallel_matches_serial(self):
+        files = sorted((Path(__file__).parent.parent / 'api').rglob('*.py'))
+
+        serial = SourceAnalyzer(cache=False)
+        serial_writer = RecordingWriter()
+        for file_path in files:
+            serial.first_pass_file(file_path, serial_writer)
+
+        parallel = SourceAnalyzer(workers=2, cache=False)
+        parallel_writer = RecordingWriter()
+        parallel.parallel_first_pass(files, parallel_writer)
+
+        # Same writes, in the same order
+        self.assertEqual(serial_writer.log, parallel_writer.log)
+
+        # Same symbols extracted for every entity
+        for file_path in files:
+            serial_entities = list(serial.files[file_path].entities.values())
+            parallel_entities = list(parallel.files[file_path].entities.values())
+            self.assertEqual(len(serial_entities), len(parallel_entities))
+
+            for a, b in zip(serial_entities, parallel_entities):
+                self.assertEqual((a.node.type, a.node.start_byte, a.node.end_byte),
+                                 (b.node.type, b.node.start_byte, b.node.end_byte))
+                self.assertEqual({k: sorted(s.start_byte for s in v) for k, v in a.symbols.items()},
+                                 {k: sorted(s.start_byte for s in v) for k, v in b.symbols.items()})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import contextlib
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from api import SourceAnalyzer
+from api.analyzers.source_analyzer import analyzers
+from tests.test_parallel_first_pass import RecordingWriter
+
+
+class StubGraph:
+    def __init__(self, events):
+        self.writer = RecordingWriter()
+        self.events = events
+
+    @contextlib.contextmanager
+    def bulk_writer(self, *args):
+        try:
+            yield self.writer
+        finally:
+            self.events.append('closed')
+
+
+class Test_Second_Pass(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.file = self.root / 'a.py'
+        self.file.write_text('def f():\n    slow()\n    fail()\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_failure_cancels_pending(self):
+        events = []
+
+        async def resolve_symbol(files, lsp, file_path, path, key, symbol):
+            if symbol.text.startswith(b'fail'):
+                raise RuntimeError("resolution failed")
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                events.append(symbol.text)
+                raise
+            return []
+
+        analyzer = SourceAnalyzer(cache=False, definitions=False, python_resolution='static')
+        graph = StubGraph(events)
+        analyzer.first_pass(self.root, [self.file], [], graph)
+
+        with patch.object(analyzers['.py'], 'resolve_symbol', resolve_symbol):
+            with self.assertRaises(RuntimeError):
+                analyzer.second_pass(graph, [self.file], self.root)
+
+        # The in-flight request is cancelled before the writer,
+        # and the language servers, are closed
+        self.assertEqual(events, ['closed', b'slow()', 'closed'])
+
+if __name__ == '__main__':
+    unittest.main()
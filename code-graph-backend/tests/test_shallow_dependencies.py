@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from api import SourceAnalyzer
+from api.analyzers.cache import ExtractionCache
+from api.analyzers.source_analyzer import analyzers
+from tests.test_parallel_first_pass import RecordingWriter
+
+SOURCE = b'''
+class Client(Base):
+    """A client"""
+    def get(self, url: str) -> "Response":
+        def retry():
+            pass
+        return retry()
+
+def request(method, url, **kwargs) -> "Response":
+    class Local:
+        pass
+    return Client().get(url)
+'''
+
+
+class PropsWriter(RecordingWriter):
+    """ Also records entity properties """
+
+    def __init__(self):
+        super().__init__()
+        self.props = {}
+
+    def add_entity(self, entity, label, name, doc, path, src_start, src_end, props=None):
+        super().add_entity(entity, label, name, doc, path, src_start, src_end, props)
+        self.props[name] = props
+
+
+class Test_Shallow_Dependencies(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.site_packages = Path(self.tmp.name) / 'venv/lib/python3.12/site-packages'
+        (self.site_packages / 'requests').mkdir(parents=True)
+        (self.site_packages / 'requests-2.31.0.dist-info').mkdir()
+        self.path = self.site_packages / 'requests/api.py'
+        self.path.write_bytes(SOURCE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_package(self):
+        analyzer = analyzers['.py']
+        self.assertEqual(analyzer.get_dependency_package(str(self.path)), 'requests@2.31.0')
+        self.assertIsNone(analyzer.get_dependency_package(str(Path(self.tmp.name) / 'app.py')))
+
+    def test_signatures(self):
+        writer = PropsWriter()
+        SourceAnalyzer(cache=False).first_pass_file(self.path, writer, shallow=True)
+
+        # Function bodies are skipped, class bodies are not
+        self.assertEqual(sorted(writer.props), ['Client', 'get', 'request'])
+        self.assertEqual(writer.props['get'], {'signature': 'def get(self, url: str) -> "Response"'})
+        self.assertEqual(writer.props['Client'], {'signature': 'class Client(Base)'})
+
+    def test_cached(self):
+        cache = ExtractionCache(Path(self.tmp.name) / 'extraction.sqlite')
+
+        first = PropsWriter()
+        SourceAnalyzer(cache=cache).first_pass_file(self.path, first, shallow=True)
+        second = PropsWriter()
+        SourceAnalyzer(cache=cache).first_pass_file(self.path, second, shallow=True)
+
+        # Signatures survive the extraction cache, shallow and full extractions are cached apart
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(first.log, second.log)
+        self.assertEqual(first.props, second.props)
+
+        full = PropsWriter()
+        SourceAnalyzer(cache=cache).first_pass_file(self.path, full)
+        self.assertEqual(cache.hits, 1)
+        self.assertIn('retry', full.props)
+        cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
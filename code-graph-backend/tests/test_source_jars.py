@@ -0,0 +1,75 @@
+import zipfile
+import tempfile
+import unittest
+from pathlib import Path
+
+from api.analyzers.source_analyzer import analyzers
+from api.analyzers.java.source_jars import Artifact, SourceJars, parse_pom, split_member_path
+
+POM = '''<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <dependencies>
+    <dependency><groupId>org.demo</groupId><artifactId>lib</artifactId><version>1.0</version></dependency>
+    <dependency><groupId>org.demo</groupId><artifactId>managed</artifactId></dependency>
+    <dependency><groupId>org.demo</groupId><artifactId>prop</artifactId><version>${demo.version}</version></dependency>
+  </dependencies>
+</project>
+'''
+
+LIB = b'package org.demo;\npublic class Lib { public void go() {} }\n'
+
+
+class Test_Source_Jars(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repository = Path(self.tmp.name) / 'repository'
+        self.artifact = Artifact('org.demo', 'lib', '1.0')
+        self.jar = self.artifact.sources_jar(self.repository)
+        self.jar.parent.mkdir(parents=True)
+        with zipfile.ZipFile(self.jar, 'w') as jar:
+            jar.writestr('org/demo/Lib.java', LIB)
+            jar.writestr('META-INF/MANIFEST.MF', 'Manifest-Version: 1.0\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_pom(self):
+        pom = Path(self.tmp.name) / 'pom.xml'
+        pom.write_text(POM)
+
+        # Dependencies without an explicit version are skipped
+        self.assertEqual(parse_pom(pom), [self.artifact])
+        self.assertEqual(self.jar, self.repository / 'org/demo/lib/1.0/lib-1.0-sources.jar')
+
+    def test_read(self):
+        jars = SourceJars()
+        files = jars.files(self.artifact, self.jar)
+
+        self.assertEqual(files, [Path(f"{self.jar}!/org/demo/Lib.java")])
+        self.assertEqual(split_member_path(files[0]), (str(self.jar), 'org/demo/Lib.java'))
+        self.assertIsNone(split_member_path(Path('/project/App.java')))
+        self.assertEqual(jars.read(files[0]), LIB)
+
+    def test_shared(self):
+        jars = SourceJars()
+        path = jars.files(self.artifact, self.jar)[0]
+        parser = analyzers['.java'].parser
+
+        # Listings and trees are reused, across projects
+        listing = jars.listings[self.artifact.coordinates]
+        jars.files(self.artifact, self.jar)
+        self.assertIs(jars.listings[self.artifact.coordinates], listing)
+
+        tree = jars.parse(path, jars.read(path), parser)
+        self.assertIs(jars.parse(path, jars.read(path), parser), tree)
+
+    def test_bounded(self):
+        jars = SourceJars(max_trees=1)
+        path = jars.files(self.artifact, self.jar)[0]
+        parser = analyzers['.java'].parser
+
+        jars.parse(path, LIB, parser)
+        jars.parse(Path(f"{self.jar}!/org/demo/Other.java"), LIB, parser)
+        self.assertEqual(len(jars.trees), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from api.analyzers.walker import IgnoreSpec, PathIgnore, SourceWalker, ignore_spec, is_ignored
+
+FILES = [
+    'main.py',
+    'notes.txt',
+    'src/app.java',
+    'src/lib.c',
+    'src/lib.h',
+    'src/gen/out.py',
+    'src/gen/keep.py',
+    'build/out.py',
+    'venv/lib/site.py',
+    '.git/hooks/hook.py',
+    'docs/conf.py',
+    'pkg/mod.py',
+    'pkg/mod_pb.py',
+    'pkg/local/tmp.py',
+]
+
+
+class Test_Source_Walker(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.dir.name)
+        for name in FILES:
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('')
+
+        (self.root / '.gitignore').write_text('# generated\n/build/\nsrc/gen/*\n!src/gen/keep.py\n*_pb.py\n')
+        (self.root / 'pkg/.gitignore').write_text('local/\n')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def walk(self, **kwargs) -> tuple[SourceWalker, list[str]]:
+        walker = SourceWalker(self.root, ['.py', '.java', '.c', '.h'], **kwargs)
+        return walker, [p.relative_to(self.root).as_posix() for p in walker]
+
+    def test_walk(self):
+        walker, files = self.walk()
+        self.assertEqual(files, ['main.py', 'docs/conf.py', 'pkg/mod.py', 'src/app.java', 'src/lib.c', 'src/lib.h', 'src/gen/keep.py'])
+
+        # .git, venv, build and pkg/local are pruned, src/gen is entered for the negated file
+        self.assertEqual(walker.ignored_dirs, 4)
+        self.assertEqual((walker.files, walker.ignored_files, walker.unsupported), (7, 2, 3))
+
+    def test_ignore_list(self):
+        _, files = self.walk(ignore=['./docs', 'src/*.h', 'main.py'])
+        self.assertEqual(files, ['pkg/mod.py', 'src/app.java', 'src/lib.c', 'src/gen/keep.py'])
+
+        _, files = self.walk(gitignore=False)
+        self.assertIn('build/out.py', files)
+        self.assertNotIn('venv/lib/site.py', files)
+
+    def test_path_ignore(self):
+        # Individual paths follow the walk's rules
+        def gitignore(directory):
+            path = self.root / directory / '.gitignore'
+            return path.read_text() if path.is_file() else None
+
+        for ignore in [None, ['./docs', 'src/*.h', 'main.py']]:
+            _, files = self.walk(ignore=ignore)
+            ignored = PathIgnore(ignore, gitignore)
+            sources = [name for name in FILES if not name.endswith('.txt')]
+            self.assertEqual([name for name in sources if not ignored(name)], sorted(files, key=sources.index))
+
+    def test_patterns(self):
+        spec = IgnoreSpec(['**/fixtures/**', 'a?c.py', '[!x]y.py', 'logs/'])
+        self.assertTrue(spec.match('tests/fixtures/data.py', False))
+        self.assertTrue(spec.match('abc.py', False))
+        self.assertIsNone(spec.match('abbc.py', False))
+        self.assertTrue(spec.match('z/ay.py', False))
+        self.assertIsNone(spec.match('xy.py', False))
+        self.assertTrue(spec.match('logs', True))
+        self.assertIsNone(spec.match('logs', False))
+
+        spec = ignore_spec(['./build', 'vendor'])
+        self.assertTrue(is_ignored(spec, 'build/x.py'))
+        self.assertFalse(is_ignored(spec, 'src/build/x.py'))
+        self.assertTrue(is_ignored(spec, 'src/vendor/x.py'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+from pathlib import Path
+
+from tree_sitter import Node
+
+from api import SourceAnalyzer
+from api.entities.file import File
+from api.analyzers.source_analyzer import analyzers
+from api.analyzers.python.static_resolver import ModuleTable, StaticResolver, resolution_report
+from tests.test_parallel_first_pass import RecordingWriter
+
+ROOT = Path('/project')
+
+SOURCES = {
+    'pkg/__init__.py': b'from .base import Base\n',
+    'pkg/base.py': b'''
+class Base:
+    def run(self):
+        return self.step()
+
+    def step(self):
+        pass
+''',
+    'pkg/util.py': b'''
+class Tool:
+    def use(self):
+        pass
+
+def make() -> Tool:
+    return Tool()
+''',
+    'pkg/impl.py': b'''
+from . import Base
+from .util import make as build
+import pkg.util
+
+class Worker(Base):
+    def __init__(self):
+        self.tool = pkg.util.Tool()
+
+    def step(self):
+        self.tool.use()
+        build().use()
+
+def main(w: Worker) -> Worker:
+    w.run()
+    local = Worker()
+    local.step()
+    unknown()
+    return local
+''',
+}
+
+
+class Test_Static_Resolver(unittest.TestCase):
+    def setUp(self):
+        analyzer = analyzers['.py']
+        writer = RecordingWriter()
+
+        self.files = {}
+        for name, source in SOURCES.items():
+            path = ROOT / name
+            file = File(path, analyzer.parser.parse(source))
+            writer.add_file(file)
+            SourceAnalyzer(cache=False).create_hierarchy(file, analyzer, writer, False)
+            self.files[path] = file
+
+        self.resolver = StaticResolver(ROOT, self.files)
+
+    def entity(self, name: str, row: int):
+        file = self.files[ROOT / name]
+        return next(e for node, e in file.entities.items() if node.start_point.row == row)
+
+    def describe(self, entity) -> tuple[str, int]:
+        # Top level entities by file, members by class
+        if isinstance(entity.parent, File):
+            return str(entity.parent.path.relative_to(ROOT)), entity.node.start_point.row
+        return entity.parent.node.child_by_field_name('name').text.decode('utf-8'), entity.node.start_point.row
+
+    def resolve(self, name: str, row: int, key: str) -> dict[str, list[tuple[str, int]]]:
+        entity = self.entity(name, row)
+        return {symbol.text.decode('utf-8'): [self.describe(e) for e in self.resolver.resolve(ROOT / name, key, symbol)]
+                for symbol in entity.symbols.get(key, [])}
+
+    def test_modules(self):
+        table = ModuleTable(ROOT, self.files)
+        self.assertEqual(sorted(m.name for m in table.modules.values() if m.file is not None), ['pkg', 'pkg.base', 'pkg.impl', 'pkg.util'])
+
+        impl = table.by_path[ROOT / 'pkg/impl.py']
+        self.assertEqual(sorted(m.name for m in table.imported_modules(impl)), ['pkg', 'pkg.util'])
+
+    def test_base_class(self):
+        # Re-exported through the package's __init__
+        self.assertEqual(self.resolve('pkg/impl.py', 5, 'base_class'), {'Base': [('pkg/base.py', 1)]})
+
+    def test_calls(self):
+        # Instance attributes are typed by their constructor, return values by the return annotation
+        self.assertEqual(self.resolve('pkg/impl.py', 9, 'call'), {
+            'self.tool.use()': [('Tool', 2)],
+            'build()': [('pkg/util.py', 5)],
+            'build().use()': [('Tool', 2)],
+        })
+
+        # Parameters are typed by their annotation, inherited methods are found through the base class
+        self.assertEqual(self.resolve('pkg/impl.py', 13, 'call'), {
+            'w.run()': [('Base', 2)],
+            'Worker()': [('pkg/impl.py', 5)],
+            'local.step()': [('Worker', 9)],
+            'unknown()': [],
+        })
+
+        # self is bound to the class defining the method
+        self.assertEqual(self.resolve('pkg/base.py', 2, 'call'), {'self.step()': [('Base', 5)]})
+
+    def test_annotations(self):
+        self.assertEqual(self.resolve('pkg/impl.py', 13, 'parameters'), {'Worker': [('pkg/impl.py', 5)]})
+        self.assertEqual(self.resolve('pkg/impl.py', 13, 'return_type'), {'Worker': [('pkg/impl.py', 5)]})
+
+    def test_caches_hold_no_nodes(self):
+        # Memoized tables hold spans, nodes would keep every tree alive
+        self.resolve('pkg/impl.py', 9, 'call')
+        self.resolve('pkg/impl.py', 13, 'call')
+
+        bindings = [b for scope in self.resolver._scopes.values() for names in scope.values() for b in names]
+        self.assertTrue(any(b.span is not None for b in bindings))
+        self.assertFalse(any(isinstance(v, Node) for b in bindings for v in b))
+
+        attributes = [v for names in self.resolver._attributes.values() for values in names.values() for v in values]
+        # self.tool = pkg.util.Tool()
+        self.assertEqual([type(v) for v in attributes], [tuple])
+        self.assertEqual(self.files[ROOT / 'pkg/impl.py'].node(attributes[0]).text, b'pkg.util.Tool()')
+
+    def test_report(self):
+        static = {('call', 'a', 'b'), ('call', 'a', 'c')}
+        lsp = {('call', 'a', 'b'), ('base_class', 'a', 'd')}
+        report = resolution_report(static, lsp)
+
+        self.assertEqual(report['call'], {'static': 2, 'lsp': 1, 'common': 1, 'precision': 0.5, 'recall': 1.0})
+        self.assertEqual(report['base_class']['recall'], 0.0)
+        self.assertEqual(report['total']['common'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
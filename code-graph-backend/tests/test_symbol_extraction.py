@@ -0,0 +1,42 @@
+import unittest
+from pathlib import Path
+
+from api import SourceAnalyzer
+from api.entities.file import File
+from api.analyzers.source_analyzer import analyzers
+from tests.test_parallel_first_pass import RecordingWriter
+
+SOURCE = b'''
+class Task(Base, metaclass=Meta):
+    def run(self, delay: float) -> Result:
+        log("run")
+
+        def inner(msg: str):
+            print(msg)
+
+        inner("x")
+'''
+
+
+class Test_Symbol_Extraction(unittest.TestCase):
+    def extract(self, source: bytes) -> dict[str, dict[str, list[str]]]:
+        analyzer = analyzers['.py']
+        file = File(Path('src.py'), analyzer.parser.parse(source))
+        writer = RecordingWriter()
+        writer.add_file(file)
+        SourceAnalyzer(cache=False).create_hierarchy(file, analyzer, writer, False)
+
+        return {analyzer.get_entity_name(node): {key: [symbol.text.decode('utf-8') for symbol in symbols]
+                                                 for key, symbols in entity.symbols.items()}
+                for node, entity in file.entities.items()}
+
+    def test_innermost_entity(self):
+        symbols = self.extract(SOURCE)
+
+        self.assertEqual(symbols['Task'], {'base_class': ['Base', 'metaclass=Meta']})
+
+        # Calls within the nested function belong to it alone
+        self.assertEqual(symbols['run'], {'call': ['log("run")', 'inner("x")'],
+                                          'parameters': ['float'],
+                                          'return_type': ['Result']})
+        self.assertEqual(symbols['inner'], {'call': ['print(msg)'], 'parameters': ['str']})
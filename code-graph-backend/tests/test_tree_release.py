@@ -0,0 +1,82 @@
+import unittest
+from pathlib import Path
+from functools import partial
+
+from api import SourceAnalyzer
+from api.entities import file as file_module
+from api.entities.file import File, TreeCache
+from api.analyzers.source_analyzer import NullWriter, RecordWriter, analyzers
+
+SOURCES = {
+    Path('a.py'): b'''
+class A:
+    def run(self):
+        self.step()
+
+    def step(self):
+        pass
+''',
+    Path('b.py'): b'''
+def main():
+    print(1)
+''',
+}
+
+
+class Test_Tree_Release(unittest.TestCase):
+    def setUp(self):
+        self.trees = file_module.trees
+        file_module.trees = TreeCache(1)
+        self.analyzer = analyzers['.py']
+
+    def tearDown(self):
+        file_module.trees = self.trees
+
+    def extract(self, path: Path) -> File:
+        source = SOURCES[path]
+        file = File(path, self.analyzer.parser.parse(source), source, partial(self.analyzer.parse, path))
+        SourceAnalyzer(cache=False).create_hierarchy(file, self.analyzer, NullWriter(), False)
+        return file
+
+    def test_eviction(self):
+        a = self.extract(Path('a.py'))
+        b = self.extract(Path('b.py'))
+
+        # Only the most recently used tree is held
+        self.assertIsNone(a._tree)
+        self.assertIsNotNone(b._tree)
+
+        # Entities and symbols are mapped onto the tree parsed again
+        method = next(e for e in a.entities.values() if e.node.type == 'function_definition' and e.node.start_point.row == 2)
+        self.assertIsNotNone(a._tree)
+        self.assertIsNone(b._tree)
+        self.assertEqual([s.text for s in method.symbols['call']], [b'self.step()'])
+        self.assertIs(a.entities[method.node], method)
+        self.assertEqual(method.parent.node.child_by_field_name('name').text, b'A')
+
+    def test_release(self):
+        a = self.extract(Path('a.py'))
+        a.release()
+        self.assertIsNone(a._tree)
+        self.assertEqual(sorted(e.node.start_point.row for e in a.entities.values()), [1, 2, 5])
+
+        # Files without their source are never released
+        tree = self.analyzer.parser.parse(SOURCES[Path('b.py')])
+        b = File(Path('b.py'), tree)
+        b.release()
+        self.assertIs(b.tree, tree)
+
+    def test_load_file(self):
+        path = Path('a.py')
+        recorder = RecordWriter(path)
+        SourceAnalyzer(cache=False).create_hierarchy(self.extract(path), self.analyzer, recorder, False)
+
+        # Loading a record does not parse the file
+        loaded = SourceAnalyzer(cache=False).load_file(recorder.finalize(), self.analyzer, NullWriter(), SOURCES[path])
+        self.assertIsNone(loaded._tree)
+        self.assertEqual(len(loaded.entities), 3)
+        self.assertEqual({key: [s.text for s in symbols] for e in loaded.entities.values() for key, symbols in e.symbols.items()},
+                         {'call': [b'self.step()']})
+
+if __name__ == '__main__':
+    unittest.main()